@@ -0,0 +1,148 @@
+"""Admin and diagnostics API endpoints."""
+
+import asyncio
+import contextlib
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from app.services import profiler
+from app.services.retention import RetentionService, database_stats
+
+router = APIRouter()
+
+ProfileFormat = Literal["speedscope", "collapsed"]
+
+
+class DatabaseInfo(BaseModel):
+    """Size and row counts of one database."""
+    
+    name: str
+    path: str
+    size_bytes: int
+    wal_bytes: int
+    free_bytes: int
+    rows: dict[str, int]
+
+
+class MaintenanceResult(BaseModel):
+    """Outcome of a database maintenance run."""
+    
+    history_compacted: int
+    undo_pruned: int
+    pages_vacuumed: int
+    duration_seconds: float
+
+
+def _render_profile(profile: profiler.Profile, format: ProfileFormat) -> Response:
+    """Render a profile in the requested format."""
+    if format == "collapsed":
+        return PlainTextResponse(profile.to_collapsed())
+    return JSONResponse(profile.to_speedscope())
+
+
+@router.post("/profile")
+async def run_profile(
+    seconds: float = Query(10, gt=0, le=300, description="How long to sample"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Time between samples"),
+    format: ProfileFormat = Query("speedscope"),
+) -> Response:
+    """
+    Profile the running app for a number of seconds and return the result.
+    
+    The speedscope output can be opened directly at https://www.speedscope.app.
+    """
+    try:
+        profiler.start_profiler(interval=interval_ms / 1000, max_duration=seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
+    try:
+        await asyncio.sleep(seconds)
+    except asyncio.CancelledError:
+        with contextlib.suppress(RuntimeError):
+            profiler.stop_profiler()
+        raise
+    
+    try:
+        profile = profiler.stop_profiler()
+    except RuntimeError as e:
+        # Stopped early through /profile/stop, which got the profile
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
+    return _render_profile(profile, format)
+
+
+@router.post("/profile/start")
+async def start_profile(
+    interval_ms: float = Query(10, ge=1, le=1000, description="Time between samples"),
+    max_seconds: float = Query(300, gt=0, le=3600, description="Stop sampling after this long"),
+) -> dict:
+    """Start an open-ended profiling run, collect it with /profile/stop."""
+    try:
+        profiler.start_profiler(interval=interval_ms / 1000, max_duration=max_seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
+    return {
+        "status": "started",
+        "interval_ms": interval_ms,
+        "max_seconds": max_seconds,
+    }
+
+
+@router.post("/profile/stop")
+async def stop_profile(format: ProfileFormat = Query("speedscope")) -> Response:
+    """Stop the current profiling run and return the result."""
+    try:
+        profile = profiler.stop_profiler()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
+    return _render_profile(profile, format)
+
+
+@router.get("/profile/status")
+async def profile_status() -> dict:
+    """Get the state of the profiler."""
+    active = profiler.get_profiler()
+    
+    return {
+        "is_running": active is not None and active.is_running,
+        "sample_count": active.profile.sample_count if active else 0,
+    }
+
+
+@router.get("/database", response_model=list[DatabaseInfo])
+async def get_database_info() -> list[DatabaseInfo]:
+    """Get file sizes and row counts of state.db and index.db."""
+    return [
+        DatabaseInfo(
+            name=stats.name,
+            path=str(stats.path),
+            size_bytes=stats.size_bytes,
+            wal_bytes=stats.wal_bytes,
+            free_bytes=stats.free_bytes,
+            rows=stats.rows,
+        )
+        for stats in await database_stats()
+    ]
+
+
+@router.post("/database/maintenance", response_model=MaintenanceResult)
+async def run_database_maintenance(
+    request: Request,
+    vacuum: bool = Query(True, description="Return free pages to the OS even if busy"),
+) -> MaintenanceResult:
+    """Compact history, prune expired undo records and vacuum now."""
+    retention = getattr(request.app.state, "retention", None) or RetentionService()
+    result = await retention.run_once(vacuum=vacuum)
+    
+    return MaintenanceResult(
+        history_compacted=result.history_compacted,
+        undo_pruned=result.undo_pruned,
+        pages_vacuumed=result.pages_vacuumed,
+        duration_seconds=round(result.duration_seconds, 3),
+    )
@@ -0,0 +1,92 @@
+"""Array analytics API endpoints."""
+
+from fastapi import APIRouter
+from pydantic import BaseModel
+
+from app.services.analytics import AGE_BUCKET_DAYS, UsageCell, UsageRow, load_analytics
+
+router = APIRouter()
+
+
+class Usage(BaseModel):
+    """Files and bytes."""
+    
+    file_count: int
+    total_bytes: int
+
+
+class ShareUsage(Usage):
+    """Usage of a share, in total and per disk."""
+    
+    share: str  # "" for files in the disk roots
+    disks: dict[str, Usage]
+
+
+class SizeBucket(Usage):
+    """Files with sizes in [min_bytes, max_bytes]."""
+    
+    min_bytes: int
+    max_bytes: int
+    disks: dict[str, Usage]
+
+
+class AgeBucket(Usage):
+    """Files last modified between min_days and max_days ago."""
+    
+    min_days: int
+    max_days: int | None  # None for the oldest bucket
+    disks: dict[str, Usage]
+
+
+class AnalyticsResponse(BaseModel):
+    """Share x disk usage and file size and age histograms."""
+    
+    disks: list[str]
+    shares: list[ShareUsage]  # Largest first
+    sizes: list[SizeBucket]  # Smallest first
+    ages: list[AgeBucket]  # Newest first
+
+
+def _usage(cell: UsageCell) -> dict[str, int]:
+    return {"file_count": cell.file_count, "total_bytes": cell.total_bytes}
+
+
+def _disks(row: UsageRow) -> dict[str, Usage]:
+    return {disk_id: Usage(**_usage(cell)) for disk_id, cell in sorted(row.disks.items())}
+
+
+@router.get("", response_model=AnalyticsResponse)
+async def get_analytics() -> AnalyticsResponse:
+    """
+    Get where the array's data is, by share, file size and file age.
+    
+    Read from aggregates kept with the index, so this is cheap however
+    many files are indexed. Empty until the first index run.
+    """
+    data = await load_analytics()
+    bounds = (0, *AGE_BUCKET_DAYS)
+    return AnalyticsResponse(
+        disks=data.disks,
+        shares=[
+            ShareUsage(share=str(row.key), disks=_disks(row), **_usage(row.total))
+            for row in data.shares
+        ],
+        sizes=[
+            SizeBucket(
+                min_bytes=1 << (row.key - 1) if row.key else 0,
+                max_bytes=(1 << row.key) - 1,
+                disks=_disks(row),
+                **_usage(row.total),
+            )
+            for row in data.sizes
+        ],
+        ages=[
+            AgeBucket(
+                min_days=bounds[row.key],
+                max_days=AGE_BUCKET_DAYS[row.key] if row.key < len(AGE_BUCKET_DAYS) else None,
+                disks=_disks(row),
+                **_usage(row.total),
+            )
+            for row in data.ages
+        ],
+    )
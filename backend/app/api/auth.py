@@ -5,14 +5,20 @@ from typing import Annotated
 
 import bcrypt
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from jose import jwt
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
 from pydantic import BaseModel
 
 from app.services.config import settings
 
 router = APIRouter()
 security = HTTPBasic()
+optional_basic = HTTPBasic(auto_error=False)
+optional_bearer = HTTPBearer(auto_error=False)
 
 
 class Token(BaseModel):
@@ -38,6 +44,9 @@ def verify_password(plain_password: str, stored_password: str) -> bool:
 
 def create_access_token(username: str) -> tuple[str, datetime]:
     """Create a JWT access token."""
+    # Imported lazily, python-jose pulls in the crypto backends
+    from jose import jwt
+    
     expires = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     
     to_encode = {
@@ -49,6 +58,49 @@ def create_access_token(username: str) -> tuple[str, datetime]:
     return token, expires
 
 
+def decode_access_token(token: str) -> str | None:
+    """Get the username from a JWT access token, or None if it's invalid."""
+    from jose import JWTError, jwt
+    
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
+    except JWTError:
+        return None
+    
+    return payload.get("sub")
+
+
+async def require_auth(
+    bearer: Annotated[HTTPAuthorizationCredentials | None, Depends(optional_bearer)],
+    basic: Annotated[HTTPBasicCredentials | None, Depends(optional_basic)],
+) -> str:
+    """
+    Require a valid bearer token or HTTP Basic credentials.
+    
+    Returns the authenticated username. Always passes when auth is disabled.
+    """
+    if not settings.auth_enabled:
+        return settings.auth_username
+    
+    if bearer is not None:
+        username = decode_access_token(bearer.credentials)
+        if username is not None:
+            return username
+    
+    if (
+        basic is not None
+        and basic.username == settings.auth_username
+        and verify_password(basic.password, settings.auth_password)
+    ):
+        return basic.username
+    
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Authentication required",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 @router.post("/login", response_model=Token)
 async def login(request: LoginRequest) -> Token:
     """
@@ -0,0 +1,247 @@
+"""Balance planning and simulation API endpoints."""
+
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from app.services.balancer import (
+    PARETO_TOLERANCES,
+    DiskState,
+    Placement,
+    Plan,
+    get_disk_states,
+    pareto_frontier,
+)
+from app.services.config import settings
+from app.services.plan_cache import get_plan
+from app.services.shares import load_share_configs
+from app.services.simulator import ThroughputModel, compare_concurrency, load_throughput_model
+
+router = APIRouter()
+
+# Moves listed in a plan response, the full plan can be millions of files
+PLAN_PREVIEW_MOVES = 100
+
+
+class PlanRequest(BaseModel):
+    """Targets to plan for."""
+    
+    # Disk ID -> target fill percent, disks left out get the equal-fill target
+    targets: dict[str, float] | None = None
+    # Disks this close to their target (percent points) are left alone
+    tolerance_percent: float = Field(default=0.0, ge=0, le=50)
+    # "hot_cold" also puts recently used units on fast disks, default PLAN_PLACEMENT
+    placement: Literal["balance", "hot_cold"] | None = None
+
+
+class SimulateRequest(PlanRequest):
+    """Targets to plan for and concurrency levels to compare."""
+    
+    concurrency: list[int] = Field(default=[1, 2, 4, 8], min_length=1, max_length=16)
+
+
+class ParetoRequest(BaseModel):
+    """Targets to plan for and tolerances to compare."""
+    
+    targets: dict[str, float] | None = None
+    tolerances_percent: list[float] = Field(
+        default=list(PARETO_TOLERANCES),
+        min_length=1,
+        max_length=16,
+    )
+    placement: Literal["balance", "hot_cold"] | None = None
+
+
+class DiskProjection(BaseModel):
+    """A disk's fill before and after the plan."""
+    
+    disk_id: str
+    target_percent: float
+    used_percent_before: float
+    used_percent_after: float
+
+
+class PlannedMoveInfo(BaseModel):
+    """A planned move."""
+    
+    source_disk: str
+    dest_disk: str
+    path: str
+    size_bytes: int
+    file_count: int
+    is_dir: bool
+
+
+class PlanSummary(BaseModel):
+    """A balance plan."""
+    
+    total_files: int
+    total_bytes: int
+    move_count: int
+    max_deviation_percent: float
+    tolerance_percent: float
+    estimated_seconds: float  # Serial move time from the cost model
+    origin: str  # "full", "warm" (adjusted from an earlier plan) or "cache"
+    placement: str  # "balance" or "hot_cold"
+    disks: list[DiskProjection]
+    moves: list[PlannedMoveInfo]
+
+
+class SimulationInfo(BaseModel):
+    """Predicted run at one concurrency level."""
+    
+    concurrency: int
+    total_seconds: float
+    disk_busy_seconds: dict[str, float]
+    parity_busy_seconds: float
+    bottleneck: str
+
+
+class SimulationReport(BaseModel):
+    """Predicted runs of a plan."""
+    
+    dry_run: bool
+    plan: PlanSummary
+    parity_bytes_per_second: float
+    file_overhead_seconds: float
+    measured_disks: list[str]
+    recommended_concurrency: int
+    results: list[SimulationInfo]
+
+
+def _disks(targets: dict[str, float] | None) -> dict[str, DiskState]:
+    """Get the disk states, rejecting targets for unknown disks."""
+    disks = get_disk_states()
+    unknown = set(targets or {}) - set(disks)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown disks: {', '.join(sorted(unknown))}")
+    return disks
+
+
+def _placement(mode: str | None, model: ThroughputModel) -> Placement | None:
+    """Get the hot/cold placement if requested, or configured by default."""
+    return model.placement() if (mode or settings.plan_placement) == "hot_cold" else None
+
+
+async def _plan(request: PlanRequest, model: ThroughputModel) -> Plan:
+    """Get a plan with the cost model of the measured speeds."""
+    return await get_plan(
+        _disks(request.targets),
+        request.targets,
+        model.move_cost(),
+        request.tolerance_percent,
+        shares=load_share_configs(),
+        placement=_placement(request.placement, model),
+    )
+
+
+def _summarize(plan: Plan) -> PlanSummary:
+    """Build the API response for a plan."""
+    after = plan.projected_used()
+    return PlanSummary(
+        total_files=plan.total_files,
+        total_bytes=plan.total_bytes,
+        move_count=len(plan.moves),
+        max_deviation_percent=round(plan.max_deviation(), 3),
+        tolerance_percent=plan.tolerance_percent,
+        estimated_seconds=round(plan.cost_seconds, 1),
+        origin=plan.origin,
+        placement=plan.placement,
+        disks=[
+            DiskProjection(
+                disk_id=disk_id,
+                target_percent=round(plan.targets[disk_id], 3),
+                used_percent_before=round(disk.used_percent, 3),
+                used_percent_after=round(after[disk_id] / disk.total_bytes * 100, 3) if disk.total_bytes else 0.0,
+            )
+            for disk_id, disk in plan.disks.items()
+        ],
+        moves=[
+            PlannedMoveInfo(
+                source_disk=m.source_disk,
+                dest_disk=m.dest_disk,
+                path=m.path,
+                size_bytes=m.size,
+                file_count=m.file_count,
+                is_dir=m.is_dir,
+            )
+            for m in plan.moves[:PLAN_PREVIEW_MOVES]
+        ],
+    )
+
+
+@router.post("/plan", response_model=PlanSummary)
+async def create_plan(request: PlanRequest) -> PlanSummary:
+    """
+    Plan moves that bring every disk to its target fill.
+    
+    Whole directories are moved as units according to each share's
+    split level. Moves whose per-file overhead and directory split
+    penalty outweigh their transfer time are skipped. Plans are cached, and a changed
+    request starts from the most recent plan.
+    
+    With `hot_cold` placement, recently used units also go to the disks
+    with the fastest measured reads and long unused ones to the slowest,
+    swapped in pairs so the fill targets still hold.
+    """
+    return _summarize(await _plan(request, await load_throughput_model()))
+
+
+@router.post("/pareto", response_model=list[PlanSummary])
+async def create_pareto_plans(request: ParetoRequest) -> list[PlanSummary]:
+    """
+    Plan at several tolerances and return the plans worth choosing from.
+    
+    Plans are ordered from cheapest to most balanced; a plan that another
+    one beats on both move time and balance is left out.
+    """
+    tolerances = tuple(t for t in request.tolerances_percent if 0 <= t <= 50)
+    if not tolerances:
+        raise HTTPException(status_code=400, detail="Tolerances must be between 0 and 50")
+    disks = _disks(request.targets)
+    model = await load_throughput_model()
+    cost = model.move_cost()
+    shares = load_share_configs()
+    placement = _placement(request.placement, model)
+    plans = [
+        await get_plan(disks, request.targets, cost, t, shares=shares, placement=placement)
+        for t in sorted(set(tolerances))
+    ]
+    return [_summarize(plan) for plan in pareto_frontier(plans)]
+
+
+@router.post("/simulate", response_model=SimulationReport)
+async def simulate_plan(request: SimulateRequest) -> SimulationReport:
+    """
+    Plan moves and predict how long they take at several concurrency levels.
+    
+    Speeds come from the move history; disks without history use defaults.
+    Moves run at the recommended level with MOVE_CONCURRENCY set to it.
+    """
+    model = await load_throughput_model()
+    plan = await _plan(request, model)
+    levels = sorted({level for level in request.concurrency if level > 0})
+    if not levels:
+        raise HTTPException(status_code=400, detail="At least one concurrency level above 0 is required")
+    results, recommended = await asyncio.to_thread(compare_concurrency, plan, model, levels)
+    
+    return SimulationReport(
+        dry_run=settings.dry_run,
+        plan=_summarize(plan),
+        parity_bytes_per_second=model.parity_bps,
+        file_overhead_seconds=model.file_overhead_seconds,
+        measured_disks=sorted(set(model.read_bps) | set(model.write_bps)),
+        recommended_concurrency=recommended,
+        results=[
+            SimulationInfo(
+                concurrency=r.concurrency,
+                total_seconds=round(r.total_seconds, 1),
+                disk_busy_seconds={d: round(s, 1) for d, s in sorted(r.disk_busy_seconds.items())},
+                parity_busy_seconds=round(r.parity_busy_seconds, 1),
+                bottleneck=r.bottleneck,
+            )
+            for r in results
+        ],
+    )
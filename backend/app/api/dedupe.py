@@ -0,0 +1,122 @@
+"""Duplicate file detection API endpoints."""
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from app.services.dedupe import dedupe_job
+
+router = APIRouter()
+
+
+class DedupeProgress(BaseModel):
+    """Progress of duplicate detection."""
+    
+    is_running: bool
+    stage: str
+    files_total: int
+    files_done: int
+    error: str | None
+
+
+class DuplicateFile(BaseModel):
+    """One copy in a duplicate group."""
+    
+    disk_id: str
+    path: str
+
+
+class DuplicateGroup(BaseModel):
+    """Files with identical content."""
+    
+    size_bytes: int
+    digest: str
+    wasted_bytes: int
+    files: list[DuplicateFile]
+
+
+class DedupeReport(BaseModel):
+    """Result of the last completed duplicate detection run."""
+    
+    total_groups: int
+    wasted_bytes: int
+    size_candidates: int
+    partial_hashed: int
+    full_hashed: int
+    cache_hits: int
+    duration_seconds: float
+    groups: list[DuplicateGroup]
+
+
+@router.post("/start")
+async def start_dedupe(min_size_bytes: int | None = Query(None, ge=0)) -> dict:
+    """Start duplicate detection over the current index."""
+    try:
+        dedupe_job.start(min_size_bytes)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
+    return {
+        "status": "accepted",
+        "message": "Duplicate detection queued",
+    }
+
+
+@router.post("/cancel")
+async def cancel_dedupe() -> dict:
+    """Cancel ongoing duplicate detection."""
+    if not dedupe_job.cancel():
+        return {
+            "status": "ok",
+            "message": "No duplicate detection running",
+        }
+    
+    return {
+        "status": "ok",
+        "message": "Duplicate detection cancelled",
+    }
+
+
+@router.get("/progress", response_model=DedupeProgress)
+async def get_dedupe_progress() -> DedupeProgress:
+    """Get progress of duplicate detection."""
+    progress = dedupe_job.progress
+    return DedupeProgress(
+        is_running=progress.is_running,
+        stage=progress.stage,
+        files_total=progress.files_total,
+        files_done=progress.files_done,
+        error=progress.error,
+    )
+
+
+@router.get("/report", response_model=DedupeReport)
+async def get_dedupe_report(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+) -> DedupeReport:
+    """Get duplicate groups from the last run, largest waste first."""
+    report = dedupe_job.report
+    if report is None:
+        raise HTTPException(status_code=404, detail="No duplicate detection results yet")
+    
+    return DedupeReport(
+        total_groups=len(report.groups),
+        wasted_bytes=report.wasted_bytes,
+        size_candidates=report.size_candidates,
+        partial_hashed=report.partial_hashed,
+        full_hashed=report.full_hashed,
+        cache_hits=report.cache_hits,
+        duration_seconds=round(report.duration_seconds, 2),
+        groups=[
+            DuplicateGroup(
+                size_bytes=group.size,
+                digest=group.digest,
+                wasted_bytes=group.wasted_bytes,
+                files=[
+                    DuplicateFile(disk_id=c.key.disk_id, path=str(c.path))
+                    for c in group.files
+                ],
+            )
+            for group in report.groups[offset:offset + limit]
+        ],
+    )
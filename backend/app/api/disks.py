@@ -2,12 +2,14 @@
 
 import os
 import re
+from datetime import datetime
 from glob import glob
 from pathlib import Path
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app.services.calibration import get_calibrated_throughput
 from app.services.config import settings
 
 router = APIRouter()
@@ -40,6 +42,16 @@ class DiskListResponse(BaseModel):
     average_used_percent: float
 
 
+class DiskThroughputInfo(BaseModel):
+    """Latest calibration result of a disk."""
+    
+    disk_id: str
+    read_bytes_per_second: float
+    write_bytes_per_second: float
+    probe_bytes: int
+    measured_at: datetime
+
+
 def get_disk_info(mount_point: str) -> DiskInfo | None:
     """Get information about a single disk."""
     path = Path(mount_point)
@@ -141,10 +153,29 @@ async def list_disks() -> DiskListResponse:
     )
 
 
+@router.get("/throughput", response_model=list[DiskThroughputInfo])
+async def list_disk_throughput() -> list[DiskThroughputInfo]:
+    """
+    Get the measured speeds of calibrated disks.
+    
+    Queue a "calibrate" task to measure them.
+    """
+    return [
+        DiskThroughputInfo(
+            disk_id=t.disk_id,
+            read_bytes_per_second=round(t.read_bps),
+            write_bytes_per_second=round(t.write_bps),
+            probe_bytes=t.probe_bytes,
+            measured_at=t.measured_at,
+        )
+        for t in (await get_calibrated_throughput()).values()
+    ]
+
+
 @router.get("/{disk_id}", response_model=DiskInfo)
 async def get_disk(disk_id: str) -> DiskInfo:
     """Get information about a specific disk."""
-    mount_point = f"/mnt/{disk_id}"
+    mount_point = str(settings.disk_mount_root / disk_id)
     
     info = get_disk_info(mount_point)
     if not info:
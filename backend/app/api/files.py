@@ -1,10 +1,13 @@
 """File browser API endpoints."""
 
-from pathlib import Path
+from typing import Literal
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
+from app.services.browser import list_union
+from app.services.config import settings
+
 router = APIRouter()
 
 
@@ -31,6 +34,90 @@ class DirectoryContents(BaseModel):
     directory_count: int
 
 
+class DiskPortionInfo(BaseModel):
+    """The part of a merged entry stored on one disk."""
+    
+    disk_id: str
+    size_bytes: int | None  # None for directories that were scanned live
+    file_count: int | None
+    modified_at: float | None
+
+
+class UnionItem(BaseModel):
+    """A file or directory of a merged listing."""
+    
+    name: str
+    path: str
+    is_directory: bool
+    size_bytes: int | None
+    disks: list[DiskPortionInfo]
+
+
+class UnionContents(BaseModel):
+    """A share directory merged over all disks."""
+    
+    path: str
+    parent_path: str | None
+    disks: list[str]  # Disks holding the directory
+    sources: dict[str, str]  # Disk ID -> "index" or "scan"
+    items: list[UnionItem]
+    total_size_bytes: int | None
+    file_count: int
+    directory_count: int
+
+
+@router.get("/union", response_model=UnionContents)
+async def browse_union(
+    path: str = Query("/", description="Path relative to the user share root, e.g. /Movies"),
+    source: Literal["auto", "index", "scan"] = Query(
+        "auto",
+        description="Read from the index, scan the disks, or index where current",
+    ),
+) -> UnionContents:
+    """
+    Browse a directory merged over all disks, like /mnt/user.
+    
+    Every entry lists the disks holding it and its size on each.
+    """
+    try:
+        listing = await list_union(path, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if not listing.sources and listing.path:
+        raise HTTPException(status_code=404, detail="Path not found")
+    
+    items = [
+        UnionItem(
+            name=entry.name,
+            path=f"{listing.path}/{entry.name}" if listing.path else entry.name,
+            is_directory=entry.is_directory,
+            size_bytes=entry.size_bytes,
+            disks=[
+                DiskPortionInfo(
+                    disk_id=p.disk_id,
+                    size_bytes=p.size_bytes,
+                    file_count=p.file_count,
+                    modified_at=p.modified_at,
+                )
+                for p in entry.portions
+            ],
+        )
+        for entry in listing.entries
+    ]
+    sizes = [item.size_bytes for item in items]
+    
+    return UnionContents(
+        path=listing.path,
+        parent_path=listing.path.rpartition("/")[0] if listing.path else None,
+        disks=list(listing.sources),
+        sources=listing.sources,
+        items=items,
+        total_size_bytes=None if None in sizes else sum(sizes),
+        file_count=sum(not item.is_directory for item in items),
+        directory_count=sum(item.is_directory for item in items),
+    )
+
+
 @router.get("/{disk_id}", response_model=DirectoryContents)
 async def browse_disk(
     disk_id: str,
@@ -41,7 +128,7 @@ async def browse_disk(
     
     Returns directory contents with size information.
     """
-    mount_point = Path(f"/mnt/{disk_id}")
+    mount_point = settings.disk_mount_root / disk_id
     
     if not mount_point.exists():
         raise HTTPException(status_code=404, detail=f"Disk not found: {disk_id}")
@@ -7,16 +7,42 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel
 
 from app import __version__
+from app.services.permissions import PermissionDiff, PermissionReport
 
 router = APIRouter()
 
 _start_time = time.time()
 
 
+def _get_permission_report(request: Request) -> PermissionReport | None:
+    """Get the latest permission report from the background monitor."""
+    monitor = getattr(request.app.state, "permission_monitor", None)
+    return monitor.report if monitor else None
+
+
+def _serialize_diff(diff: PermissionDiff | None) -> dict | None:
+    """Convert a permission diff to a JSON-friendly dict."""
+    if diff is None:
+        return None
+    return {
+        "disks_added": diff.disks_added,
+        "disks_removed": diff.disks_removed,
+        "changes": [
+            {
+                "name": c.name,
+                "old_status": c.old_status,
+                "new_status": c.new_status,
+                "error": c.error,
+            }
+            for c in diff.changes
+        ],
+    }
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     
-    status: Literal["healthy", "degraded", "unhealthy"]
+    status: Literal["starting", "healthy", "degraded", "unhealthy"]
     version: str
     uptime_seconds: int
     array_status: Literal["online", "offline", "unknown"]
@@ -34,10 +60,19 @@ async def health_check(request: Request) -> HealthResponse:
     This endpoint is used for Docker health checks and monitoring.
     """
     warnings: list[str] = []
-    status: Literal["healthy", "degraded", "unhealthy"] = "healthy"
+    status: Literal["starting", "healthy", "degraded", "unhealthy"] = "healthy"
+    
+    # Startup work runs in the background after the server is up
+    startup_status = getattr(request.app.state, "startup_status", "ready")
+    if startup_status == "starting":
+        status = "starting"
+        warnings.append("Startup checks in progress")
+    elif startup_status == "failed":
+        status = "unhealthy"
+        warnings.append("Startup failed, see logs")
     
-    # Check permission report from startup
-    permission_report = getattr(request.app.state, "permission_report", None)
+    # Check latest permission report
+    permission_report = _get_permission_report(request)
     permissions_ok = True
     
     if permission_report:
@@ -46,7 +81,8 @@ async def health_check(request: Request) -> HealthResponse:
             permissions_ok = False
             warnings.append("Critical permission failures")
         elif permission_report.warning_checks:
-            status = "degraded"
+            if status == "healthy":
+                status = "degraded"
             for check in permission_report.warning_checks:
                 warnings.append(f"Permission warning: {check.name}")
     
@@ -74,12 +110,17 @@ async def health_check(request: Request) -> HealthResponse:
 @router.get("/permissions")
 async def get_permissions(request: Request) -> dict:
     """Get detailed permission check results."""
-    report = getattr(request.app.state, "permission_report", None)
+    report = _get_permission_report(request)
     
     if not report:
         return {"error": "Permission report not available"}
     
+    monitor = request.app.state.permission_monitor
+    
     return {
+        "checked_at": report.checked_at,
+        "disks": report.disks,
+        "last_change": _serialize_diff(monitor.last_diff),
         "running_as_uid": report.running_as_uid,
         "running_as_gid": report.running_as_gid,
         "all_passed": report.all_passed,
@@ -95,3 +136,19 @@ async def get_permissions(request: Request) -> dict:
             for c in report.checks
         ],
     }
+
+
+@router.post("/permissions/recheck")
+async def recheck_permissions(request: Request) -> dict:
+    """Re-run permission checks now and return what changed."""
+    monitor = getattr(request.app.state, "permission_monitor", None)
+    
+    if not monitor:
+        return {"error": "Permission monitor not available"}
+    
+    diff = await monitor.refresh()
+    
+    return {
+        "checked_at": monitor.report.checked_at,
+        "changes": _serialize_diff(diff),
+    }
@@ -1,10 +1,16 @@
 """File index API endpoints."""
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
+from app.services.config import settings
+from app.services.indexer import get_indexed_disks, get_meta, indexer
+from app.services.snapshot import MEDIA_TYPE, export_snapshot, pyarrow_available
+from app.services.watcher import index_watcher
+
 router = APIRouter()
 
 
@@ -17,6 +23,8 @@ class IndexStatus(BaseModel):
     total_size_bytes: int
     index_duration_seconds: float | None
     disks_indexed: list[str]
+    disks_watched: dict[str, str]  # Disk ID -> "fanotify" or "inotify"
+    pending_changes: int  # Changed directories not applied yet
 
 
 class IndexProgress(BaseModel):
@@ -34,36 +42,69 @@ class IndexProgress(BaseModel):
 @router.get("/status", response_model=IndexStatus)
 async def get_index_status() -> IndexStatus:
     """Get the current status of the file index."""
-    # TODO: Implement actual index status checking
+    disks = await get_indexed_disks()
+    last_indexed = await get_meta("last_indexed_at")
+    duration = await get_meta("duration_seconds")
+    
+    last_indexed_at = datetime.fromisoformat(last_indexed) if last_indexed else None
+    
+    if indexer.is_running:
+        status = "indexing"
+    elif last_indexed_at is None:
+        status = "none"
+    elif disks and all(index_watcher.is_current(d["disk_id"]) for d in disks):
+        status = "current"
+    elif datetime.utcnow() - last_indexed_at > timedelta(hours=settings.index_stale_hours):
+        status = "stale"
+    else:
+        status = "current"
+    
     return IndexStatus(
-        status="none",
-        last_indexed_at=None,
-        total_files=0,
-        total_size_bytes=0,
-        index_duration_seconds=None,
-        disks_indexed=[],
+        status=status,
+        last_indexed_at=last_indexed_at,
+        total_files=sum(d["file_count"] for d in disks),
+        total_size_bytes=sum(d["total_bytes"] for d in disks),
+        index_duration_seconds=float(duration) if duration else None,
+        disks_indexed=[d["disk_id"] for d in disks],
+        disks_watched=index_watcher.backends,
+        pending_changes=index_watcher.pending,
     )
 
 
 @router.get("/progress", response_model=IndexProgress)
 async def get_index_progress() -> IndexProgress:
     """Get progress of ongoing index operation."""
-    # TODO: Implement actual progress tracking
+    progress = indexer.progress
+    elapsed = progress.elapsed_seconds
+    estimate = progress.total_files_estimate
+    
+    percent = 0.0
+    eta = None
+    if estimate > 0:
+        percent = min(100.0, progress.files_processed / estimate * 100)
+        if progress.is_running and progress.files_processed:
+            rate = progress.files_processed / elapsed
+            eta = max(0.0, (estimate - progress.files_processed) / rate)
+    
     return IndexProgress(
-        is_running=False,
-        current_disk=None,
-        files_processed=0,
-        total_files_estimate=0,
-        percent_complete=0,
-        elapsed_seconds=0,
-        eta_seconds=None,
+        is_running=progress.is_running,
+        current_disk=", ".join(progress.current_disks) or None,
+        files_processed=progress.files_processed,
+        total_files_estimate=estimate,
+        percent_complete=round(percent, 2),
+        elapsed_seconds=round(elapsed, 2),
+        eta_seconds=round(eta, 2) if eta is not None else None,
     )
 
 
 @router.post("/start")
-async def start_index() -> dict:
-    """Start indexing the array."""
-    # TODO: Implement actual indexing
+async def start_index(disk_ids: list[str] | None = None) -> dict:
+    """Start indexing the array, or only the given disks."""
+    try:
+        indexer.start(disk_ids)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    
     return {
         "status": "accepted",
         "message": "Index operation queued",
@@ -73,8 +114,30 @@ async def start_index() -> dict:
 @router.post("/cancel")
 async def cancel_index() -> dict:
     """Cancel ongoing index operation."""
-    # TODO: Implement cancellation
+    if not indexer.cancel():
+        return {
+            "status": "ok",
+            "message": "No index operation running",
+        }
+    
     return {
         "status": "ok",
         "message": "Index cancelled",
     }
+
+
+@router.get("/snapshot/{disk_id}", response_class=FileResponse)
+async def get_index_snapshot(disk_id: str) -> FileResponse:
+    """
+    Download a disk's index as an Arrow IPC file.
+    
+    The snapshot from the last index run is returned as is; if changes
+    were applied since, it is rewritten from the index first. Readable
+    with pyarrow, polars or DuckDB, memory-mapped without parsing.
+    """
+    if not pyarrow_available():
+        raise HTTPException(status_code=503, detail="Snapshots need pyarrow")
+    path = await export_snapshot(disk_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Disk {disk_id} is not indexed")
+    return FileResponse(path, media_type=MEDIA_TYPE, filename=path.name)
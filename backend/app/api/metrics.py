@@ -0,0 +1,76 @@
+"""Prometheus metrics endpoint and request instrumentation."""
+
+import time
+from collections.abc import Awaitable, Callable
+
+import aiosqlite
+from fastapi import APIRouter, FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.services.database import fetch_all
+from app.services.metrics import QUEUE_DEPTH, REQUEST_LATENCY
+
+router = APIRouter()
+
+TASK_STATUSES = ("pending", "queued", "running", "paused", "completed", "failed", "cancelled")
+
+
+async def _update_queue_depth() -> None:
+    """Refresh the queue gauges from the task table."""
+    counts = dict.fromkeys(TASK_STATUSES, 0)
+    try:
+        rows = await fetch_all("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")
+    except aiosqlite.OperationalError:
+        # Schema not created yet, startup is still running
+        return
+    for row in rows:
+        counts[row["status"]] = row["n"]
+    for status, n in counts.items():
+        QUEUE_DEPTH.labels(status).set(n)
+
+
+@router.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Get metrics in Prometheus text format.
+    
+    Point a Prometheus scrape job at /api/metrics.
+    """
+    await _update_queue_depth()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+async def record_router(request: Request) -> None:
+    """
+    Remember which router served the request.
+    
+    Used as an app-wide dependency, the matched route is only known once
+    routing is done.
+    """
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not None:
+        # app.api.disks -> "disks"
+        request.state.metrics_router = endpoint.__module__.rsplit(".", 1)[-1]
+
+
+def instrument_app(app: FastAPI) -> None:
+    """Record request latency per router for every request."""
+    
+    @app.middleware("http")
+    async def record_request_latency(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+        start = time.perf_counter()
+        status = 500
+        # Creates the shared state dict before routing copies the scope
+        request.state.metrics_router = "unmatched"
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUEST_LATENCY.labels(
+                request.state.metrics_router, request.method, str(status)
+            ).observe(elapsed)
@@ -1,12 +1,11 @@
 """Mover integration API endpoints."""
 
 from datetime import datetime
-from pathlib import Path
 
 from fastapi import APIRouter
 from pydantic import BaseModel
 
-from app.services.config import settings
+from app.services.mover import mover_running
 
 router = APIRouter()
 
@@ -26,18 +25,7 @@ async def get_mover_status() -> MoverStatus:
     
     Checks for mover.pid to determine if mover is running.
     """
-    is_running = False
-    
-    # Check for mover PID file
-    pid_path = settings.mover_pid_path
-    if pid_path.exists():
-        try:
-            pid = int(pid_path.read_text().strip())
-            # Check if process is actually running
-            proc_path = Path(f"/proc/{pid}")
-            is_running = proc_path.exists()
-        except (ValueError, PermissionError):
-            pass
+    is_running = mover_running()
     
     # TODO: Parse dynamix.cfg for schedule
     next_scheduled = None
@@ -1,11 +1,17 @@
 """Task queue API endpoints."""
 
+import json
 from datetime import datetime
 from typing import Literal
 
+import aiosqlite
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app.services.indexer import discover_disks
+from app.services.schedule import count_spin_ups, task_disks
+from app.services.tasks import SCHEDULE_WINDOW, task_queue
+
 router = APIRouter()
 
 
@@ -16,6 +22,7 @@ class Task(BaseModel):
     type: str
     status: Literal["pending", "queued", "running", "paused", "completed", "failed", "cancelled"]
     priority: Literal["low", "normal", "high", "urgent"]
+    correlation_group: str | None
     created_at: datetime
     started_at: datetime | None
     completed_at: datetime | None
@@ -24,14 +31,27 @@ class Task(BaseModel):
     error: str | None
 
 
+class ScheduledRun(BaseModel):
+    """Queued tasks that run back to back on the same disks."""
+    
+    correlation_group: str | None
+    source_disk: str | None
+    dest_disk: str | None
+    task_ids: list[int]
+
+
 class TaskQueue(BaseModel):
     """Current state of the task queue."""
     
-    running: Task | None
-    queued: list[Task]
+    running: Task | None  # The oldest one when moves run in parallel
+    queued: list[Task]  # In the order they will run
     completed: list[Task]
     is_paused: bool
     pause_reason: str | None
+    schedule: list[ScheduledRun]
+    spin_ups: int  # Disks woken running the queue in this order
+    spin_ups_in_creation_order: int  # By priority, then creation, as a comparison
+    idle_disks: list[str]  # Disks no queued or running task touches
 
 
 class CreateTaskRequest(BaseModel):
@@ -39,40 +59,107 @@ class CreateTaskRequest(BaseModel):
     
     type: str
     priority: Literal["low", "normal", "high", "urgent"] = "normal"
+    correlation_group: str | None = None
     details: dict
 
 
+def _to_task(row: aiosqlite.Row) -> Task:
+    """Build the API model of a task row."""
+    progress = task_queue.progress(row["id"])
+    if progress is None:
+        progress = 100.0 if row["status"] == "completed" else 0.0
+    return Task(
+        id=row["id"],
+        type=row["type"],
+        status=row["status"],
+        priority=row["priority"],
+        correlation_group=row["correlation_group"],
+        created_at=row["created_at"],
+        started_at=row["started_at"],
+        completed_at=row["completed_at"],
+        progress_percent=round(progress, 1),
+        details=json.loads(row["details"]),
+        error=row["error"],
+    )
+
+
 @router.get("", response_model=TaskQueue)
 async def get_task_queue() -> TaskQueue:
-    """Get the current task queue state."""
-    # TODO: Implement actual queue management
+    """
+    Get the current task queue state.
+    
+    Queued tasks are listed in the order they will run: moves are grouped
+    into runs between the same two disks, so disks without work stay idle.
+    """
+    running = await task_queue.list_tasks(("running",))
+    runs = await task_queue.schedule()
+    queued = [row for run in runs for row in run.tasks]
+    active = task_queue.active_disks
+    busy = {disk for run in runs for disk in run.disks}
+    for row in running:
+        busy |= task_disks(row)
+    
     return TaskQueue(
-        running=None,
-        queued=[],
-        completed=[],
+        running=_to_task(running[0]) if running else None,
+        queued=[_to_task(row) for row in queued[:100]],
+        completed=[_to_task(row) for row in await task_queue.list_finished()],
+        # TODO: Implement pausing the queue
         is_paused=False,
         pause_reason=None,
+        schedule=[
+            ScheduledRun(
+                correlation_group=run.correlation_group,
+                source_disk=run.source_disk,
+                dest_disk=run.dest_disk,
+                task_ids=[row["id"] for row in run.tasks],
+            )
+            for run in runs
+        ],
+        spin_ups=count_spin_ups((run.disks for run in runs), active),
+        spin_ups_in_creation_order=count_spin_ups(
+            (
+                task_disks(row)
+                for row in await task_queue.list_tasks(("pending", "queued"), SCHEDULE_WINDOW)
+            ),
+            active,
+        ),
+        idle_disks=[disk for disk in discover_disks() if disk not in busy],
     )
 
 
 @router.post("", response_model=Task)
 async def create_task(request: CreateTaskRequest) -> Task:
-    """Create a new task."""
-    # TODO: Implement task creation
-    raise HTTPException(status_code=501, detail="Not implemented")
+    """
+    Create a new task.
+    
+    Types are "move_file", "move_dir", "undo" and "calibrate", see
+    docs/API.md for their details.
+    """
+    try:
+        task_id = await task_queue.create(
+            request.type, request.details, request.priority, request.correlation_group
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return _to_task(await task_queue.get(task_id))
 
 
 @router.get("/{task_id}", response_model=Task)
 async def get_task(task_id: int) -> Task:
     """Get a specific task by ID."""
-    # TODO: Implement task retrieval
-    raise HTTPException(status_code=404, detail="Task not found")
+    row = await task_queue.get(task_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _to_task(row)
 
 
 @router.post("/{task_id}/cancel")
 async def cancel_task(task_id: int) -> dict:
     """Cancel a task (at next safe point)."""
-    # TODO: Implement cancellation
+    if await task_queue.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not await task_queue.cancel(task_id):
+        raise HTTPException(status_code=409, detail="Task already finished")
     return {
         "status": "accepted",
         "message": "Task will be cancelled at next safe point",
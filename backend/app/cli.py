@@ -0,0 +1,331 @@
+"""Command line interface for running jobs without the web server.
+
+Uses the same services and databases as the web app, but never imports
+FastAPI and starts no background services, so it suits scheduled runs
+(e.g. from the unRAID User Scripts plugin):
+    array-balancer index
+    array-balancer plan --target disk1=60 --tolerance 2
+    array-balancer simulate --concurrency 1 2 4
+    array-balancer move --no-dry-run
+    array-balancer undo --group cli-20250101-030000
+
+Output is NDJSON on stdout: one JSON object per line, each with an
+"event" key. Logs go to stderr. The exit code is 0 on success, 1 if
+something failed and 2 for invalid arguments.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from collections import Counter
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any
+
+from app.services.analytics import ensure_usage
+from app.services.balancer import Plan, get_disk_states
+from app.services.checksum import hash_pool
+from app.services.config import settings
+from app.services.database import close_database, init_database, init_index_database
+from app.services.executor import partial_journal
+from app.services.indexer import Indexer
+from app.services.plan_cache import get_plan
+from app.services.shares import load_share_configs
+from app.services.simulator import ThroughputModel, compare_concurrency, load_throughput_model
+from app.services.tasks import FINISHED_STATUSES, task_queue
+from app.services.undo import undo_correlation_group, undo_task
+
+logger = logging.getLogger(__name__)
+
+
+def emit(event: str, **fields: Any) -> None:
+    """Write one event as a JSON line."""
+    sys.stdout.write(json.dumps({"event": event, **fields}, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def parse_target(value: str) -> tuple[str, float]:
+    """Parse a `disk1=60` target."""
+    disk_id, sep, percent = value.partition("=")
+    try:
+        if not sep or not disk_id:
+            raise ValueError
+        return disk_id, float(percent)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected DISK=PERCENT, got {value!r}") from None
+
+
+async def build_plan(args: argparse.Namespace, model: ThroughputModel | None = None) -> Plan:
+    """
+    Plan moves the way the balance API does.
+    
+    Raises:
+        ValueError: If a target names an unknown disk.
+    """
+    targets = dict(args.target) or None
+    disks = get_disk_states()
+    unknown = set(targets or {}) - set(disks)
+    if unknown:
+        raise ValueError(f"Unknown disks: {', '.join(sorted(unknown))}")
+    model = model or await load_throughput_model()
+    placement = args.placement or settings.plan_placement
+    return await get_plan(
+        disks,
+        targets,
+        model.move_cost(),
+        args.tolerance,
+        shares=load_share_configs(),
+        placement=model.placement() if placement == "hot_cold" else None,
+    )
+
+
+def emit_plan(plan: Plan) -> None:
+    """Write a plan summary event."""
+    after = plan.projected_used()
+    emit(
+        "plan",
+        total_files=plan.total_files,
+        total_bytes=plan.total_bytes,
+        move_count=len(plan.moves),
+        max_deviation_percent=round(plan.max_deviation(), 3),
+        tolerance_percent=plan.tolerance_percent,
+        estimated_seconds=round(plan.cost_seconds, 1),
+        origin=plan.origin,
+        placement=plan.placement,
+        disks=[
+            {
+                "disk_id": disk_id,
+                "target_percent": round(plan.targets[disk_id], 3),
+                "used_percent_before": round(disk.used_percent, 3),
+                "used_percent_after": (
+                    round(after[disk_id] / disk.total_bytes * 100, 3) if disk.total_bytes else 0.0
+                ),
+            }
+            for disk_id, disk in plan.disks.items()
+        ],
+    )
+
+
+async def cmd_index(args: argparse.Namespace) -> int:
+    """Index disks, reporting progress every `--progress-seconds`."""
+    indexer = Indexer()
+    run = asyncio.create_task(indexer.run(args.disk or None))
+    while not run.done():
+        await asyncio.wait([run], timeout=args.progress_seconds)
+        progress = indexer.progress
+        if not run.done():
+            emit(
+                "progress",
+                files_processed=progress.files_processed,
+                total_files_estimate=progress.total_files_estimate,
+                current_disks=progress.current_disks,
+                elapsed_seconds=round(progress.elapsed_seconds, 1),
+            )
+    
+    try:
+        results = run.result()
+    except Exception as e:
+        emit("error", error=str(e))
+        return 1
+    for result in results:
+        emit("disk", **asdict(result))
+    emit(
+        "done",
+        disks=len(results),
+        files=sum(r.file_count for r in results),
+        duration_seconds=round(indexer.progress.elapsed_seconds, 1),
+        error=indexer.progress.error,
+    )
+    return 1 if indexer.progress.error else 0
+
+
+async def cmd_plan(args: argparse.Namespace) -> int:
+    """Plan moves and list them."""
+    plan = await build_plan(args)
+    emit_plan(plan)
+    for move in plan.moves[: args.limit]:
+        emit("move", **asdict(move))
+    return 0
+
+
+async def cmd_simulate(args: argparse.Namespace) -> int:
+    """Plan moves and predict their duration at several concurrency levels."""
+    model = await load_throughput_model()
+    plan = await build_plan(args, model)
+    emit_plan(plan)
+    levels = sorted({level for level in args.concurrency if level > 0})
+    results, recommended = await asyncio.to_thread(compare_concurrency, plan, model, levels)
+    for r in results:
+        emit(
+            "simulation",
+            concurrency=r.concurrency,
+            total_seconds=round(r.total_seconds, 1),
+            disk_busy_seconds={d: round(s, 1) for d, s in sorted(r.disk_busy_seconds.items())},
+            parity_busy_seconds=round(r.parity_busy_seconds, 1),
+            bottleneck=r.bottleneck,
+        )
+    emit("done", recommended_concurrency=recommended, dry_run=settings.dry_run)
+    return 0
+
+
+async def cmd_move(args: argparse.Namespace) -> int:
+    """
+    Plan moves, queue them as tasks of one correlation group and run them.
+    
+    Only this group's tasks run here, up to MOVE_CONCURRENCY at once on
+    separate disks; the group can be undone later with `undo --group`.
+    """
+    group = args.group or f"cli-{datetime.now():%Y%m%d-%H%M%S}"
+    plan = await build_plan(args)
+    emit_plan(plan)
+    
+    for move in plan.moves:
+        source = plan.disks[move.source_disk].mount_point / move.path
+        dest = plan.disks[move.dest_disk].mount_point / move.path
+        details: dict[str, Any] = {"source": str(source), "destination": str(dest)}
+        if not move.is_dir:
+            details["size"] = move.size
+        await task_queue.create(
+            "move_dir" if move.is_dir else "move_file",
+            details,
+            correlation_group=group,
+        )
+    emit("queued", correlation_group=group, tasks=len(plan.moves), dry_run=settings.dry_run)
+    
+    statuses: Counter[str] = Counter()
+    
+    async def on_finished(task_id: int) -> None:
+        task = await task_queue.get(task_id)
+        details = json.loads(task["details"])
+        statuses[task["status"]] += 1
+        emit(
+            "task",
+            task_id=task["id"],
+            type=task["type"],
+            source=details.get("source"),
+            destination=details.get("destination"),
+            status=task["status"],
+            error=task["error"],
+            result=details.get("result"),
+        )
+    
+    await task_queue.run_available(group, on_finished)
+    emit("done", correlation_group=group, **{s: statuses[s] for s in FINISHED_STATUSES})
+    return 1 if statuses["failed"] else 0
+
+
+async def cmd_undo(args: argparse.Namespace) -> int:
+    """Undo the moves of a task or a correlation group."""
+    if args.task is not None:
+        result = await undo_task(args.task)
+    else:
+        result = await undo_correlation_group(args.group)
+    emit("done", **asdict(result))
+    return 1 if result.failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="array-balancer",
+        description="Index, plan and balance unRAID array disks, writing NDJSON events to stdout.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    index = commands.add_parser("index", help="Index disks")
+    index.add_argument("--disk", action="append", help="Disk ID to index (default: all)")
+    index.add_argument("--progress-seconds", type=float, default=5.0, help="Progress interval")
+    index.set_defaults(handler=cmd_index)
+    
+    def add_plan_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument(
+            "--target",
+            action="append",
+            type=parse_target,
+            default=[],
+            metavar="DISK=PERCENT",
+            help="Target fill of a disk (default: equal fill)",
+        )
+        command.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.0,
+            help="Leave disks this close to their target (percent points)",
+        )
+        command.add_argument(
+            "--placement",
+            choices=["balance", "hot_cold"],
+            help="Also put recently used data on fast disks (default: PLAN_PLACEMENT)",
+        )
+    
+    plan = commands.add_parser("plan", help="Plan moves")
+    add_plan_options(plan)
+    plan.add_argument("--limit", type=int, default=None, help="Moves to list (default: all)")
+    plan.set_defaults(handler=cmd_plan)
+    
+    simulate = commands.add_parser("simulate", help="Predict the duration of a plan")
+    add_plan_options(simulate)
+    simulate.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    simulate.set_defaults(handler=cmd_simulate)
+    
+    move = commands.add_parser("move", help="Plan moves and run them")
+    add_plan_options(move)
+    move.add_argument("--group", help="Correlation group of the tasks (default: cli-<time>)")
+    move.set_defaults(handler=cmd_move)
+    
+    undo = commands.add_parser("undo", help="Undo moves")
+    which = undo.add_mutually_exclusive_group(required=True)
+    which.add_argument("--task", type=int, help="Task ID")
+    which.add_argument("--group", help="Correlation group")
+    undo.set_defaults(handler=cmd_undo)
+    
+    for command in (move, undo):
+        command.add_argument(
+            "--dry-run",
+            action=argparse.BooleanOptionalAction,
+            default=None,
+            help="Override DRY_RUN",
+        )
+    return parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Open the databases, run a command and clean up."""
+    await asyncio.to_thread(settings.ensure_directories)
+    await init_database()
+    await init_index_database()
+    await ensure_usage()
+    await asyncio.to_thread(partial_journal.clean_up)
+    try:
+        return await args.handler(args)
+    except ValueError as e:
+        emit("error", error=str(e))
+        return 2
+    finally:
+        await asyncio.to_thread(hash_pool.shutdown)
+        await close_database()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point of the `array-balancer` script."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y.%m.%d_%H:%M:%S",
+        stream=sys.stderr,
+    )
+    if getattr(args, "dry_run", None) is not None:
+        settings.dry_run = args.dry_run
+    
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        emit("error", error="Interrupted")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
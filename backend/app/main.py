@@ -1,19 +1,42 @@
 """Main FastAPI application for unRAID Array Balancer."""
 
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.api import auth, disks, files, health, index, mover, tasks
+from app.api import (
+    admin,
+    analytics,
+    auth,
+    balance,
+    dedupe,
+    disks,
+    files,
+    health,
+    index,
+    metrics,
+    mover,
+    tasks,
+)
+from app.services.analytics import ensure_usage
+from app.services.checksum import hash_pool
 from app.services.config import settings
-from app.services.database import init_database
-from app.services.permissions import PermissionChecker
+from app.services.database import close_database, init_database, init_index_database
+from app.services.dedupe import dedupe_job
+from app.services.executor import partial_journal
+from app.services.indexer import indexer
+from app.services.permissions import permission_monitor
+from app.services.retention import RetentionService
+from app.services.tasks import task_queue
+from app.services.throttle import move_throttle
+from app.services.watcher import index_watcher
 
 # Configure logging
 logging.basicConfig(
@@ -24,32 +47,80 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def initialize(app: FastAPI) -> None:
+    """
+    Run slow startup work after the server is already accepting requests.
+    
+    Until this finishes, /api/health reports "starting".
+    """
+    try:
+        await asyncio.to_thread(settings.ensure_directories)
+        
+        # Initialize database
+        await init_database()
+        await init_index_database()
+        await ensure_usage()
+        logger.info("Database initialized")
+        
+        # Compact history and prune undo records now and then periodically
+        app.state.retention.start()
+        
+        # Remove what moves interrupted by a crash left, then run queued
+        # tasks, failing those interrupted by a restart
+        await asyncio.to_thread(partial_journal.clean_up)
+        task_queue.start()
+        
+        # Apply filesystem changes to the index as they happen
+        if settings.watcher_enabled:
+            index_watcher.start()
+        
+        # Check permissions, then keep re-checking in the background
+        monitor = app.state.permission_monitor
+        await monitor.start()
+        report = monitor.report
+        
+        if report is not None and report.has_critical_failures:
+            logger.error("Critical permission failures detected!")
+            for check in report.failed_checks:
+                logger.error("  - %s: %s", check.name, check.error)
+        else:
+            logger.info("Permission checks passed")
+        
+        app.state.startup_status = "ready"
+        logger.info("Startup complete")
+    except Exception:
+        logger.exception("Startup failed")
+        app.state.startup_status = "failed"
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Application lifespan handler."""
     logger.info("Starting unRAID Array Balancer v%s", app.version)
     
-    # Initialize database
-    await init_database()
-    logger.info("Database initialized")
-    
-    # Check permissions
-    checker = PermissionChecker()
-    report = await checker.check_all()
-    
-    if report.has_critical_failures:
-        logger.error("Critical permission failures detected!")
-        for check in report.failed_checks:
-            logger.error("  - %s: %s", check.name, check.error)
-    else:
-        logger.info("Permission checks passed")
+    # Store permission monitor for API access
+    app.state.permission_monitor = permission_monitor
+    app.state.retention = RetentionService(
+        is_busy=lambda: indexer.is_running or dedupe_job.is_running or task_queue.is_running,
+    )
+    app.state.startup_status = "starting"
     
-    # Store permission report for API access
-    app.state.permission_report = report
+    # Don't block the server on disk access, finish startup in the background
+    startup_task = asyncio.create_task(initialize(app))
     
     yield
     
     logger.info("Shutting down unRAID Array Balancer")
+    startup_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await startup_task
+    await app.state.permission_monitor.stop()
+    await app.state.retention.stop()
+    await task_queue.stop()
+    await move_throttle.stop()
+    await index_watcher.stop()
+    await asyncio.to_thread(hash_pool.shutdown)
+    await close_database()
 
 
 def create_app() -> FastAPI:
@@ -59,6 +130,7 @@ def create_app() -> FastAPI:
         description="A disk balancing tool for unRAID 7+ arrays",
         version="0.1.0-alpha",
         lifespan=lifespan,
+        dependencies=[Depends(metrics.record_router)],
         docs_url="/api/docs",
         redoc_url="/api/redoc",
         openapi_url="/api/openapi.json",
@@ -73,14 +145,27 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # Request latency per router
+    metrics.instrument_app(app)
+    
     # Include API routers
     app.include_router(health.router, prefix="/api", tags=["Health"])
+    app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
     app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
     app.include_router(disks.router, prefix="/api/disks", tags=["Disks"])
     app.include_router(files.router, prefix="/api/files", tags=["Files"])
     app.include_router(index.router, prefix="/api/index", tags=["Index"])
+    app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+    app.include_router(dedupe.router, prefix="/api/dedupe", tags=["Dedupe"])
+    app.include_router(balance.router, prefix="/api/balance", tags=["Balance"])
     app.include_router(mover.router, prefix="/api/mover", tags=["Mover"])
     app.include_router(tasks.router, prefix="/api/tasks", tags=["Tasks"])
+    app.include_router(
+        admin.router,
+        prefix="/api/admin",
+        tags=["Admin"],
+        dependencies=[Depends(auth.require_auth)],
+    )
     
     # Serve frontend static files (in production)
     frontend_path = Path("/app/frontend")
@@ -0,0 +1,211 @@
+"""Compact in-memory records for the index and planner pipeline.
+
+A Pydantic model or dict per file costs several hundred bytes, which adds
+up to tens of GB for a large array. These tables store each column in a
+typed `array` instead (struct-of-arrays) and intern repeated strings, so a
+file costs roughly 40 bytes plus its UTF-8 name. Build Pydantic models only
+at the API boundary, for the rows actually returned.
+"""
+
+import os
+from array import array
+from collections.abc import Iterator
+
+
+class StringTable:
+    """Intern strings to small integer IDs."""
+    
+    __slots__ = ("_ids", "_values")
+    
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._values: list[str] = []
+    
+    def intern(self, value: str) -> int:
+        """Get the ID for a string, adding it if it's new."""
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._values)
+            self._ids[value] = string_id
+            self._values.append(value)
+        return string_id
+    
+    def get(self, string_id: int) -> str:
+        """Get the string for an ID."""
+        return self._values[string_id]
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+
+class FileRecord:
+    """A single file, materialized from a `FileTable` row."""
+    
+    __slots__ = ("dir_id", "name", "size", "mtime_ns", "atime_ns", "inode")
+    
+    def __init__(
+        self,
+        dir_id: int,
+        name: str,
+        size: int,
+        mtime_ns: int,
+        atime_ns: int,
+        inode: int,
+    ) -> None:
+        self.dir_id = dir_id
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.atime_ns = atime_ns
+        self.inode = inode
+    
+    def __repr__(self) -> str:
+        return f"FileRecord(dir_id={self.dir_id}, name={self.name!r}, size={self.size})"
+
+
+class FileTable:
+    """
+    Column store for the files of one disk.
+    
+    Names are kept as one UTF-8 byte buffer with an offset array, so there
+    is no per-file Python object until a row is materialized.
+    """
+    
+    __slots__ = ("dir_ids", "sizes", "mtimes", "atimes", "inodes", "_names", "_name_ends")
+    
+    def __init__(self) -> None:
+        self.dir_ids = array("I")
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.atimes = array("q")
+        self.inodes = array("Q")
+        self._names = bytearray()
+        self._name_ends = array("Q")
+    
+    def append(
+        self,
+        dir_id: int,
+        name: str,
+        size: int,
+        mtime_ns: int,
+        atime_ns: int,
+        inode: int,
+    ) -> None:
+        """Add a file."""
+        self.dir_ids.append(dir_id)
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        self.atimes.append(atime_ns)
+        self.inodes.append(inode)
+        # surrogateescape keeps undecodable names round-trippable
+        self._names += os.fsencode(name)
+        self._name_ends.append(len(self._names))
+    
+    def name(self, index: int) -> str:
+        """Get the name of the file at an index."""
+        start = self._name_ends[index - 1] if index else 0
+        return os.fsdecode(bytes(self._names[start:self._name_ends[index]]))
+    
+    def name_buffers(self) -> tuple[bytearray, array]:
+        """Get the encoded names and the offsets where each starts, plus the end."""
+        offsets = array("q", [0])
+        offsets.frombytes(self._name_ends.tobytes())
+        return self._names, offsets
+    
+    def record(self, index: int) -> FileRecord:
+        """Materialize the file at an index."""
+        return FileRecord(
+            dir_id=self.dir_ids[index],
+            name=self.name(index),
+            size=self.sizes[index],
+            mtime_ns=self.mtimes[index],
+            atime_ns=self.atimes[index],
+            inode=self.inodes[index],
+        )
+    
+    def total_size(self) -> int:
+        """Get the combined size of all files."""
+        return sum(self.sizes)
+    
+    def nbytes(self) -> int:
+        """Get the approximate memory used by the table's buffers."""
+        columns = (self.dir_ids, self.sizes, self.mtimes, self.atimes, self.inodes, self._name_ends)
+        return sum(c.itemsize * len(c) for c in columns) + len(self._names)
+    
+    def __len__(self) -> int:
+        return len(self.sizes)
+    
+    def __iter__(self) -> Iterator[FileRecord]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+
+class DirectoryTable:
+    """
+    Column store for the directories of one disk.
+    
+    Directories are added parent-first, so a directory's ID is always
+    greater than its parent's. That lets `rollup()` total subtrees in one
+    reverse pass.
+    """
+    
+    __slots__ = (
+        "paths",
+        "parent_ids",
+        "share_ids",
+        "file_counts",
+        "sizes",
+        "total_files",
+        "total_sizes",
+        "shares",
+    )
+    
+    ROOT_PARENT = -1
+    NO_SHARE = -1
+    
+    def __init__(self, shares: StringTable | None = None) -> None:
+        self.paths: list[str] = []
+        self.parent_ids = array("i")
+        self.share_ids = array("i")
+        self.file_counts = array("Q")
+        self.sizes = array("Q")
+        self.total_files = array("Q")
+        self.total_sizes = array("Q")
+        self.shares = shares if shares is not None else StringTable()
+    
+    def add(self, path: str, parent_id: int) -> int:
+        """Add a directory (path relative to the disk root) and return its ID."""
+        dir_id = len(self.paths)
+        self.paths.append(path)
+        self.parent_ids.append(parent_id)
+        share = path.split("/", 1)[0]
+        self.share_ids.append(self.shares.intern(share) if share else self.NO_SHARE)
+        for column in (self.file_counts, self.sizes, self.total_files, self.total_sizes):
+            column.append(0)
+        return dir_id
+    
+    def add_file(self, dir_id: int, size: int) -> None:
+        """Count a file directly inside a directory."""
+        self.file_counts[dir_id] += 1
+        self.sizes[dir_id] += size
+    
+    def share(self, dir_id: int) -> str | None:
+        """Get the share a directory belongs to."""
+        share_id = self.share_ids[dir_id]
+        return None if share_id == self.NO_SHARE else self.shares.get(share_id)
+    
+    def rollup(self) -> None:
+        """Compute recursive file counts and sizes for every directory."""
+        self.total_files = array("Q", self.file_counts)
+        self.total_sizes = array("Q", self.sizes)
+        for dir_id in range(len(self.paths) - 1, 0, -1):
+            parent = self.parent_ids[dir_id]
+            if parent != self.ROOT_PARENT:
+                self.total_files[parent] += self.total_files[dir_id]
+                self.total_sizes[parent] += self.total_sizes[dir_id]
+    
+    def __len__(self) -> int:
+        return len(self.paths)
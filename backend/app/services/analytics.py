@@ -0,0 +1,240 @@
+"""Precomputed usage analytics of the index.
+
+Three aggregate tables in index.db answer "what is where" without
+grouping millions of file rows per request:
+
+- `share_usage`: files and bytes per disk and share (the first path
+  component, '' for files in a disk's root)
+- `size_histogram`: files and bytes per disk and size bucket, the bit
+  length of the size (bucket n holds sizes from 2^(n-1) to 2^n - 1)
+- `mtime_histogram`: files and bytes per disk and modification day, so
+  ages can be bucketed at request time as the days go by
+
+A full index rebuilds a disk's rows in one GROUP BY. The watcher and
+moves, which touch few directories, apply `UsageDelta`s of the rows they
+remove and add.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiosqlite
+
+from app.services.database import (
+    execute,
+    execute_many,
+    fetch_all,
+    fetch_one,
+    get_index_database,
+    index_write_lock,
+)
+
+logger = logging.getLogger(__name__)
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+
+# Upper bounds (exclusive) in days of the age buckets, the last one is open-ended
+AGE_BUCKET_DAYS = (1, 7, 30, 90, 365, 2 * 365, 5 * 365)
+
+# Bump to rebuild the aggregates of existing indexes on startup
+USAGE_VERSION = "1"
+
+TABLES = ("share_usage", "size_histogram", "mtime_histogram")
+_KEY_COLUMNS = {"share_usage": "share", "size_histogram": "bucket", "mtime_histogram": "day"}
+
+# SQL equivalent of size_bucket(): int.bit_length() for sizes below 2^63
+_SIZE_BUCKET_SQL = "CASE " + " ".join(
+    f"WHEN f.size < {1 << n} THEN {n}" for n in range(63)
+) + " ELSE 63 END"
+
+
+def size_bucket(size: int) -> int:
+    """Get the histogram bucket of a file size."""
+    return size.bit_length()
+
+
+def mtime_day(mtime_ns: int) -> int:
+    """Get the day (since the Unix epoch) of a modification time."""
+    # Rounds towards zero like SQLite's integer division
+    return mtime_ns // NS_PER_DAY if mtime_ns >= 0 else -(-mtime_ns // NS_PER_DAY)
+
+
+@dataclass
+class UsageDelta:
+    """Changes to the aggregate tables: key -> [files, bytes], per table."""
+    
+    rows: dict[str, dict[tuple[str, str | int], list[int]]] = field(
+        default_factory=lambda: {table: defaultdict(lambda: [0, 0]) for table in TABLES}
+    )
+    
+    def add(self, disk_id: str, share: str | None, size: int, mtime_ns: int, sign: int = 1) -> None:
+        """Count a file as added (or removed with `sign` -1)."""
+        for table, key in (
+            ("share_usage", share or ""),
+            ("size_histogram", size_bucket(size)),
+            ("mtime_histogram", mtime_day(mtime_ns)),
+        ):
+            counts = self.rows[table][(disk_id, key)]
+            counts[0] += sign
+            counts[1] += sign * size
+    
+    def remove(self, disk_id: str, share: str | None, files: Iterable[tuple[int, int]]) -> None:
+        """Count (size, mtime_ns) files as removed."""
+        for size, mtime_ns in files:
+            self.add(disk_id, share, size, mtime_ns, -1)
+    
+    def __bool__(self) -> bool:
+        return any(self.rows.values())
+
+
+async def apply_delta(delta: UsageDelta, db: aiosqlite.Connection | None = None) -> None:
+    """Add a delta to the aggregate tables without committing."""
+    db = db or await get_index_database()
+    for table, rows in delta.rows.items():
+        changed = [(disk, key, n, size) for (disk, key), (n, size) in rows.items() if n or size]
+        if not changed:
+            continue
+        column = _KEY_COLUMNS[table]
+        await execute_many(
+            f"""
+            INSERT INTO {table} (disk_id, {column}, file_count, total_bytes) VALUES (?, ?, ?, ?)
+            ON CONFLICT (disk_id, {column}) DO UPDATE SET
+                file_count = file_count + excluded.file_count,
+                total_bytes = total_bytes + excluded.total_bytes
+            """,
+            changed,
+            db=db,
+        )
+        await execute(f"DELETE FROM {table} WHERE file_count <= 0", db=db)
+
+
+async def rebuild_usage(disk_id: str | None = None, db: aiosqlite.Connection | None = None) -> None:
+    """Recompute the aggregate rows of a disk (or all disks) from the index, without committing."""
+    db = db or await get_index_database()
+    where = "" if disk_id is None else "WHERE d.disk_id = ?"
+    params = () if disk_id is None else (disk_id,)
+    
+    for table in TABLES:
+        await execute(
+            f"DELETE FROM {table}" + ("" if disk_id is None else " WHERE disk_id = ?"),
+            params,
+            db=db,
+        )
+    # Directories already carry their direct file totals
+    await execute(
+        f"""
+        INSERT INTO share_usage (disk_id, share, file_count, total_bytes)
+        SELECT d.disk_id, COALESCE(d.share, ''), SUM(d.file_count), SUM(d.size_bytes)
+        FROM directories d {where}
+        GROUP BY d.disk_id, COALESCE(d.share, '')
+        HAVING SUM(d.file_count) > 0
+        """,
+        params,
+        db=db,
+    )
+    for table, key in (
+        ("size_histogram", _SIZE_BUCKET_SQL),
+        ("mtime_histogram", f"f.mtime_ns / {NS_PER_DAY}"),
+    ):
+        await execute(
+            f"""
+            INSERT INTO {table} (disk_id, {_KEY_COLUMNS[table]}, file_count, total_bytes)
+            SELECT d.disk_id, {key} AS key, COUNT(*), SUM(f.size)
+            FROM files f JOIN directories d ON d.id = f.dir_id {where}
+            GROUP BY d.disk_id, key
+            """,
+            params,
+            db=db,
+        )
+
+
+async def ensure_usage() -> None:
+    """Build the aggregates of an index created before they existed."""
+    db = await get_index_database()
+    async with index_write_lock():
+        row = await fetch_one("SELECT value FROM index_meta WHERE key = 'usage_version'", db=db)
+        if row is not None and row["value"] == USAGE_VERSION:
+            return
+        logger.info("Building usage analytics of the index")
+        await rebuild_usage(db=db)
+        await execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('usage_version', ?)",
+            (USAGE_VERSION,),
+            db=db,
+        )
+        await db.commit()
+
+
+@dataclass
+class UsageCell:
+    """Files and bytes of one share, bucket or disk."""
+    
+    file_count: int = 0
+    total_bytes: int = 0
+    
+    def add(self, file_count: int, total_bytes: int) -> None:
+        self.file_count += file_count
+        self.total_bytes += total_bytes
+
+
+@dataclass
+class UsageRow:
+    """A share or histogram bucket, in total and per disk."""
+    
+    key: str | int
+    total: UsageCell = field(default_factory=UsageCell)
+    disks: dict[str, UsageCell] = field(default_factory=dict)
+    
+    def add(self, disk_id: str, file_count: int, total_bytes: int) -> None:
+        self.total.add(file_count, total_bytes)
+        self.disks.setdefault(disk_id, UsageCell()).add(file_count, total_bytes)
+
+
+@dataclass
+class Analytics:
+    """Share x disk usage and size and age histograms of the index."""
+    
+    disks: list[str]
+    shares: list[UsageRow]  # Largest first
+    sizes: list[UsageRow]  # Keyed by size bucket, smallest first
+    ages: list[UsageRow]  # Keyed by index into AGE_BUCKET_DAYS, newest first
+
+
+async def load_analytics(now: float | None = None) -> Analytics:
+    """Read the aggregate tables, bucketing modification days by age."""
+    db = await get_index_database()
+    today = mtime_day(int((time.time() if now is None else now) * 1_000_000_000))
+    disks: set[str] = set()
+    
+    def age_bucket(day: int) -> int:
+        age = today - day
+        return next(
+            (i for i, days in enumerate(AGE_BUCKET_DAYS) if age < days), len(AGE_BUCKET_DAYS)
+        )
+    
+    async def load(table: str, bucket: Callable[[Any], Any]) -> dict[Any, UsageRow]:
+        grouped: dict[Any, UsageRow] = {}
+        for row in await fetch_all(
+            f"SELECT disk_id, {_KEY_COLUMNS[table]} AS key, file_count, total_bytes FROM {table}",
+            db=db,
+        ):
+            key = bucket(row["key"])
+            grouped.setdefault(key, UsageRow(key)).add(
+                row["disk_id"], row["file_count"], row["total_bytes"]
+            )
+            disks.add(row["disk_id"])
+        return grouped
+    
+    shares = await load("share_usage", str)
+    sizes = await load("size_histogram", int)
+    ages = await load("mtime_histogram", age_bucket)
+    return Analytics(
+        disks=sorted(disks, key=lambda d: (len(d), d)),
+        shares=sorted(shares.values(), key=lambda r: r.total.total_bytes, reverse=True),
+        sizes=[sizes[key] for key in sorted(sizes)],
+        ages=[ages[key] for key in sorted(ages)],
+    )
@@ -0,0 +1,734 @@
+"""Balance planning: decide which files and directories to move where."""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.services.database import fetch_all, get_index_database
+from app.services.executor import MoveRequest, unit_requests
+from app.services.indexer import discover_disks
+from app.services.shares import TOP_LEVEL_DEPTH, ShareConfig
+from app.services.snapshot import Snapshot, open_current
+
+logger = logging.getLogger(__name__)
+
+# Files are read from the index in pages of this many rows
+PAGE_SIZE = 5000
+# Directory IDs per query when reading files outside of move units
+_DIR_BATCH = 500
+
+# Transfer speed assumed when nothing was measured, parity-bound writes
+DEFAULT_MOVE_BPS = 70 * 1024 * 1024
+
+# Tolerances, in percent points, that Pareto mode plans for
+PARETO_TOLERANCES = (0.0, 0.5, 1.0, 2.0, 5.0)
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+# Disks are only split into fast and slow tiers if their speeds differ by this much
+PLACEMENT_MIN_SPEEDUP = 0.1
+# Hot/cold swaps may leave a disk this far from its target, in percent points
+PLACEMENT_SLACK_PERCENT = 0.5
+
+
+@dataclass
+class DiskState:
+    """Capacity and usage of an array disk."""
+    
+    disk_id: str
+    mount_point: Path
+    total_bytes: int
+    used_bytes: int
+    
+    @property
+    def used_percent(self) -> float:
+        """Get the fill level in percent."""
+        return self.used_bytes / self.total_bytes * 100 if self.total_bytes else 0.0
+
+
+@dataclass
+class PlannedMove:
+    """A file (or directory) to move from one disk to another."""
+    
+    source_disk: str
+    dest_disk: str
+    path: str  # Relative to the disk root
+    size: int
+    file_count: int = 1
+    splits: bool = False  # Leaves other files of its directory behind
+    is_dir: bool = False
+    
+    @property
+    def dir_path(self) -> str:
+        """Get the directory the move comes from, relative to the disk root."""
+        return self.path.rpartition("/")[0]
+    
+    @property
+    def share(self) -> str | None:
+        """Get the share the move belongs to."""
+        return _share_of(self.path, self.is_dir)
+
+
+@dataclass
+class MoveUnit:
+    """A file, or a directory with everything below it, that is moved as a whole."""
+    
+    path: str  # Relative to the disk root
+    size: int
+    file_count: int = 1
+    dir_file_count: int = 1  # Files directly in the same directory as a single file
+    is_dir: bool = False
+    newest_ns: int = 0  # Latest modification or access of its files, if read
+    
+    @property
+    def share(self) -> str | None:
+        """Get the share the unit belongs to."""
+        return _share_of(self.path, self.is_dir)
+
+
+@dataclass
+class Placement:
+    """
+    Hot/cold placement: recently used units belong on fast disks, old ones on slow disks.
+    
+    A unit's last use is the newest modification or access time of its
+    files. Units used neither recently enough to be hot nor long enough
+    ago to be cold stay wherever balancing puts them.
+    """
+    
+    tiers: dict[str, str]  # Disk ID -> "fast" or "slow", unmeasured disks have none
+    hot_since_ns: int
+    cold_before_ns: int
+    
+    @classmethod
+    def from_speeds(
+        cls,
+        speeds: dict[str, float],
+        hot_days: float,
+        cold_days: float,
+        now: float | None = None,
+    ) -> "Placement":
+        """
+        Split the measured disks into tiers at the middle of their speed range.
+        
+        If the speeds are too close to tell apart there are no tiers, and
+        the plan is an ordinary balance plan.
+        """
+        tiers: dict[str, str] = {}
+        if speeds and max(speeds.values()) >= min(speeds.values()) * (1 + PLACEMENT_MIN_SPEEDUP):
+            middle = (max(speeds.values()) + min(speeds.values())) / 2
+            tiers = {d: "fast" if speed >= middle else "slow" for d, speed in speeds.items()}
+        now_ns = int((time.time() if now is None else now) * 1_000_000_000)
+        return cls(
+            tiers=tiers,
+            hot_since_ns=now_ns - int(hot_days * NS_PER_DAY),
+            cold_before_ns=now_ns - int(cold_days * NS_PER_DAY),
+        )
+    
+    def preferred_tier(self, unit: MoveUnit) -> str | None:
+        """Get the tier a unit belongs on, None if it doesn't matter."""
+        if unit.newest_ns >= self.hot_since_ns:
+            return "fast"
+        if unit.newest_ns < self.cold_before_ns:
+            return "slow"
+        return None
+
+
+@dataclass
+class MoveCost:
+    """
+    Estimated cost of moves in seconds, the planner's objective.
+    
+    Besides the transfer itself every file pays a fixed overhead, and
+    splitting a directory across disks pays a penalty once per directory
+    and destination.
+    """
+    
+    bytes_per_second: float = DEFAULT_MOVE_BPS
+    read_bps: dict[str, float] = field(default_factory=dict)
+    write_bps: dict[str, float] = field(default_factory=dict)
+    file_overhead_seconds: float = 0.0
+    split_penalty_seconds: float = 0.0
+    # Moves whose fixed costs exceed this multiple of their transfer time are skipped
+    max_overhead_ratio: float = 1.0
+    
+    def transfer_seconds(self, size: int, source: str | None = None, dest: str | None = None) -> float:
+        """Get the time to copy `size` bytes, limited by the slowest disk involved."""
+        rate = min(
+            self.bytes_per_second,
+            self.read_bps.get(source, self.bytes_per_second),
+            self.write_bps.get(dest, self.bytes_per_second),
+        )
+        return size / rate
+    
+    def fixed_seconds(self, file_count: int = 1, splits: bool = False) -> float:
+        """Get the cost of a move that doesn't depend on its size."""
+        return file_count * self.file_overhead_seconds + (self.split_penalty_seconds if splits else 0.0)
+    
+    def worth_moving(self, transfer_seconds: float, file_count: int = 1, splits: bool = False) -> bool:
+        """Check if a move's fixed costs are small enough for its transfer."""
+        return self.fixed_seconds(file_count, splits) <= self.max_overhead_ratio * transfer_seconds
+
+
+@dataclass
+class Plan:
+    """A set of moves that brings the disks towards their targets."""
+    
+    disks: dict[str, DiskState]
+    targets: dict[str, float]  # Disk ID -> target fill in percent
+    moves: list[PlannedMove] = field(default_factory=list)
+    tolerance_percent: float = 0.0
+    cost_seconds: float = 0.0  # Estimated serial move time, see MoveCost
+    origin: str = "full"  # "full", "warm" (from an earlier plan) or "cache"
+    placement: str = "balance"  # "balance" or "hot_cold"
+    
+    @property
+    def total_bytes(self) -> int:
+        """Get the number of bytes moved."""
+        return sum(m.size for m in self.moves)
+    
+    @property
+    def total_files(self) -> int:
+        """Get the number of files moved."""
+        return sum(m.file_count for m in self.moves)
+    
+    def projected_used(self) -> dict[str, int]:
+        """Get each disk's used bytes after the plan ran."""
+        used = {disk_id: disk.used_bytes for disk_id, disk in self.disks.items()}
+        for move in self.moves:
+            used[move.source_disk] -= move.size
+            used[move.dest_disk] += move.size
+        return used
+    
+    def max_deviation(self) -> float:
+        """Get the largest distance from a target after the plan, in percent points."""
+        used = self.projected_used()
+        return max(
+            (
+                abs(used[d] / disk.total_bytes * 100 - self.targets[d])
+                for d, disk in self.disks.items()
+                if disk.total_bytes
+            ),
+            default=0.0,
+        )
+    
+    def move_requests(self) -> list[MoveRequest]:
+        """
+        Convert to requests for the move executor.
+        
+        Directory moves are listed file by file from the disk, so this does
+        file system I/O.
+        """
+        requests = []
+        for m in self.moves:
+            source = self.disks[m.source_disk].mount_point / m.path
+            dest = self.disks[m.dest_disk].mount_point / m.path
+            if m.is_dir:
+                requests.extend(unit_requests(source, dest))
+            else:
+                requests.append(MoveRequest(source=source, dest=dest, size=m.size))
+        return requests
+
+
+def get_disk_states() -> dict[str, DiskState]:
+    """Read capacity and usage of all mounted array disks."""
+    disks = {}
+    for disk_id, mount_point in discover_disks().items():
+        try:
+            st = os.statvfs(mount_point)
+        except OSError as e:
+            logger.warning("Skipping %s: %s", disk_id, e)
+            continue
+        total = st.f_blocks * st.f_frsize
+        disks[disk_id] = DiskState(
+            disk_id=disk_id,
+            mount_point=mount_point,
+            total_bytes=total,
+            used_bytes=total - st.f_bavail * st.f_frsize,
+        )
+    return disks
+
+
+def equal_fill_targets(disks: dict[str, DiskState]) -> dict[str, float]:
+    """Get targets that fill every disk to the same percentage."""
+    capacity = sum(d.total_bytes for d in disks.values())
+    used = sum(d.used_bytes for d in disks.values())
+    percent = used / capacity * 100 if capacity else 0.0
+    return dict.fromkeys(disks, percent)
+
+
+def _share_of(path: str, is_dir: bool) -> str | None:
+    """Get the share of a path relative to the disk root, None for loose files there."""
+    share, sep, _ = path.partition("/")
+    return share if sep or is_dir else None
+
+
+async def iter_files_by_size(disk_id: str) -> AsyncIterator[MoveUnit]:
+    """Yield a disk's indexed files, largest first, from its snapshot if current."""
+    snapshot = await open_current(disk_id)
+    if snapshot is not None:
+        async for unit in _iter_snapshot_by_size(snapshot):
+            yield unit
+        return
+    
+    db = await get_index_database()
+    last: tuple[int, int] | None = None
+    while True:
+        # Keyset pagination, so each page is an index range scan
+        rows = await fetch_all(
+            f"""
+            SELECT f.id, f.size, f.name, d.path AS dir_path, d.file_count,
+                MAX(f.mtime_ns, f.atime_ns) AS newest_ns
+            FROM files f
+            JOIN directories d ON d.id = f.dir_id
+            WHERE d.disk_id = ? {"AND (f.size, f.id) < (?, ?)" if last else ""}
+            ORDER BY f.size DESC, f.id DESC
+            LIMIT ?
+            """,
+            (disk_id, *(last or ()), PAGE_SIZE),
+            db=db,
+        )
+        for row in rows:
+            yield MoveUnit(
+                path=f"{row['dir_path']}/{row['name']}" if row["dir_path"] else row["name"],
+                size=row["size"],
+                dir_file_count=row["file_count"],
+                newest_ns=row["newest_ns"],
+            )
+        if len(rows) < PAGE_SIZE:
+            return
+        last = (rows[-1]["size"], rows[-1]["id"])
+
+
+async def _iter_snapshot_by_size(snapshot: Snapshot) -> AsyncIterator[MoveUnit]:
+    """Yield the files of a snapshot, largest first, in the order of the index query."""
+    order, file_counts = await asyncio.to_thread(
+        lambda: (snapshot.order_by_size(), snapshot.dir_file_counts())
+    )
+    for start in range(0, len(order), PAGE_SIZE):
+        for row in snapshot.rows(order.slice(start, PAGE_SIZE)):
+            yield MoveUnit(
+                path=f"{row['dir']}/{row['name']}" if row["dir"] else row["name"],
+                size=row["size"],
+                dir_file_count=file_counts[row["dir"]],
+                newest_ns=max(row["mtime_ns"], row["atime_ns"]),
+            )
+
+
+async def iter_units_by_size(
+    disk_id: str,
+    shares: dict[str, ShareConfig],
+    with_newest: bool = False,
+) -> AsyncIterator[MoveUnit]:
+    """
+    Yield a disk's move units, largest first.
+    
+    In shares with a split level, the directories at that depth are units,
+    so whatever unRAID keeps together stays together. Elsewhere, including
+    shares without a config, the top level directories of the share are,
+    so a movie isn't separated from its `Subs/`. Files outside any unit
+    directory, like files directly in a share, are units of their own.
+    Sizes come from the directory rollups, so only loose files are read
+    from the files table, unless `with_newest` asks for the last use of
+    directory units too.
+    """
+    db = await get_index_database()
+    rows = await fetch_all(
+        """
+        SELECT id, path, share, file_count, total_files, total_bytes
+        FROM directories
+        WHERE disk_id = ? AND total_files > 0
+        """,
+        (disk_id,),
+        db=db,
+    )
+    
+    units = []
+    loose_dirs = []
+    for row in rows:
+        path = row["path"]
+        depth = path.count("/") + 1 if path else 0
+        config = shares.get(row["share"]) if row["share"] else None
+        unit_depth = config.unit_depth if config is not None else TOP_LEVEL_DEPTH
+        if depth > unit_depth:
+            continue
+        
+        if depth == unit_depth:
+            units.append(MoveUnit(path, row["total_bytes"], row["total_files"], is_dir=True))
+        elif row["file_count"]:
+            loose_dirs.append(row["id"])
+    
+    for i in range(0, len(loose_dirs), _DIR_BATCH):
+        batch = loose_dirs[i : i + _DIR_BATCH]
+        files = await fetch_all(
+            f"""
+            SELECT f.name, f.size, d.path AS dir_path, d.file_count,
+                MAX(f.mtime_ns, f.atime_ns) AS newest_ns
+            FROM files f
+            JOIN directories d ON d.id = f.dir_id
+            WHERE f.dir_id IN ({", ".join("?" * len(batch))})
+            """,
+            batch,
+            db=db,
+        )
+        units.extend(
+            MoveUnit(
+                path=f"{row['dir_path']}/{row['name']}" if row["dir_path"] else row["name"],
+                size=row["size"],
+                dir_file_count=row["file_count"],
+                newest_ns=row["newest_ns"],
+            )
+            for row in files
+        )
+    
+    if with_newest:
+        await _read_newest(disk_id, [unit for unit in units if unit.is_dir])
+    units.sort(key=lambda unit: unit.size, reverse=True)
+    for unit in units:
+        yield unit
+
+
+async def _read_newest(disk_id: str, units: list[MoveUnit]) -> None:
+    """Set the last use of directory units from the newest file in their subtree."""
+    by_path = {unit.path: unit for unit in units}
+    rows = await fetch_all(
+        """
+        SELECT d.path, MAX(MAX(f.mtime_ns, f.atime_ns)) AS newest_ns
+        FROM directories d
+        JOIN files f ON f.dir_id = d.id
+        WHERE d.disk_id = ?
+        GROUP BY d.id
+        """,
+        (disk_id,),
+        db=await get_index_database(),
+    )
+    for row in rows:
+        # Units don't nest, so the first unit among the ancestors is the one
+        parts = row["path"].split("/")
+        for depth in range(1, len(parts) + 1):
+            unit = by_path.get("/".join(parts[:depth]))
+            if unit is not None:
+                unit.newest_ns = max(unit.newest_ns, row["newest_ns"])
+                break
+
+
+async def generate_plan(
+    disks: dict[str, DiskState] | None = None,
+    targets: dict[str, float] | None = None,
+    cost: MoveCost | None = None,
+    tolerance_percent: float = 0.0,
+    warm_start: list[PlannedMove] | None = None,
+    shares: dict[str, ShareConfig] | None = None,
+    placement: Placement | None = None,
+) -> Plan:
+    """
+    Plan moves from disks above their target to disks below it.
+    
+    Greedy: the largest units on the fullest disk go first, each to the
+    disk with the most room left below its target. A unit is only moved
+    if that brings its source closer to the target and its fixed costs
+    are worth it, so thousands of small files aren't shuffled for a few
+    bytes of balance. Once a directory is split, its other files follow
+    to the same disk while they fit. Disks within `tolerance_percent` of
+    their target are left alone.
+    
+    With `shares`, whole directories are planned as units according to
+    each share's split level (see `iter_units_by_size`) and only go to
+    disks the share allows. Without, single files are planned.
+    
+    With a `placement`, units prefer disks of their tier, then hot units
+    on slow disks are swapped with cold units on fast disks: each hot
+    unit moves together with enough cold ones the other way that both
+    disks stay within the tolerance (or `PLACEMENT_SLACK_PERCENT`) of
+    their target. Each disk's units are read once and kept for the swap.
+    
+    Moves of a `warm_start` plan are kept, in order, while they still
+    fit the new targets; the index is then only read for disks that need
+    more moves. The caller makes sure those moves' files still exist and
+    were planned at the same granularity.
+    """
+    disks = disks if disks is not None else get_disk_states()
+    targets = {**equal_fill_targets(disks), **(targets or {})}
+    cost = cost or MoveCost()
+    plan = Plan(
+        disks=disks,
+        targets=targets,
+        tolerance_percent=tolerance_percent,
+        placement="balance" if placement is None else "hot_cold",
+    )
+    
+    target_bytes = {d: int(disk.total_bytes * targets[d] / 100) for d, disk in disks.items()}
+    tolerance = {d: int(disk.total_bytes * tolerance_percent / 100) for d, disk in disks.items()}
+    excess = {d: disk.used_bytes - target_bytes[d] for d, disk in disks.items()}
+    room = {d: -value for d, value in excess.items() if value < 0}
+    # (Source disk, directory) -> disk its moved files went to
+    split_dirs: dict[tuple[str, str], str] = {}
+    moved: set[tuple[str, str]] = set()
+    
+    def allows(share: str | None, disk_id: str) -> bool:
+        config = shares.get(share) if shares and share else None
+        return config is None or config.allows_disk(disk_id)
+    
+    def allowed_room(share: str | None) -> dict[str, int]:
+        return {d: value for d, value in room.items() if allows(share, d)}
+    
+    # Placement looks at every disk's units again to swap hot and cold ones
+    unit_cache: dict[str, list[MoveUnit]] = {}
+    
+    def read_units(disk_id: str) -> AsyncIterator[MoveUnit]:
+        if shares is None:
+            return iter_files_by_size(disk_id)
+        return iter_units_by_size(disk_id, shares, with_newest=placement is not None)
+    
+    async def units_of(disk_id: str) -> AsyncIterator[MoveUnit]:
+        if placement is None:
+            async for unit in read_units(disk_id):
+                yield unit
+            return
+        if disk_id not in unit_cache:
+            unit_cache[disk_id] = [unit async for unit in read_units(disk_id)]
+        for unit in unit_cache[disk_id]:
+            yield unit
+    
+    def add(move: PlannedMove) -> None:
+        plan.moves.append(move)
+        plan.cost_seconds += (
+            cost.transfer_seconds(move.size, move.source_disk, move.dest_disk)
+            + cost.fixed_seconds(move.file_count, move.splits)
+        )
+        if move.splits or (move.source_disk, move.dir_path) in split_dirs:
+            split_dirs[(move.source_disk, move.dir_path)] = move.dest_disk
+        moved.add((move.source_disk, move.path))
+        excess[move.source_disk] -= move.size
+        excess[move.dest_disk] += move.size
+        for disk_id in (move.source_disk, move.dest_disk):
+            if disk_id in room:
+                room[disk_id] = -excess[disk_id]
+    
+    for move in warm_start or ():
+        source = move.source_disk
+        if (
+            source in excess
+            and excess[source] > tolerance[source]
+            and 0 < move.size < 2 * excess[source]
+            and allowed_room(move.share).get(move.dest_disk, 0) >= move.size
+        ):
+            add(move)
+    
+    sources = sorted((d for d in excess if excess[d] > tolerance[d]), key=excess.get, reverse=True)
+    for source in sources:
+        if not room:
+            break
+        if excess[source] <= tolerance[source]:
+            continue
+        async for unit in units_of(source):
+            if excess[source] <= tolerance[source]:
+                break
+            # Moving more than twice the excess would overshoot further than staying
+            if unit.size <= 0 or unit.size >= 2 * excess[source] or (source, unit.path) in moved:
+                continue
+            candidates = allowed_room(unit.share)
+            if placement is not None:
+                tier = placement.preferred_tier(unit)
+                candidates = {
+                    d: value
+                    for d, value in candidates.items()
+                    if value >= unit.size and placement.tiers.get(d) == tier
+                } or candidates
+            dest = None if unit.is_dir else split_dirs.get((source, unit.path.rpartition("/")[0]))
+            splits = False
+            if dest is None or room[dest] < unit.size:
+                if not candidates:
+                    continue
+                dest = max(candidates, key=candidates.get)
+                splits = not unit.is_dir and unit.dir_file_count > 1
+            if room[dest] < unit.size:
+                continue
+            transfer = cost.transfer_seconds(unit.size, source, dest)
+            if not cost.worth_moving(transfer, unit.file_count, splits):
+                continue
+            
+            add(
+                PlannedMove(
+                    source,
+                    dest,
+                    unit.path,
+                    unit.size,
+                    file_count=unit.file_count,
+                    splits=splits,
+                    is_dir=unit.is_dir,
+                )
+            )
+    
+    if placement is not None:
+        await _swap_hot_and_cold(
+            placement, disks, cost, tolerance, excess, moved, units_of, allows, add
+        )
+    
+    logger.info(
+        "Planned %d moves (%d files, %d bytes, ~%.0fs), max deviation %.2f%% at %.1f%% tolerance",
+        len(plan.moves),
+        plan.total_files,
+        plan.total_bytes,
+        plan.cost_seconds,
+        plan.max_deviation(),
+        tolerance_percent,
+    )
+    return plan
+
+
+async def _swap_hot_and_cold(
+    placement: Placement,
+    disks: dict[str, DiskState],
+    cost: MoveCost,
+    tolerance: dict[str, int],
+    excess: dict[str, int],
+    moved: set[tuple[str, str]],
+    units_of: Callable[[str], AsyncIterator[MoveUnit]],
+    allows: Callable[[str | None, str], bool],
+    add: Callable[[PlannedMove], None],
+) -> None:
+    """
+    Move hot units from slow to fast disks in exchange for cold ones.
+    
+    Hot units go newest first. The cold ones sent back are the oldest
+    that fit, or failing that the largest. The plan's state (`excess`,
+    `moved`) is updated through `add`.
+    """
+    fast = [d for d, tier in placement.tiers.items() if tier == "fast" and d in disks]
+    slow = [d for d, tier in placement.tiers.items() if tier == "slow" and d in disks]
+    if not fast or not slow:
+        return
+    
+    def worth_moving(unit: MoveUnit, source: str, dest: str) -> bool:
+        splits = not unit.is_dir and unit.dir_file_count > 1
+        transfer = cost.transfer_seconds(unit.size, source, dest)
+        return unit.size > 0 and cost.worth_moving(transfer, unit.file_count, splits)
+    
+    def move(unit: MoveUnit, source: str, dest: str) -> PlannedMove:
+        return PlannedMove(
+            source,
+            dest,
+            unit.path,
+            unit.size,
+            file_count=unit.file_count,
+            splits=not unit.is_dir and unit.dir_file_count > 1,
+            is_dir=unit.is_dir,
+        )
+    
+    def pick(
+        candidates: list[MoveUnit],
+        low: int,
+        high: int,
+        source: str,
+        dest: str,
+    ) -> list[MoveUnit] | None:
+        # Units in order while they fit, until their total reaches `low`
+        picked: list[MoveUnit] = []
+        total = 0
+        for unit in candidates:
+            if total >= low:
+                break
+            if (
+                unit.size <= high - total
+                and allows(unit.share, dest)
+                and worth_moving(unit, source, dest)
+            ):
+                picked.append(unit)
+                total += unit.size
+        return picked if total >= low else None
+    
+    async def misplaced(disk_id: str, tier: str) -> list[MoveUnit]:
+        return [
+            unit
+            async for unit in units_of(disk_id)
+            if (disk_id, unit.path) not in moved and placement.preferred_tier(unit) == tier
+        ]
+    
+    hot = [(d, unit) for d in slow for unit in await misplaced(d, "fast")]
+    hot.sort(key=lambda item: item[1].newest_ns, reverse=True)
+    if not hot:
+        return
+    cold = {d: sorted(await misplaced(d, "slow"), key=lambda u: u.newest_ns) for d in fast}
+    slack = {
+        d: max(tolerance[d], int(disk.total_bytes * PLACEMENT_SLACK_PERCENT / 100))
+        for d, disk in disks.items()
+    }
+    
+    for source, unit in hot:
+        for dest in sorted(fast, key=excess.get):
+            if not allows(unit.share, dest) or not worth_moving(unit, source, dest):
+                continue
+            # Neither disk may end up further from its target than now or the slack
+            dest_limit = max(slack[dest], abs(excess[dest]))
+            source_limit = max(slack[source], abs(excess[source]))
+            # Excess of both disks after the hot unit moved, before cold ones go back
+            dest_after = excess[dest] + unit.size
+            source_after = excess[source] - unit.size
+            low = max(0, dest_after - dest_limit, -source_after - source_limit)
+            high = min(dest_after + dest_limit, -source_after + source_limit)
+            picked = pick(cold[dest], low, high, dest, source)
+            if picked is None:
+                by_size = sorted(cold[dest], key=lambda u: u.size, reverse=True)
+                picked = pick(by_size, low, high, dest, source)
+            if picked is None:
+                continue
+            
+            add(move(unit, source, dest))
+            for candidate in picked:
+                add(move(candidate, dest, source))
+            taken = {c.path for c in picked}
+            cold[dest] = [c for c in cold[dest] if c.path not in taken]
+            break
+
+
+def pareto_frontier(plans: list[Plan]) -> list[Plan]:
+    """
+    Keep the plans that trade balance for cost.
+    
+    A plan is dropped if another one is at least as balanced and at least
+    as cheap. The rest are returned cheapest first.
+    """
+    points = [(p.cost_seconds, p.max_deviation()) for p in plans]
+    frontier = [
+        plan
+        for i, (plan, (cost_i, deviation_i)) in enumerate(zip(plans, points, strict=True))
+        # Of identical plans, only the first is kept
+        if not any(
+            cost_j <= cost_i
+            and deviation_j <= deviation_i
+            and ((cost_j, deviation_j) != points[i] or j < i)
+            for j, (cost_j, deviation_j) in enumerate(points)
+            if j != i
+        )
+    ]
+    return sorted(frontier, key=lambda p: p.cost_seconds)
+
+
+async def pareto_plans(
+    disks: dict[str, DiskState] | None = None,
+    targets: dict[str, float] | None = None,
+    cost: MoveCost | None = None,
+    tolerances: tuple[float, ...] = PARETO_TOLERANCES,
+    shares: dict[str, ShareConfig] | None = None,
+) -> list[Plan]:
+    """Plan at several tolerances and keep the Pareto frontier."""
+    disks = disks if disks is not None else get_disk_states()
+    return pareto_frontier(
+        [
+            await generate_plan(disks, targets, cost, t, shares=shares)
+            for t in sorted(set(tolerances))
+        ]
+    )
+
+
+def moves_by_pair(moves: list[PlannedMove]) -> dict[tuple[str, str], list[PlannedMove]]:
+    """Group moves by (source, destination) disk, keeping their order."""
+    pairs: dict[tuple[str, str], list[PlannedMove]] = defaultdict(list)
+    for move in moves:
+        pairs[(move.source_disk, move.dest_disk)].append(move)
+    return pairs
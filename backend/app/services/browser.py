@@ -0,0 +1,219 @@
+"""Merged directory listings across all array disks.
+
+A user share is the union of the same directory on every disk. Listing
+it answers "where is this folder spread across disks?" in one call.
+Disks with a current index are read from index.db, including recursive
+directory sizes; disks that were never indexed or whose index is stale
+are scanned live, all at once in threads.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path, PurePosixPath
+
+from app.services.config import settings
+from app.services.database import fetch_all, get_index_database
+from app.services.indexer import discover_disks, get_indexed_disks
+from app.services.watcher import index_watcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DiskPortion:
+    """The part of a union entry stored on one disk."""
+    
+    disk_id: str
+    size_bytes: int | None  # None for directories scanned live
+    file_count: int | None = None
+    modified_at: float | None = None  # Unix time, files only
+
+
+@dataclass
+class UnionEntry:
+    """A file or directory of the merged listing."""
+    
+    name: str
+    is_directory: bool
+    portions: list[DiskPortion] = field(default_factory=list)
+    
+    @property
+    def size_bytes(self) -> int | None:
+        """Get the size over all disks, None if a part is unknown."""
+        sizes = [p.size_bytes for p in self.portions]
+        return None if None in sizes else sum(sizes)
+
+
+@dataclass
+class UnionListing:
+    """A directory merged over all disks that hold it."""
+    
+    path: str  # Relative to the share root ('' lists the shares)
+    entries: list[UnionEntry]
+    sources: dict[str, str]  # Disk ID -> "index" or "scan", only disks holding the path
+
+
+def normalize_path(path: str) -> str:
+    """
+    Normalize a share-relative path.
+    
+    Raises:
+        ValueError: If the path leaves the array root.
+    """
+    parts = [part for part in PurePosixPath("/" + path).parts[1:] if part != "."]
+    if ".." in parts:
+        raise ValueError("Path traversal not allowed")
+    return "/".join(parts)
+
+
+async def fresh_indexed_disks() -> set[str]:
+    """Get the disks whose index is watched or younger than `index_stale_hours`."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.index_stale_hours)
+    return {
+        row["disk_id"]
+        for row in await get_indexed_disks()
+        if index_watcher.is_current(row["disk_id"])
+        or datetime.fromisoformat(str(row["indexed_at"])) >= cutoff
+    }
+
+
+async def list_union(path: str, source: str = "auto") -> UnionListing:
+    """
+    List a directory merged over all disks.
+    
+    `source` is "index", "scan" or "auto" (index where current, else scan).
+    """
+    path = normalize_path(path)
+    disks = discover_disks()
+    if source == "scan":
+        indexed: set[str] = set()
+    else:
+        indexed = await fresh_indexed_disks() & set(disks)
+        if source == "index":
+            disks = {d: mount for d, mount in disks.items() if d in indexed}
+    
+    entries: dict[str, UnionEntry] = {}
+    sources: dict[str, str] = {}
+    
+    def add(name: str, is_directory: bool, portion: DiskPortion) -> None:
+        entry = entries.setdefault(name, UnionEntry(name, is_directory))
+        # A file on one disk and a directory on another: show it as a directory
+        entry.is_directory = entry.is_directory or is_directory
+        entry.portions.append(portion)
+    
+    for disk_id, items in (await _from_index(path, sorted(indexed))).items():
+        sources[disk_id] = "index"
+        for name, is_directory, portion in items:
+            add(name, is_directory, portion)
+    
+    to_scan = {d: mount for d, mount in disks.items() if d not in indexed}
+    if to_scan:
+        with ThreadPoolExecutor(max_workers=len(to_scan), thread_name_prefix="union") as pool:
+            loop = asyncio.get_running_loop()
+            scans = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, _scan, disk_id, mount / path)
+                    for disk_id, mount in to_scan.items()
+                )
+            )
+        for disk_id, items in zip(to_scan, scans, strict=True):
+            if items is None:
+                continue
+            sources[disk_id] = "scan"
+            for name, is_directory, portion in items:
+                add(name, is_directory, portion)
+    
+    for entry in entries.values():
+        entry.portions.sort(key=lambda p: _disk_number(p.disk_id))
+    return UnionListing(
+        path=path,
+        entries=sorted(entries.values(), key=lambda e: (not e.is_directory, e.name)),
+        sources=dict(sorted(sources.items(), key=lambda item: _disk_number(item[0]))),
+    )
+
+
+async def _from_index(
+    path: str,
+    disk_ids: list[str],
+) -> dict[str, list[tuple[str, bool, DiskPortion]]]:
+    """Read the children of a directory on each disk from the index."""
+    if not disk_ids:
+        return {}
+    db = await get_index_database()
+    placeholders = ", ".join("?" * len(disk_ids))
+    parents = await fetch_all(
+        f"SELECT id, disk_id FROM directories WHERE path = ? AND disk_id IN ({placeholders})",
+        (path, *disk_ids),
+        db=db,
+    )
+    if not parents:
+        return {}
+    
+    result: dict[str, list[tuple[str, bool, DiskPortion]]] = {row["disk_id"]: [] for row in parents}
+    parent_ids = [row["id"] for row in parents]
+    id_placeholders = ", ".join("?" * len(parent_ids))
+    
+    for row in await fetch_all(
+        f"""
+        SELECT disk_id, path, total_files, total_bytes FROM directories
+        WHERE parent_id IN ({id_placeholders})
+        """,
+        parent_ids,
+        db=db,
+    ):
+        result[row["disk_id"]].append(
+            (
+                row["path"].rpartition("/")[2],
+                True,
+                DiskPortion(row["disk_id"], row["total_bytes"], row["total_files"]),
+            )
+        )
+    
+    for row in await fetch_all(
+        f"""
+        SELECT d.disk_id, f.name, f.size, f.mtime_ns
+        FROM files f
+        JOIN directories d ON d.id = f.dir_id
+        WHERE f.dir_id IN ({id_placeholders})
+        """,
+        parent_ids,
+        db=db,
+    ):
+        result[row["disk_id"]].append(
+            (row["name"], False, DiskPortion(row["disk_id"], row["size"], 1, row["mtime_ns"] / 1e9))
+        )
+    return result
+
+
+def _scan(disk_id: str, directory: Path) -> list[tuple[str, bool, DiskPortion]] | None:
+    """List a directory on one disk, None if the disk doesn't have it."""
+    items = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        items.append((entry.name, True, DiskPortion(disk_id, None)))
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        items.append(
+                            (entry.name, False, DiskPortion(disk_id, st.st_size, 1, st.st_mtime))
+                        )
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    except OSError as e:
+        logger.warning("Can't list %s: %s", directory, e)
+        return None
+    return items
+
+
+def _disk_number(disk_id: str) -> int:
+    """Get the number of a disk ID for sorting."""
+    digits = "".join(c for c in disk_id if c.isdigit())
+    return int(digits) if digits else 0
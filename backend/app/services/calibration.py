@@ -0,0 +1,191 @@
+"""Measure the sequential read and write speed of each array disk.
+
+Disks in one array differ a lot: SMR drives slow down on sustained
+writes, old small disks are much slower than new large ones. The
+simulation and scheduler use these measurements instead of guesses.
+
+Each probe writes a scratch file of random data (so compressing file
+systems can't cheat) to the disk root, fsyncs it, drops it from the page
+cache and reads it back. Probes are bounded by size and time, and disks
+are probed one after another: writes on an unRAID array also update
+parity, so probing in parallel would measure the parity disk instead.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.services.config import settings
+from app.services.database import execute_many, fetch_all, get_database
+from app.services.indexer import discover_disks
+
+logger = logging.getLogger(__name__)
+
+PROBE_FILE_NAME = ".array-balancer-calibration"
+PROBE_CHUNK_SIZE = 4 * 1024 * 1024
+
+MB = 1024 * 1024
+
+
+@dataclass
+class DiskThroughput:
+    """Measured sequential speeds of a disk."""
+    
+    disk_id: str
+    read_bps: float
+    write_bps: float
+    probe_bytes: int
+    measured_at: datetime | None = None
+
+
+def probe_disk(
+    disk_id: str,
+    mount_point: Path,
+    probe_bytes: int,
+    max_seconds: float,
+    cancel: threading.Event | None = None,
+) -> DiskThroughput:
+    """
+    Write and read back a scratch file on a disk and time both.
+    
+    Writing stops after `max_seconds` even if `probe_bytes` wasn't reached,
+    the read covers whatever was written.
+    """
+    free = shutil.disk_usage(mount_point).free
+    if free < probe_bytes * 2:
+        raise OSError(f"Not enough free space on {disk_id} for a {probe_bytes // MB} MB probe")
+    
+    path = mount_point / PROBE_FILE_NAME
+    chunk = os.urandom(PROBE_CHUNK_SIZE)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            written = 0
+            start = time.perf_counter()
+            while written < probe_bytes and time.perf_counter() - start < max_seconds:
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError("Calibration cancelled")
+                written += os.write(fd, chunk[: min(PROBE_CHUNK_SIZE, probe_bytes - written)])
+            os.fsync(fd)
+            write_seconds = time.perf_counter() - start
+            # Clean pages can be dropped, so the read below has to hit the disk
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        
+        buffer = bytearray(PROBE_CHUNK_SIZE)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            read = 0
+            start = time.perf_counter()
+            while n := os.readv(fd, [buffer]):
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError("Calibration cancelled")
+                read += n
+            read_seconds = time.perf_counter() - start
+        finally:
+            os.close(fd)
+    finally:
+        path.unlink(missing_ok=True)
+    
+    return DiskThroughput(
+        disk_id=disk_id,
+        read_bps=read / read_seconds if read_seconds > 0 else 0.0,
+        write_bps=written / write_seconds if write_seconds > 0 else 0.0,
+        probe_bytes=written,
+    )
+
+
+async def calibrate_disks(
+    disk_ids: list[str] | None = None,
+    cancel: threading.Event | None = None,
+    on_disk: Callable[[int, int], None] | None = None,
+) -> list[DiskThroughput]:
+    """
+    Probe disks one after another and store the results.
+    
+    Disks that fail (full, read-only, missing) are logged and skipped.
+    `on_disk` is called with (done, total) after each disk. Refused in
+    dry-run mode, the probes write to the disks.
+    """
+    if settings.dry_run:
+        raise RuntimeError("Calibration writes probe files to the disks, set DRY_RUN=false")
+    disks = discover_disks()
+    if disk_ids is not None:
+        unknown = set(disk_ids) - set(disks)
+        if unknown:
+            raise ValueError(f"Unknown disks: {', '.join(sorted(unknown))}")
+        disks = {disk_id: disks[disk_id] for disk_id in disk_ids}
+    
+    results = []
+    for done, (disk_id, mount_point) in enumerate(sorted(disks.items()), start=1):
+        if cancel is not None and cancel.is_set():
+            break
+        try:
+            result = await asyncio.to_thread(
+                probe_disk,
+                disk_id,
+                mount_point,
+                settings.calibration_probe_mb * MB,
+                settings.calibration_max_seconds,
+                cancel,
+            )
+        except InterruptedError:
+            break
+        except OSError as e:
+            logger.warning("Calibration of %s failed: %s", disk_id, e)
+        else:
+            logger.info(
+                "Calibrated %s: read %.0f MB/s, write %.0f MB/s",
+                disk_id,
+                result.read_bps / MB,
+                result.write_bps / MB,
+            )
+            results.append(result)
+        if on_disk is not None:
+            on_disk(done, len(disks))
+    
+    await store_throughput(results)
+    return results
+
+
+async def store_throughput(results: list[DiskThroughput]) -> None:
+    """Save measurements, keeping earlier ones for comparison."""
+    db = await get_database()
+    await execute_many(
+        "INSERT INTO disk_throughput (disk_id, read_bps, write_bps, probe_bytes) VALUES (?, ?, ?, ?)",
+        [(r.disk_id, r.read_bps, r.write_bps, r.probe_bytes) for r in results],
+        db=db,
+    )
+    await db.commit()
+
+
+async def get_calibrated_throughput() -> dict[str, DiskThroughput]:
+    """Get the latest measurement of each disk."""
+    rows = await fetch_all(
+        """
+        SELECT t.* FROM disk_throughput t
+        JOIN (
+            SELECT disk_id, MAX(id) AS id FROM disk_throughput GROUP BY disk_id
+        ) latest ON latest.id = t.id
+        ORDER BY t.disk_id
+        """
+    )
+    return {
+        row["disk_id"]: DiskThroughput(
+            disk_id=row["disk_id"],
+            read_bps=row["read_bps"],
+            write_bps=row["write_bps"],
+            probe_bytes=row["probe_bytes"],
+            measured_at=datetime.fromisoformat(row["measured_at"]),
+        )
+        for row in rows
+    }
@@ -0,0 +1,367 @@
+"""File checksum calculation and the persistent hash cache."""
+
+import asyncio
+import hashlib
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiosqlite
+
+from app.services.config import settings
+from app.services.database import (
+    execute,
+    execute_many,
+    fetch_all,
+    fetch_one,
+    get_index_database,
+    index_write_lock,
+)
+from app.services.direct_io import buffer_pool, chunk_size, read_chunks
+from app.services.indexer import index_thread_count
+from app.services.metrics import CHECKSUM_BYTES
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PARTIAL_EDGE_BYTES = 64 * 1024
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+
+
+@dataclass(frozen=True)
+class FileKey:
+    """
+    Identity of a file's content on a disk.
+    
+    If any of these change the file must be re-hashed.
+    """
+    
+    disk_id: str
+    inode: int
+    size: int
+    mtime_ns: int
+
+
+def array_disk_id(path: Path | str) -> str | None:
+    """Get the ID of the array disk a path is on, None if it isn't on one."""
+    try:
+        relative = Path(path).relative_to(settings.disk_mount_root)
+    except ValueError:
+        return None
+    if relative.parts and re.fullmatch(r"disk\d+", relative.parts[0]):
+        return relative.parts[0]
+    return None
+
+
+def file_key(path: Path | str) -> FileKey | None:
+    """
+    Get the cache key for a file on an array disk.
+    
+    Returns None for paths outside the array disks, which are never cached.
+    
+    Raises:
+        OSError: If the file can't be stat'ed.
+    """
+    disk_id = array_disk_id(path)
+    if disk_id is None:
+        return None
+    
+    st = os.stat(path)
+    return FileKey(disk_id, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def hash_file(
+    path: Path | str,
+    algorithm: str | None = None,
+    buffer: mmap.mmap | bytearray | None = None,
+    io_mode: str = "buffered",
+) -> str:
+    """
+    Calculate the checksum of a whole file.
+    
+    `buffer` is reused for reading if given, and `io_mode` is a
+    `direct_io` mode (O_DIRECT needs a buffer from `buffer_pool`).
+    """
+    algorithm = algorithm or settings.checksum_algorithm
+    digest, total = _digest_file(path, algorithm, buffer or bytearray(HASH_CHUNK_SIZE), io_mode)
+    CHECKSUM_BYTES.labels(algorithm).inc(total)
+    return digest
+
+
+def _digest_file(
+    path: Path | str,
+    algorithm: str,
+    buffer: mmap.mmap | bytearray,
+    io_mode: str,
+) -> tuple[str, int]:
+    """Hash a file, returning the digest and the number of bytes read."""
+    digest = hashlib.new(algorithm)
+    total = 0
+    for chunk in read_chunks(path, buffer, io_mode):
+        digest.update(chunk)
+        total += len(chunk)
+    return digest.hexdigest(), total
+
+
+def _hash_in_worker(path: str, algorithm: str, io_mode: str) -> tuple[str, int]:
+    """Hash a file in a pool process, reusing the process's buffer."""
+    with buffer_pool.buffer(chunk_size(io_mode)) as buffer:
+        return _digest_file(path, algorithm, buffer, io_mode)
+
+
+def hash_worker_count() -> int:
+    """Get the number of hashing processes, `HASH_WORKERS` or a share of the free CPUs."""
+    if settings.hash_workers > 0:
+        return settings.hash_workers
+    # The pool lives as long as the app, so it gets the share for slow jobs
+    return index_thread_count(os.cpu_count() or 1, math.inf)
+
+
+class HashPool:
+    """
+    Hashes whole files by path, in threads or in worker processes.
+    
+    hashlib releases the GIL while digesting large chunks, but the
+    per-chunk Python work and small files still compete with the event
+    loop. With `HASH_BACKEND=process` files are read and hashed in a pool
+    of worker processes instead, started on first use. The thread
+    backend hashes in the calling thread, or a new one when awaited.
+    """
+    
+    def __init__(self) -> None:
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+    
+    @property
+    def uses_processes(self) -> bool:
+        return settings.hash_backend == "process"
+    
+    def hash(
+        self,
+        path: Path | str,
+        algorithm: str | None = None,
+        buffer: mmap.mmap | bytearray | None = None,
+        io_mode: str = "buffered",
+    ) -> str:
+        """Hash a file, blocking. `buffer` is only used by the thread backend."""
+        algorithm = algorithm or settings.checksum_algorithm
+        if not self.uses_processes:
+            return hash_file(path, algorithm, buffer, io_mode)
+        future = self._pool().submit(_hash_in_worker, str(path), algorithm, io_mode)
+        return self._count(future.result(), algorithm)
+    
+    async def hash_async(
+        self,
+        path: Path | str,
+        algorithm: str | None = None,
+        io_mode: str = "buffered",
+    ) -> str:
+        """Hash a file without blocking the event loop."""
+        algorithm = algorithm or settings.checksum_algorithm
+        if not self.uses_processes:
+            return await asyncio.to_thread(hash_file, path, algorithm, None, io_mode)
+        future = self._pool().submit(_hash_in_worker, str(path), algorithm, io_mode)
+        return self._count(await asyncio.wrap_future(future), algorithm)
+    
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling queued files."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                # Not imported with the app, most setups never start the pool
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                
+                workers = hash_worker_count()
+                # forkserver: forking a process with running threads isn't safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                logger.info("Started %d hashing processes", workers)
+            return self._executor
+    
+    @staticmethod
+    def _count(result: tuple[str, int], algorithm: str) -> str:
+        # Metrics of the worker processes aren't exported, count here
+        digest, total = result
+        CHECKSUM_BYTES.labels(algorithm).inc(total)
+        return digest
+
+
+hash_pool = HashPool()
+
+
+def hash_edges(path: Path | str, size: int, algorithm: str | None = None) -> str:
+    """
+    Calculate a checksum of the first and last 64 KiB of a file.
+    
+    Cheap pre-filter for duplicate detection. Files that fit in the two
+    edges are hashed whole, so the result equals `hash_file()` for them.
+    """
+    algorithm = algorithm or settings.checksum_algorithm
+    if size <= 2 * PARTIAL_EDGE_BYTES:
+        return hash_file(path, algorithm)
+    
+    digest = hashlib.new(algorithm)
+    with open(path, "rb", buffering=0) as f:
+        digest.update(f.read(PARTIAL_EDGE_BYTES))
+        f.seek(-PARTIAL_EDGE_BYTES, os.SEEK_END)
+        digest.update(f.read(PARTIAL_EDGE_BYTES))
+    
+    CHECKSUM_BYTES.labels(algorithm).inc(2 * PARTIAL_EDGE_BYTES)
+    return digest.hexdigest()
+
+
+def partial_algorithm(algorithm: str | None = None) -> str:
+    """Get the cache algorithm name used for edge hashes."""
+    return f"edges-{algorithm or settings.checksum_algorithm}"
+
+
+async def get_cached_hashes(
+    keys: Iterable[FileKey],
+    algorithm: str,
+    db: aiosqlite.Connection | None = None,
+) -> dict[FileKey, str]:
+    """Look up cached digests, only entries matching size and mtime are returned."""
+    db = db or await get_index_database()
+    by_disk: dict[str, dict[int, list[FileKey]]] = {}
+    for key in keys:
+        by_disk.setdefault(key.disk_id, {}).setdefault(key.inode, []).append(key)
+    
+    found: dict[FileKey, str] = {}
+    for disk_id, by_inode in by_disk.items():
+        inodes = list(by_inode)
+        for i in range(0, len(inodes), _QUERY_BATCH):
+            batch = inodes[i:i + _QUERY_BATCH]
+            rows = await fetch_all(
+                f"""
+                SELECT inode, size, mtime_ns, digest FROM hash_cache
+                WHERE disk_id = ? AND algorithm = ? AND inode IN ({",".join("?" * len(batch))})
+                """,
+                (disk_id, algorithm, *batch),
+                db=db,
+            )
+            for row in rows:
+                for key in by_inode[row["inode"]]:
+                    if key.size == row["size"] and key.mtime_ns == row["mtime_ns"]:
+                        found[key] = row["digest"]
+    
+    if found:
+        now = int(time.time())
+        async with index_write_lock():
+            await execute_many(
+                """
+                UPDATE hash_cache SET last_used_at = ?
+                WHERE disk_id = ? AND inode = ? AND algorithm = ?
+                """,
+                [(now, key.disk_id, key.inode, algorithm) for key in found],
+                db=db,
+            )
+            await db.commit()
+    
+    return found
+
+
+async def store_hashes(
+    digests: dict[FileKey, str],
+    algorithm: str,
+    db: aiosqlite.Connection | None = None,
+) -> None:
+    """Save digests to the cache, replacing stale entries for the same inode."""
+    if not digests:
+        return
+    db = db or await get_index_database()
+    now = int(time.time())
+    async with index_write_lock():
+        await execute_many(
+            """
+            INSERT OR REPLACE INTO hash_cache
+                (disk_id, inode, algorithm, size, mtime_ns, digest, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (key.disk_id, key.inode, algorithm, key.size, key.mtime_ns, digest, now)
+                for key, digest in digests.items()
+            ],
+            db=db,
+        )
+        await db.commit()
+
+
+async def hash_file_cached(path: Path | str, algorithm: str | None = None) -> str:
+    """
+    Get the checksum of a file, reading it only if the cache has no match.
+    
+    Used by verification and undo checks, so a file that hasn't changed
+    since it was last hashed (by a move, a verification or dedupe) is never
+    read again. Files outside the array disks are always hashed.
+    """
+    algorithm = algorithm or settings.checksum_algorithm
+    key = await asyncio.to_thread(file_key, path)
+    if key is not None:
+        cached = await get_cached_hashes([key], algorithm)
+        if key in cached:
+            return cached[key]
+    
+    digest = await hash_pool.hash_async(path, algorithm)
+    
+    # Don't cache if the file changed while it was being read
+    if key is not None and await asyncio.to_thread(file_key, path) == key:
+        await store_hashes({key: digest}, algorithm)
+    return digest
+
+
+async def remember_hash(path: Path | str, digest: str, algorithm: str | None = None) -> None:
+    """
+    Cache a checksum calculated elsewhere, such as while copying a file.
+    
+    Paths outside the array disks and files that no longer exist are ignored.
+    """
+    try:
+        key = await asyncio.to_thread(file_key, path)
+    except OSError:
+        return
+    if key is not None:
+        await store_hashes({key: digest}, algorithm or settings.checksum_algorithm)
+
+
+async def prune_hash_cache(
+    max_entries: int | None = None,
+    db: aiosqlite.Connection | None = None,
+) -> int:
+    """Delete the least recently used hashes beyond the limit, returns the number deleted."""
+    max_entries = settings.hash_cache_max_entries if max_entries is None else max_entries
+    db = db or await get_index_database()
+    row = await fetch_one("SELECT COUNT(*) AS entries FROM hash_cache", db=db)
+    excess = row["entries"] - max_entries if row else 0
+    if excess <= 0:
+        return 0
+    
+    async with index_write_lock():
+        deleted = await execute(
+            """
+            DELETE FROM hash_cache WHERE rowid IN (
+                SELECT rowid FROM hash_cache ORDER BY last_used_at LIMIT ?
+            )
+            """,
+            (excess,),
+            db=db,
+        )
+        await db.commit()
+    return deleted
@@ -37,12 +37,26 @@ class Settings(BaseSettings):
     # Operation settings
     dry_run: bool = True
     undo_retention_hours: int = 24
+    history_detail_days: int = 30  # Older per-file history is compacted into per-task summaries
+    retention_interval_seconds: int = 3600  # How often to compact history and prune undo records
+    vacuum_step_pages: int = 2000  # Free pages returned to the OS per idle maintenance run
+    calibration_probe_mb: int = 1024  # Scratch file written and read back per disk
+    calibration_max_seconds: int = 30  # Each probe direction stops after this long
     strict_permissions: bool = True
+    permission_recheck_interval_seconds: int = 300  # Full re-check even without mount changes
+    mount_poll_interval_seconds: int = 5  # How often to look for array mount changes
     
     # Indexing
     index_threads_fast_percent: int = 75  # % of free threads for <5min jobs
     index_threads_slow_percent: int = 50  # % of free threads for >5min jobs
     index_chunk_size: int = 10000  # Files per progress update
+    index_stale_hours: int = 24  # Index is reported stale after this long
+    watcher_enabled: bool = False  # Keep the index current from filesystem change events
+    watcher_backend: Literal["auto", "fanotify", "inotify"] = "auto"
+    watcher_shares: str = ""  # Comma separated shares inotify watches, all if empty
+    watcher_max_watches: int = 100_000  # inotify watches per disk
+    watcher_batch_seconds: float = 2.0  # Changes are coalesced and applied this often
+    watcher_batch_size: int = 500  # Directories refreshed per transaction
     
     # Disk detection
     disk_mount_pattern: str = "/mnt/disk*"
@@ -53,6 +67,37 @@ class Settings(BaseSettings):
     # Safety
     max_move_size_gb: int = 500  # Warn for moves larger than this
     checksum_algorithm: Literal["md5", "sha256"] = "sha256"
+    hash_cache_max_entries: int = 2_000_000  # Least recently used hashes are pruned beyond this
+    hash_backend: Literal["thread", "process"] = "thread"  # Where whole files are hashed
+    hash_workers: int = 0  # Hashing processes, 0 = INDEX_THREADS_SLOW_PERCENT of free CPU threads
+    
+    # Duplicate detection
+    dedupe_min_size_bytes: int = 1024 * 1024  # Smaller files aren't worth reporting
+    
+    # Throttling
+    throttle_enabled: bool = True  # Slow moves down when the server is under pressure
+    throttle_io_pressure_percent: float = 10.0  # Target max time tasks stall on I/O (PSI)
+    throttle_cpu_pressure_percent: float = 25.0  # Target max time tasks stall on CPU (PSI)
+    throttle_foreground_mbps: float = 5.0  # Disks with more I/O from other processes are busy
+    throttle_min_bandwidth_mbps: float = 5.0  # Per-move floor while throttled
+    throttle_interval_seconds: float = 1.0
+    quiet_hours: str = ""  # e.g. "18:00-23:30,06:00-07:00" (local time)
+    quiet_hours_bandwidth_mbps: float = 0.0  # Per-move rate in quiet hours, 0 pauses moves
+    move_io_mode: Literal["buffered", "fadvise", "direct"] = "buffered"  # Page cache use by moves
+    move_concurrency: int = 1  # Disk pairs moved at once, /balance/simulate recommends a level
+    
+    # Planning
+    plan_split_penalty_seconds: float = 5.0  # Cost of leaving part of a directory on another disk
+    plan_max_overhead_ratio: float = 1.0  # Skip moves whose fixed costs exceed this times their transfer
+    plan_placement: Literal["balance", "hot_cold"] = "balance"  # Default placement mode
+    placement_hot_days: float = 30.0  # Units used (modified or read) this recently are hot
+    placement_cold_days: float = 180.0  # Units unused for this long are cold
+    index_snapshots: bool = True  # Write Arrow snapshots of the index (needs pyarrow)
+    
+    @property
+    def disk_mount_root(self) -> Path:
+        """Get the directory the array disks are mounted under."""
+        return Path(self.disk_mount_pattern).parent
     
     @property
     def database_path(self) -> Path:
@@ -63,10 +108,11 @@ class Settings(BaseSettings):
     def index_database_path(self) -> Path:
         """Get the index database file path."""
         return self.data_dir / "index.db"
+    
+    def ensure_directories(self) -> None:
+        """Create the data and log directories if they don't exist."""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
 
 
 settings = Settings()
-
-# Ensure directories exist
-settings.data_dir.mkdir(parents=True, exist_ok=True)
-settings.log_dir.mkdir(parents=True, exist_ok=True)
@@ -1,16 +1,27 @@
 """Database initialization and connection management."""
 
+import asyncio
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any
+
 import aiosqlite
 
 from app.services.config import settings
+from app.services.metrics import observe_query
+
+AUTO_VACUUM_INCREMENTAL = 2
 
 _db: aiosqlite.Connection | None = None
+_index_db: aiosqlite.Connection | None = None
+_index_write_lock: asyncio.Lock | None = None
 
 
 async def get_database() -> aiosqlite.Connection:
     """Get the database connection."""
     global _db
     if _db is None:
+        settings.ensure_directories()
         _db = await aiosqlite.connect(settings.database_path)
         _db.row_factory = aiosqlite.Row
     return _db
@@ -20,8 +31,15 @@ async def init_database() -> None:
     """Initialize the database schema."""
     db = await get_database()
     
+    # History is pruned continuously, let freed pages be returned to the OS
+    # in small steps. Existing databases need one full VACUUM to switch.
+    row = await fetch_one("PRAGMA auto_vacuum", db=db)
+    if row is not None and row[0] != AUTO_VACUUM_INCREMENTAL:
+        await db.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        await db.execute("VACUUM")
+    
     # Create tables
-    await db.executescript("""
+    await executescript(db, """
         -- Settings table
         CREATE TABLE IF NOT EXISTS settings (
             key TEXT PRIMARY KEY,
@@ -83,6 +101,42 @@ async def init_database() -> None:
         
         CREATE INDEX IF NOT EXISTS idx_history_created ON operation_history(created_at);
         
+        -- Per-task totals of compacted operation history
+        CREATE TABLE IF NOT EXISTS history_summaries (
+            task_id INTEGER NOT NULL,  -- 0 for operations without a task
+            operation TEXT NOT NULL,
+            status TEXT NOT NULL,
+            file_count INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL,
+            total_duration_ms INTEGER NOT NULL,
+            first_at TIMESTAMP NOT NULL,
+            last_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (task_id, operation, status)
+        );
+        
+        -- Recent balance plans, see services/plan_cache.py
+        CREATE TABLE IF NOT EXISTS plan_cache (
+            key TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,  -- Index generation the plan was made from
+            granularity TEXT NOT NULL,  -- 'file' or 'unit' (whole directories), plus ':hot_cold'
+            tolerance_percent REAL NOT NULL,
+            cost_seconds REAL NOT NULL,
+            moves TEXT NOT NULL,  -- JSON array of move rows
+            used_at INTEGER NOT NULL  -- Unix time in ns, for LRU order
+        );
+        
+        -- Measured sequential disk speeds, one row per calibration
+        CREATE TABLE IF NOT EXISTS disk_throughput (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            disk_id TEXT NOT NULL,
+            read_bps REAL NOT NULL,
+            write_bps REAL NOT NULL,
+            probe_bytes INTEGER NOT NULL,
+            measured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_throughput_disk ON disk_throughput(disk_id);
+        
         -- Session table for authentication
         CREATE TABLE IF NOT EXISTS sessions (
             token TEXT PRIMARY KEY,
@@ -97,9 +151,204 @@ async def init_database() -> None:
     await db.commit()
 
 
+async def get_index_database() -> aiosqlite.Connection:
+    """Get the file index database connection."""
+    global _index_db
+    if _index_db is None:
+        settings.ensure_directories()
+        _index_db = await aiosqlite.connect(settings.index_database_path)
+        _index_db.row_factory = aiosqlite.Row
+        # The index can always be rebuilt, favour bulk write speed
+        await _index_db.execute("PRAGMA journal_mode=WAL")
+        await _index_db.execute("PRAGMA synchronous=NORMAL")
+    return _index_db
+
+
+def index_write_lock() -> asyncio.Lock:
+    """
+    Get the lock held while writing to index.db.
+    
+    Index runs, watcher batches, refreshes after moves and the hash cache
+    share one connection, and a commit commits everything written on it.
+    Writers hold the lock from their first write to their commit, so none
+    commits another's half-applied changes or allocates the same row IDs.
+    """
+    global _index_write_lock
+    if _index_write_lock is None:
+        _index_write_lock = asyncio.Lock()
+    return _index_write_lock
+
+
+async def init_index_database() -> None:
+    """Initialize the file index schema."""
+    db = await get_index_database()
+    
+    await executescript(db, """
+        -- Directories with direct and recursive (rollup) totals
+        CREATE TABLE IF NOT EXISTS directories (
+            id INTEGER PRIMARY KEY,
+            disk_id TEXT NOT NULL,
+            path TEXT NOT NULL,  -- Relative to the disk root, '' for the root
+            parent_id INTEGER,
+            share TEXT,
+            file_count INTEGER NOT NULL DEFAULT 0,
+            size_bytes INTEGER NOT NULL DEFAULT 0,
+            total_files INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (disk_id, path)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_directories_share ON directories(share);
+        CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories(parent_id);
+        
+        -- Files
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            dir_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            atime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            FOREIGN KEY (dir_id) REFERENCES directories(id)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir_id);
+        CREATE INDEX IF NOT EXISTS idx_files_size ON files(size);
+        
+        -- Per-disk index runs
+        CREATE TABLE IF NOT EXISTS indexed_disks (
+            disk_id TEXT PRIMARY KEY,
+            file_count INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL,
+            duration_seconds REAL NOT NULL,
+            indexed_at TIMESTAMP NOT NULL
+        );
+        
+        -- Content hashes, valid while inode, size and mtime are unchanged
+        CREATE TABLE IF NOT EXISTS hash_cache (
+            disk_id TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            algorithm TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            last_used_at INTEGER NOT NULL,  -- Unix time, for LRU pruning
+            PRIMARY KEY (disk_id, inode, algorithm)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_hash_cache_used ON hash_cache(last_used_at);
+        
+        -- Usage aggregates per disk, see analytics.py
+        CREATE TABLE IF NOT EXISTS share_usage (
+            disk_id TEXT NOT NULL,
+            share TEXT NOT NULL,  -- '' for files in the disk root
+            file_count INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL,
+            PRIMARY KEY (disk_id, share)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS size_histogram (
+            disk_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,  -- Bit length of the size
+            file_count INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL,
+            PRIMARY KEY (disk_id, bucket)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS mtime_histogram (
+            disk_id TEXT NOT NULL,
+            day INTEGER NOT NULL,  -- Days since the Unix epoch
+            file_count INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL,
+            PRIMARY KEY (disk_id, day)
+        ) WITHOUT ROWID;
+        
+        -- Index-wide values (generation, last run)
+        CREATE TABLE IF NOT EXISTS index_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """)
+    
+    await db.commit()
+
+
+async def execute(
+    sql: str,
+    params: Sequence[Any] = (),
+    db: aiosqlite.Connection | None = None,
+) -> int:
+    """Execute a statement and return the number of affected rows."""
+    db = db or await get_database()
+    with observe_query(_database_name(db), sql):
+        cursor = await db.execute(sql, params)
+    return cursor.rowcount
+
+
+async def execute_many(
+    sql: str,
+    rows: Iterable[Sequence[Any]],
+    db: aiosqlite.Connection | None = None,
+) -> None:
+    """Execute a statement once per row."""
+    db = db or await get_database()
+    with observe_query(_database_name(db), sql):
+        await db.executemany(sql, rows)
+
+
+async def executescript(db: aiosqlite.Connection, script: str) -> None:
+    """Execute a multi-statement SQL script."""
+    with observe_query(_database_name(db), "SCRIPT"):
+        await db.executescript(script)
+
+
+async def fetch_all(
+    sql: str,
+    params: Sequence[Any] = (),
+    db: aiosqlite.Connection | None = None,
+) -> list[aiosqlite.Row]:
+    """Run a query and return all rows."""
+    db = db or await get_database()
+    with observe_query(_database_name(db), sql):
+        async with db.execute(sql, params) as cursor:
+            return list(await cursor.fetchall())
+
+
+async def fetch_one(
+    sql: str,
+    params: Sequence[Any] = (),
+    db: aiosqlite.Connection | None = None,
+) -> aiosqlite.Row | None:
+    """Run a query and return the first row."""
+    db = db or await get_database()
+    with observe_query(_database_name(db), sql):
+        async with db.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+
+def sql_timestamp(value: datetime | None = None) -> str:
+    """
+    Format a UTC time like SQLite's CURRENT_TIMESTAMP.
+    
+    Timestamps are compared as text, so values written from Python must
+    use the same format as the column defaults.
+    """
+    return (value or datetime.utcnow()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _database_name(db: aiosqlite.Connection) -> str:
+    """Get the metrics label for a connection."""
+    return "state" if db is _db else "index"
+
+
 async def close_database() -> None:
-    """Close the database connection."""
-    global _db
+    """Close the database connections."""
+    global _db, _index_db, _index_write_lock
     if _db is not None:
         await _db.close()
         _db = None
+    if _index_db is not None:
+        await _index_db.close()
+        _index_db = None
+    _index_write_lock = None
@@ -0,0 +1,332 @@
+"""Duplicate file detection across array disks.
+
+Candidates are narrowed in stages so only a small fraction of the bytes
+on the array is ever read:
+
+1. Files sharing a size (index snapshots or query, no disk access)
+2. Hash of the first and last 64 KiB
+3. Full content hash
+
+Hashes are cached in index.db by inode, size and mtime, so reruns only
+read files that changed.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.services.checksum import (
+    PARTIAL_EDGE_BYTES,
+    FileKey,
+    get_cached_hashes,
+    hash_edges,
+    hash_pool,
+    partial_algorithm,
+    prune_hash_cache,
+    store_hashes,
+)
+from app.services.config import settings
+from app.services.database import fetch_all, get_index_database
+from app.services.indexer import discover_disks
+from app.services.snapshot import open_all_current, same_size_rows
+
+logger = logging.getLogger(__name__)
+
+
+class DedupeCancelled(Exception):
+    """Raised when a dedupe run was cancelled."""
+
+
+@dataclass
+class Candidate:
+    """A file that might have duplicates."""
+    
+    key: FileKey
+    path: Path
+
+
+@dataclass
+class DuplicateGroup:
+    """Files with identical content."""
+    
+    size: int
+    digest: str
+    files: list[Candidate]
+    
+    @property
+    def wasted_bytes(self) -> int:
+        """Get the space that removing all but one copy would free."""
+        return self.size * (len(self.files) - 1)
+
+
+@dataclass
+class DedupeProgress:
+    """Progress of the current or last dedupe run."""
+    
+    is_running: bool = False
+    stage: str = "idle"  # "sizes", "partial", "full", "done"
+    files_total: int = 0
+    files_done: int = 0
+    error: str | None = None
+
+
+@dataclass
+class DedupeReport:
+    """Result of a dedupe run."""
+    
+    groups: list[DuplicateGroup] = field(default_factory=list)
+    size_candidates: int = 0
+    partial_hashed: int = 0
+    full_hashed: int = 0
+    cache_hits: int = 0
+    duration_seconds: float = 0.0
+    
+    @property
+    def wasted_bytes(self) -> int:
+        """Get the space taken up by redundant copies."""
+        return sum(g.wasted_bytes for g in self.groups)
+
+
+async def load_size_groups(min_size: int) -> list[list[Candidate]]:
+    """
+    Group indexed files that share a size with at least one other file.
+    
+    Hardlinks (same inode on the same disk) count as one file. Read from
+    the index snapshots when every disk has a current one.
+    """
+    mounts = discover_disks()
+    snapshots = await open_all_current()
+    if snapshots is not None:
+        rows = await asyncio.to_thread(same_size_rows, snapshots, min_size)
+    else:
+        rows = await fetch_all(
+            """
+            SELECT d.disk_id, d.path AS dir_path, f.name, f.size, f.inode, f.mtime_ns
+            FROM files f
+            JOIN directories d ON d.id = f.dir_id
+            WHERE f.size IN (
+                SELECT size FROM files WHERE size >= ? GROUP BY size HAVING COUNT(*) > 1
+            )
+            ORDER BY f.size
+            """,
+            (min_size,),
+            db=await get_index_database(),
+        )
+    
+    by_size: dict[int, dict[tuple[str, int], Candidate]] = defaultdict(dict)
+    for row in rows:
+        mount_point = mounts.get(row["disk_id"])
+        if mount_point is None:
+            continue
+        key = FileKey(row["disk_id"], row["inode"], row["size"], row["mtime_ns"])
+        by_size[row["size"]].setdefault(
+            (key.disk_id, key.inode),
+            Candidate(key=key, path=mount_point / row["dir_path"] / row["name"]),
+        )
+    
+    return [list(group.values()) for group in by_size.values() if len(group) > 1]
+
+
+def hash_per_disk(
+    candidates: list[Candidate],
+    hash_fn: Callable[[Candidate], str],
+    cancel: threading.Event | None = None,
+    on_file: Callable[[], None] | None = None,
+) -> dict[FileKey, str]:
+    """
+    Hash candidates with one thread per disk.
+    
+    Reads on one spindle stay sequential while different disks are read
+    in parallel. Files that vanished or can't be read are left out.
+    """
+    by_disk: dict[str, list[Candidate]] = defaultdict(list)
+    for candidate in candidates:
+        by_disk[candidate.key.disk_id].append(candidate)
+    
+    def hash_disk(disk_candidates: list[Candidate]) -> dict[FileKey, str]:
+        digests = {}
+        for candidate in disk_candidates:
+            if cancel is not None and cancel.is_set():
+                raise DedupeCancelled()
+            try:
+                digests[candidate.key] = hash_fn(candidate)
+            except OSError as e:
+                logger.debug("Skipping %s: %s", candidate.path, e)
+            if on_file is not None:
+                on_file()
+        return digests
+    
+    results: dict[FileKey, str] = {}
+    if not by_disk:
+        return results
+    
+    with ThreadPoolExecutor(max_workers=len(by_disk), thread_name_prefix="dedupe") as pool:
+        for digests in pool.map(hash_disk, by_disk.values()):
+            results.update(digests)
+    return results
+
+
+def split_by_digest(
+    groups: list[list[Candidate]],
+    digests: dict[FileKey, str],
+) -> list[list[Candidate]]:
+    """Split groups by digest, keeping only sub-groups with more than one file."""
+    result = []
+    for group in groups:
+        by_digest: dict[str, list[Candidate]] = defaultdict(list)
+        for candidate in group:
+            digest = digests.get(candidate.key)
+            if digest is not None:
+                by_digest[digest].append(candidate)
+        result.extend(g for g in by_digest.values() if len(g) > 1)
+    return result
+
+
+class DedupeJob:
+    """Run duplicate detection in the background."""
+    
+    def __init__(self) -> None:
+        self.progress = DedupeProgress()
+        self.report: DedupeReport | None = None
+        self._cancel = threading.Event()
+        self._task: asyncio.Task[DedupeReport] | None = None
+    
+    @property
+    def is_running(self) -> bool:
+        """Check if a dedupe run is in progress."""
+        return self._task is not None and not self._task.done()
+    
+    def start(self, min_size: int | None = None) -> None:
+        """
+        Start a dedupe run in the background.
+        
+        Raises:
+            RuntimeError: If a dedupe run is already in progress.
+        """
+        if self.is_running:
+            raise RuntimeError("Duplicate detection is already running")
+        self._task = asyncio.create_task(self.run(min_size))
+    
+    def cancel(self) -> bool:
+        """Request cancellation, returns False if nothing is running."""
+        if not self.is_running:
+            return False
+        self._cancel.set()
+        return True
+    
+    async def run(self, min_size: int | None = None) -> DedupeReport:
+        """Find duplicate files in the index."""
+        min_size = settings.dedupe_min_size_bytes if min_size is None else min_size
+        start = time.perf_counter()
+        report = DedupeReport()
+        self._cancel.clear()
+        self.progress = DedupeProgress(is_running=True, stage="sizes")
+        
+        try:
+            groups = await load_size_groups(min_size)
+            report.size_candidates = sum(len(g) for g in groups)
+            
+            # Edge hashes; for small files this is already the full hash
+            groups, partial_digests, hashed, hits = await self._hash_stage(
+                "partial",
+                groups,
+                partial_algorithm(),
+                lambda c: hash_edges(c.path, c.key.size),
+            )
+            report.partial_hashed += hashed
+            report.cache_hits += hits
+            
+            needs_full = [g for g in groups if g[0].key.size > 2 * PARTIAL_EDGE_BYTES]
+            complete = [g for g in groups if g[0].key.size <= 2 * PARTIAL_EDGE_BYTES]
+            
+            full_groups, full_digests, hashed, hits = await self._hash_stage(
+                "full",
+                needs_full,
+                settings.checksum_algorithm,
+                lambda c: hash_pool.hash(c.path),
+            )
+            report.full_hashed += hashed
+            report.cache_hits += hits
+            
+            for group in complete:
+                report.groups.append(DuplicateGroup(
+                    size=group[0].key.size,
+                    digest=partial_digests[group[0].key],
+                    files=group,
+                ))
+            for group in full_groups:
+                report.groups.append(DuplicateGroup(
+                    size=group[0].key.size,
+                    digest=full_digests[group[0].key],
+                    files=group,
+                ))
+            report.groups.sort(key=lambda g: g.wasted_bytes, reverse=True)
+            await prune_hash_cache()
+        except DedupeCancelled:
+            self.progress.error = "Cancelled"
+            logger.info("Duplicate detection cancelled")
+            return report
+        except Exception as e:
+            self.progress.error = str(e)
+            logger.exception("Duplicate detection failed")
+            raise
+        finally:
+            self.progress.is_running = False
+        
+        report.duration_seconds = time.perf_counter() - start
+        self.progress.stage = "done"
+        self.report = report
+        logger.info(
+            "Found %d duplicate groups (%d bytes redundant) from %d candidates, "
+            "%d edge and %d full hashes, %d cache hits",
+            len(report.groups),
+            report.wasted_bytes,
+            report.size_candidates,
+            report.partial_hashed,
+            report.full_hashed,
+            report.cache_hits,
+        )
+        return report
+    
+    async def _hash_stage(
+        self,
+        stage: str,
+        groups: list[list[Candidate]],
+        algorithm: str,
+        hash_fn: Callable[[Candidate], str],
+    ) -> tuple[list[list[Candidate]], dict[FileKey, str], int, int]:
+        """
+        Hash every candidate (cache first) and split groups by digest.
+        
+        Returns the remaining groups, all digests, and the number of files
+        hashed and found in the cache.
+        """
+        candidates = [c for group in groups for c in group]
+        self.progress.stage = stage
+        self.progress.files_total = len(candidates)
+        self.progress.files_done = 0
+        
+        cached = await get_cached_hashes((c.key for c in candidates), algorithm)
+        todo = [c for c in candidates if c.key not in cached]
+        self.progress.files_done = len(cached)
+        
+        computed = await asyncio.to_thread(
+            hash_per_disk, todo, hash_fn, self._cancel, self._on_file
+        )
+        await store_hashes(computed, algorithm)
+        
+        digests = {**cached, **computed}
+        return split_by_digest(groups, digests), digests, len(computed), len(cached)
+    
+    def _on_file(self) -> None:
+        """Count a hashed file, called from the hashing threads."""
+        self.progress.files_done += 1
+
+
+dedupe_job = DedupeJob()
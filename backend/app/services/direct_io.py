@@ -0,0 +1,199 @@
+"""File I/O that leaves the page cache alone.
+
+Copying terabytes through the page cache evicts the metadata and media
+other containers keep hot. `MOVE_IO_MODE` picks how moves read and write:
+
+- "buffered": plain reads and writes, the kernel caches everything.
+- "fadvise": buffered, but every chunk read is dropped from the cache
+  right away (POSIX_FADV_DONTNEED), and written data is flushed and
+  dropped every `FLUSH_BYTES`. Works on every file system.
+- "direct": O_DIRECT reads and writes that bypass the cache entirely.
+  Buffers must be page aligned, so they come from anonymous mmaps. The
+  unaligned tail of a file is written after clearing O_DIRECT. File
+  systems that refuse O_DIRECT (tmpfs, some FUSE mounts) fall back to
+  "fadvise" for that file.
+
+Both uncached modes use larger chunks, since without readahead each
+chunk is a separate trip to the disk. Buffers come from a pool and are
+reused across files, so a long move never allocates per chunk.
+"""
+
+import errno
+import fcntl
+import mmap
+import os
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+ALIGNMENT = mmap.PAGESIZE
+BUFFERED_CHUNK_SIZE = 1024 * 1024
+UNCACHED_CHUNK_SIZE = 8 * 1024 * 1024
+# Written data is synced and dropped from the cache this often in "fadvise" mode
+FLUSH_BYTES = 64 * 1024 * 1024
+
+IO_MODES = ("buffered", "fadvise", "direct")
+
+_O_DIRECT = getattr(os, "O_DIRECT", 0)
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+
+class BufferPool:
+    """Reusable page-aligned buffers, keyed by size."""
+    
+    def __init__(self, max_idle: int = 8) -> None:
+        self.max_idle = max_idle
+        self.allocated = 0  # Buffers created so far
+        self._idle: dict[int, list[mmap.mmap]] = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self, size: int) -> mmap.mmap:
+        """Get a buffer of `size` bytes, rounded up to the alignment."""
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        with self._lock:
+            idle = self._idle.get(size)
+            if idle:
+                return idle.pop()
+            self.allocated += 1
+        # Anonymous mappings are always page aligned
+        return mmap.mmap(-1, size)
+    
+    def release(self, buffer: mmap.mmap) -> None:
+        """Return a buffer for reuse, unmapping it if enough are idle."""
+        with self._lock:
+            idle = self._idle.setdefault(len(buffer), [])
+            if len(idle) < self.max_idle:
+                idle.append(buffer)
+                return
+        buffer.close()
+    
+    @contextmanager
+    def buffer(self, size: int) -> Iterator[mmap.mmap]:
+        """Borrow a buffer for the duration of a block."""
+        buffer = self.acquire(size)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+buffer_pool = BufferPool()
+
+
+def chunk_size(mode: str) -> int:
+    """Get the chunk size that suits an I/O mode."""
+    return BUFFERED_CHUNK_SIZE if mode == "buffered" else UNCACHED_CHUNK_SIZE
+
+
+def open_read(path: Path | str, mode: str) -> tuple[int, bool]:
+    """Open a file for reading, returning the descriptor and whether it is O_DIRECT."""
+    if mode == "direct" and _O_DIRECT:
+        try:
+            return os.open(path, os.O_RDONLY | os.O_CLOEXEC | _O_DIRECT), True
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    if mode != "buffered" and _HAS_FADVISE:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return fd, False
+
+
+def read_chunks(
+    path: Path | str,
+    buffer: mmap.mmap | bytearray,
+    mode: str = "buffered",
+) -> Iterator[memoryview]:
+    """
+    Read a file chunk by chunk into `buffer`.
+    
+    Each chunk is only valid until the next one is read. In the uncached
+    modes, chunks read without O_DIRECT are dropped from the cache.
+    """
+    fd, direct = open_read(path, mode)
+    view = memoryview(buffer)
+    offset = 0
+    try:
+        while n := os.readv(fd, [buffer]):
+            yield view[:n]
+            if mode != "buffered" and not direct and _HAS_FADVISE:
+                os.posix_fadvise(fd, offset, n, os.POSIX_FADV_DONTNEED)
+            offset += n
+    finally:
+        view.release()
+        os.close(fd)
+
+
+def copy_file(
+    source: Path | str,
+    dest: Path | str,
+    buffer: mmap.mmap | bytearray,
+    mode: str = "buffered",
+    on_chunk: Callable[[memoryview], None] | None = None,
+) -> os.stat_result:
+    """
+    Copy a file, replacing `dest`, and fsync it, returning the source's stat.
+    
+    `on_chunk` sees every chunk before it is written. O_DIRECT needs
+    `buffer` to be page aligned (from `buffer_pool`) and a multiple of
+    the alignment in size.
+    """
+    src, direct_read = open_read(source, mode)
+    try:
+        st = os.fstat(src)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC
+        direct_write = False
+        if mode == "direct" and _O_DIRECT and len(buffer) % ALIGNMENT == 0:
+            try:
+                dst = os.open(dest, flags | _O_DIRECT, 0o666)
+                direct_write = True
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        if not direct_write:
+            dst = os.open(dest, flags, 0o666)
+        
+        try:
+            view = memoryview(buffer)
+            offset = flushed = 0
+            while n := os.readv(src, [buffer]):
+                chunk = view[:n]
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                if direct_write and n % ALIGNMENT:
+                    # Only the last chunk is short: write its aligned part directly
+                    aligned = n - n % ALIGNMENT
+                    _write_all(dst, chunk[:aligned])
+                    fcntl.fcntl(dst, fcntl.F_SETFL, fcntl.fcntl(dst, fcntl.F_GETFL) & ~_O_DIRECT)
+                    direct_write = False
+                    _write_all(dst, chunk[aligned:])
+                else:
+                    _write_all(dst, chunk)
+                
+                if mode != "buffered" and _HAS_FADVISE:
+                    if not direct_read:
+                        os.posix_fadvise(src, offset, n, os.POSIX_FADV_DONTNEED)
+                    # Dirty pages can't be dropped, so sync them first
+                    if offset + n - flushed >= FLUSH_BYTES:
+                        os.fdatasync(dst)
+                        os.posix_fadvise(dst, flushed, offset + n - flushed, os.POSIX_FADV_DONTNEED)
+                        flushed = offset + n
+                offset += n
+            view.release()
+            
+            os.fsync(dst)
+            if mode != "buffered" and _HAS_FADVISE:
+                os.posix_fadvise(dst, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(dst)
+    finally:
+        os.close(src)
+    return st
+
+
+def _write_all(fd: int, data: memoryview) -> None:
+    """Write all of `data`, continuing after short writes."""
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
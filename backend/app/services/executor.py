@@ -0,0 +1,513 @@
+"""Move execution: copy, verify, then delete the source."""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.services.checksum import (
+    FileKey,
+    array_disk_id,
+    file_key,
+    hash_pool,
+    store_hashes,
+)
+from app.services.config import settings
+from app.services.database import execute_many, get_database, sql_timestamp
+from app.services.direct_io import buffer_pool, chunk_size, copy_file
+from app.services.metrics import CHECKSUM_BYTES, MOVE_BYTES, MOVER_PAUSES
+from app.services.mover import mover_running
+from app.services.permissions import permission_monitor
+from app.services.throttle import MoveThrottle, move_throttle
+from app.services.watcher import refresh_paths
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = ".balancer-partial"
+# How often a paused move checks if the unRAID mover finished
+MOVER_POLL_SECONDS = 10.0
+
+
+class MoveError(Exception):
+    """Raised when a file can't be moved safely."""
+
+
+@dataclass
+class MoveRequest:
+    """A single file to move."""
+    
+    source: Path
+    dest: Path
+    size: int
+    # The source must still hash to this, e.g. when undoing a move
+    expected_checksum: str | None = None
+    
+    @property
+    def disk_pair(self) -> tuple[str | None, str | None]:
+        """Get the source and destination disk IDs."""
+        return array_disk_id(self.source), array_disk_id(self.dest)
+
+
+@dataclass
+class MoveResult:
+    """Outcome of a move."""
+    
+    request: MoveRequest
+    status: str  # "moved", "failed", "cancelled", "dry_run"
+    checksum: str | None = None
+    duration_ms: int = 0
+    error: str | None = None
+
+
+class PartialJournal:
+    """
+    Remember the partial files being written, so those left by a crash can be removed.
+    
+    Each path is appended and synced before its copy starts. Processes
+    moving files hold a shared lock on the journal, the last one to finish
+    empties it, and leftovers are only cleaned up while nobody holds it.
+    """
+    
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fd: int | None = None
+        self._users = 0
+    
+    @property
+    def path(self) -> Path:
+        """Get the journal file in the data directory."""
+        return settings.data_dir / "partials.journal"
+    
+    def begin(self) -> None:
+        """Start recording the partial files of a batch of moves."""
+        with self._lock:
+            if self._users == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_SH)
+            self._users += 1
+    
+    def add(self, partial: Path) -> None:
+        """Record a partial file before it's written."""
+        with self._lock:
+            if self._fd is None:
+                return
+            os.write(self._fd, os.fsencode(partial) + b"\0")
+            os.fsync(self._fd)
+    
+    def end(self) -> None:
+        """Finish a batch, emptying the journal after the last one."""
+        with self._lock:
+            self._users -= 1
+            if self._users or self._fd is None:
+                return
+            # Unless another process is moving files too
+            with suppress(BlockingIOError):
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.ftruncate(self._fd, 0)
+            os.close(self._fd)
+            self._fd = None
+    
+    def clean_up(self) -> int:
+        """Delete the partial files of moves interrupted by a crash, returns how many."""
+        if not self.path.exists():
+            return 0
+        removed = 0
+        with open(self.path, "r+b") as journal:
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Moves are in progress, leaving their partial files")
+                return 0
+            for entry in journal.read().split(b"\0"):
+                if entry.endswith(PARTIAL_SUFFIX.encode()):
+                    with suppress(FileNotFoundError):
+                        os.unlink(entry)
+                        removed += 1
+            journal.truncate(0)
+        if removed:
+            logger.warning("Removed %d partial files of interrupted moves", removed)
+        return removed
+
+
+partial_journal = PartialJournal()
+
+
+def check_destination(source: Path, dest: Path) -> None:
+    """
+    Check that a file may be moved: both paths on array disks, room for it at `dest`.
+    
+    Raises:
+        MoveError: If it may not.
+        OSError: If the source can't be stat'ed.
+    """
+    for path in (source, dest):
+        # Resolved, so ".." or a symlink can't lead off the array
+        if array_disk_id(path.parent.resolve() / path.name) is None:
+            raise MoveError(f"Not on an array disk: {path}")
+    size = source.stat().st_size
+    existing = next(parent for parent in dest.parents if parent.exists())
+    free = shutil.disk_usage(existing).free
+    if free < size:
+        raise MoveError(f"Not enough space for {source} on {existing}: {free} bytes free")
+
+
+def wait_for_mover(cancel: threading.Event | None = None) -> bool:
+    """Block while the unRAID mover runs, False if cancelled meanwhile."""
+    if not mover_running():
+        return True
+    logger.info("The mover is running, pausing moves until it finishes")
+    MOVER_PAUSES.inc()
+    while mover_running():
+        if cancel is None:
+            time.sleep(MOVER_POLL_SECONDS)
+        elif cancel.wait(MOVER_POLL_SECONDS):
+            return False
+    logger.info("The mover finished, resuming moves")
+    return True
+
+
+def copy_verified(
+    source: Path,
+    dest: Path,
+    buffer: mmap.mmap | bytearray,
+    algorithm: str | None = None,
+    expected_checksum: str | None = None,
+    on_chunk: Callable[[int], None] | None = None,
+    io_mode: str | None = None,
+) -> str:
+    """
+    Move a file between disks and return its checksum.
+    
+    Both paths must be on array disks with room for the file at the
+    destination. The source is hashed while it's copied to a hidden
+    partial file next to the destination, recorded in `partial_journal`.
+    The copy is re-read and compared before it's linked into place, and
+    only then is the source deleted. On any error
+    the partial file is removed and the source is left untouched.
+    
+    `on_chunk` is called with the size of each chunk written, and may
+    sleep to pace the copy. `io_mode` defaults to `MOVE_IO_MODE`; in the
+    uncached modes the copy is re-read from the disk rather than the
+    page cache when it's verified.
+    
+    Raises:
+        MoveError: If the destination exists or is off the array or full, or
+            a checksum doesn't match.
+        OSError: If the file can't be read or written.
+    """
+    algorithm = algorithm or settings.checksum_algorithm
+    io_mode = io_mode or settings.move_io_mode
+    if dest.exists():
+        raise MoveError(f"Destination already exists: {dest}")
+    check_destination(source, dest)
+    
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    partial = dest.with_name(f".{dest.name}{PARTIAL_SUFFIX}")
+    partial_journal.add(partial)
+    digest = hashlib.new(algorithm)
+    total = 0
+    
+    def add_chunk(chunk: memoryview) -> None:
+        nonlocal total
+        digest.update(chunk)
+        total += len(chunk)
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+    
+    try:
+        st = copy_file(source, partial, buffer, io_mode, add_chunk)
+        source_checksum = digest.hexdigest()
+        CHECKSUM_BYTES.labels(algorithm).inc(total)
+        if expected_checksum is not None and source_checksum != expected_checksum:
+            raise MoveError(f"Source no longer matches its recorded checksum: {source}")
+        
+        shutil.copystat(source, partial)
+        with suppress(PermissionError):
+            os.chown(partial, st.st_uid, st.st_gid)
+        
+        if hash_pool.hash(partial, algorithm, buffer, io_mode) != source_checksum:
+            raise MoveError(f"Checksum mismatch after copying {source}")
+        
+        # Unlike rename, link never replaces a file created in the meantime
+        try:
+            os.link(partial, dest)
+        except FileExistsError as e:
+            raise MoveError(f"Destination already exists: {dest}") from e
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(partial)
+    
+    os.unlink(source)
+    
+    source_disk, dest_disk = array_disk_id(source), array_disk_id(dest)
+    MOVE_BYTES.labels(source_disk or "other", "read").inc(total)
+    MOVE_BYTES.labels(dest_disk or "other", "write").inc(total)
+    return source_checksum
+
+
+def unit_requests(source: Path, dest: Path) -> list[MoveRequest]:
+    """
+    List the files below a directory as moves to the same layout under `dest`.
+    
+    Partial files of an interrupted move are left out.
+    """
+    requests = []
+    for root, _, names in os.walk(source):
+        relative = Path(root).relative_to(source)
+        for name in sorted(names):
+            if name.endswith(PARTIAL_SUFFIX):
+                continue
+            path = Path(root) / name
+            requests.append(MoveRequest(path, dest / relative / name, path.lstat().st_size))
+    return requests
+
+
+def remove_empty_dirs(root: Path) -> int:
+    """Remove `root` and the directories below it if they are empty, deepest first."""
+    removed = 0
+    for path, _, _ in sorted(os.walk(root), key=lambda entry: entry[0].count(os.sep), reverse=True):
+        with suppress(OSError):
+            os.rmdir(path)
+            removed += 1
+    return removed
+
+
+def execute_moves(
+    moves: list[MoveRequest],
+    cancel: threading.Event | None = None,
+    on_result: Callable[[MoveResult], None] | None = None,
+    max_workers: int | None = None,
+    throttle: MoveThrottle | None = None,
+) -> list[MoveResult]:
+    """
+    Move files with one worker per disk pair.
+    
+    Moves between the same two disks run one after another in the given
+    order, keeping I/O on each spindle sequential, while up to
+    `max_workers` (default MOVE_CONCURRENCY) pairs run in parallel.
+    Cancellation takes effect between files. Results are returned in the
+    order of `moves`.
+    
+    Before each file, moves wait while the unRAID mover runs and fail
+    while the permission monitor reports critical failures. With a
+    `throttle`, each file waits for a copy slot and is paced to its
+    bandwidth limit.
+    """
+    by_pair: dict[tuple[str | None, str | None], list[int]] = defaultdict(list)
+    for i, move in enumerate(moves):
+        by_pair[move.disk_pair].append(i)
+    
+    results: list[MoveResult | None] = [None] * len(moves)
+    
+    io_mode = settings.move_io_mode
+    
+    def run_pair(indices: list[int]) -> None:
+        with buffer_pool.buffer(chunk_size(io_mode)) as buffer:
+            move_pair(indices, buffer)
+    
+    def move_pair(indices: list[int], buffer: mmap.mmap) -> None:
+        for i in indices:
+            move = moves[i]
+            if cancel is not None and cancel.is_set():
+                results[i] = MoveResult(request=move, status="cancelled")
+                continue
+            if not wait_for_mover(cancel):
+                results[i] = MoveResult(request=move, status="cancelled")
+                continue
+            report = permission_monitor.report
+            if report is not None and report.has_critical_failures:
+                results[i] = MoveResult(
+                    request=move, status="failed", error="Critical permission checks failed"
+                )
+                if on_result is not None:
+                    on_result(results[i])
+                continue
+            if throttle is not None and not throttle.acquire(cancel):
+                results[i] = MoveResult(request=move, status="cancelled")
+                continue
+            
+            pacer = throttle.pacer(move.disk_pair, cancel) if throttle is not None else None
+            start = time.perf_counter()
+            try:
+                checksum = copy_verified(
+                    move.source,
+                    move.dest,
+                    buffer,
+                    expected_checksum=move.expected_checksum,
+                    io_mode=io_mode,
+                    on_chunk=pacer,
+                )
+                result = MoveResult(request=move, status="moved", checksum=checksum)
+            except (MoveError, OSError) as e:
+                logger.warning("Failed to move %s to %s: %s", move.source, move.dest, e)
+                result = MoveResult(request=move, status="failed", error=str(e))
+            finally:
+                if throttle is not None:
+                    throttle.release()
+            result.duration_ms = int((time.perf_counter() - start) * 1000)
+            
+            results[i] = result
+            if on_result is not None:
+                on_result(result)
+    
+    if by_pair:
+        limit = settings.move_concurrency if max_workers is None else max_workers
+        workers = max(1, min(limit, len(by_pair)))
+        partial_journal.begin()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mover") as pool:
+                list(pool.map(run_pair, by_pair.values()))
+        finally:
+            partial_journal.end()
+    
+    return results
+
+
+async def run_moves(
+    moves: list[MoveRequest],
+    task_id: int | None = None,
+    operation: str = "move",
+    cancel: threading.Event | None = None,
+    on_result: Callable[[MoveResult], None] | None = None,
+    max_workers: int | None = None,
+) -> list[MoveResult]:
+    """
+    Execute moves and record them.
+    
+    Every attempted move is written to the operation history as it
+    finishes, a few at a time, so a crash doesn't lose the record of files
+    already moved. Successful moves also get an undo record, unless
+    `operation` is "undo". In dry-run
+    mode no file is touched. With `throttle_enabled`, the copies share the
+    process-wide throttle, whose concurrency and bandwidth follow the
+    system pressure and quiet hours.
+    """
+    if settings.dry_run:
+        logger.info("Dry run, skipping %d moves", len(moves))
+        return [MoveResult(request=move, status="dry_run") for move in moves]
+    
+    throttle = None
+    if settings.throttle_enabled:
+        throttle = move_throttle
+        throttle.start()
+    
+    loop = asyncio.get_running_loop()
+    finished: asyncio.Queue[MoveResult | None] = asyncio.Queue()
+    
+    def collect(result: MoveResult) -> None:
+        loop.call_soon_threadsafe(finished.put_nowait, result)
+        if on_result is not None:
+            on_result(result)
+    
+    async def record() -> None:
+        done = False
+        while not done:
+            batch = [await finished.get()]
+            # Whatever else finished in the meantime goes in the same transaction
+            while not finished.empty():
+                batch.append(finished.get_nowait())
+            done = None in batch
+            await record_results([r for r in batch if r is not None], task_id, operation)
+    
+    recorder = asyncio.create_task(record())
+    try:
+        results = await asyncio.to_thread(
+            execute_moves, moves, cancel, collect, max_workers, throttle
+        )
+    finally:
+        finished.put_nowait(None)
+        await recorder
+    await refresh_paths(
+        path for r in results if r.status == "moved" for path in (r.request.source, r.request.dest)
+    )
+    return results
+
+
+async def record_results(
+    results: list[MoveResult],
+    task_id: int | None,
+    operation: str,
+) -> None:
+    """Write move results to the operation history, undo log and hash cache."""
+    attempted = [r for r in results if r.status in ("moved", "failed")]
+    moved = [r for r in attempted if r.status == "moved"]
+    if not attempted:
+        return
+    db = await get_database()
+    
+    await execute_many(
+        """
+        INSERT INTO operation_history
+            (task_id, operation, source_path, dest_path, file_size, status, duration_ms, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                task_id,
+                operation,
+                str(r.request.source),
+                str(r.request.dest),
+                r.request.size,
+                r.status,
+                r.duration_ms,
+                r.error,
+            )
+            for r in attempted
+        ],
+        db=db,
+    )
+    
+    if operation != "undo":
+        expires_at = sql_timestamp(datetime.utcnow() + timedelta(hours=settings.undo_retention_hours))
+        await execute_many(
+            """
+            INSERT INTO undo_log
+                (task_id, operation, source_path, dest_path, file_size, checksum, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    task_id,
+                    operation,
+                    str(r.request.source),
+                    str(r.request.dest),
+                    r.request.size,
+                    r.checksum,
+                    expires_at,
+                )
+                for r in moved
+            ],
+            db=db,
+        )
+    await db.commit()
+    
+    # Later verification and undo checks can then skip reading the copies
+    keys = await asyncio.to_thread(_existing_keys, [r.request.dest for r in moved])
+    await store_hashes(
+        {key: r.checksum for r, key in zip(moved, keys, strict=True) if key is not None and r.checksum},
+        settings.checksum_algorithm,
+    )
+
+
+def _existing_keys(paths: list[Path]) -> list[FileKey | None]:
+    """Get cache keys for paths, None for files that are gone or off the array."""
+    keys: list[FileKey | None] = []
+    for path in paths:
+        try:
+            keys.append(file_key(path))
+        except OSError:
+            keys.append(None)
+    return keys
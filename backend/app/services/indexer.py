@@ -0,0 +1,463 @@
+"""File indexing service."""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+
+import aiosqlite
+
+from app.models.records import DirectoryTable, FileTable
+from app.services.analytics import rebuild_usage
+from app.services.config import settings
+from app.services.database import (
+    execute,
+    execute_many,
+    fetch_all,
+    fetch_one,
+    get_index_database,
+    index_write_lock,
+    init_index_database,
+)
+from app.services.metrics import INDEX_FILES
+from app.services.snapshot import pyarrow_available, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Jobs expected to take longer than this use the "slow" thread percentage
+SLOW_JOB_SECONDS = 300
+
+
+class IndexCancelled(Exception):
+    """Raised inside a scan when the index run was cancelled."""
+
+
+@dataclass
+class DiskScan:
+    """Everything found on one disk."""
+    
+    disk_id: str
+    mount_point: Path
+    directories: DirectoryTable
+    files: FileTable
+    errors: int = 0
+    duration_seconds: float = 0.0
+
+
+@dataclass
+class IndexedDisk:
+    """Summary of a stored disk scan."""
+    
+    disk_id: str
+    file_count: int
+    total_bytes: int
+    duration_seconds: float
+    errors: int
+
+
+@dataclass
+class IndexProgress:
+    """Progress of the current or last index run."""
+    
+    is_running: bool = False
+    current_disks: list[str] = field(default_factory=list)
+    files_processed: int = 0
+    total_files_estimate: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+    
+    @property
+    def elapsed_seconds(self) -> float:
+        """Get the time spent on the current or last run."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+def discover_disks() -> dict[str, Path]:
+    """Find mounted array disks, keyed by disk ID."""
+    disks = {}
+    for mount_point in glob(settings.disk_mount_pattern):
+        match = re.search(r"disk(\d+)$", mount_point)
+        if match and os.path.isdir(mount_point):
+            disks[f"disk{match.group(1)}"] = Path(mount_point)
+    return dict(sorted(disks.items(), key=lambda item: int(item[0][4:])))
+
+
+def scan_disk(
+    disk_id: str,
+    mount_point: Path,
+    cancel: threading.Event | None = None,
+    on_progress: Callable[[str, int], None] | None = None,
+) -> DiskScan:
+    """
+    Walk one disk into compact directory and file tables.
+    
+    Symlinks are recorded as neither files nor directories. Entries that
+    can't be read are counted in `errors` and skipped.
+    
+    Raises:
+        IndexCancelled: If `cancel` is set during the walk.
+    """
+    start = time.perf_counter()
+    scan = DiskScan(
+        disk_id=disk_id,
+        mount_point=mount_point,
+        directories=DirectoryTable(),
+        files=FileTable(),
+    )
+    dirs = scan.directories
+    files = scan.files
+    
+    root_id = dirs.add("", DirectoryTable.ROOT_PARENT)
+    stack = [(root_id, str(mount_point), "")]
+    pending = 0
+    
+    while stack:
+        dir_id, abs_path, rel_path = stack.pop()
+        
+        try:
+            entries = os.scandir(abs_path)
+        except OSError:
+            scan.errors += 1
+            continue
+        
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        child_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+                        child_id = dirs.add(child_path, dir_id)
+                        stack.append((child_id, entry.path, child_path))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        files.append(
+                            dir_id,
+                            entry.name,
+                            st.st_size,
+                            st.st_mtime_ns,
+                            st.st_atime_ns,
+                            st.st_ino,
+                        )
+                        dirs.add_file(dir_id, st.st_size)
+                        pending += 1
+                except OSError:
+                    scan.errors += 1
+        
+        if pending >= settings.index_chunk_size:
+            if cancel is not None and cancel.is_set():
+                raise IndexCancelled(disk_id)
+            if on_progress is not None:
+                on_progress(disk_id, pending)
+            pending = 0
+    
+    if on_progress is not None and pending:
+        on_progress(disk_id, pending)
+    
+    dirs.rollup()
+    scan.duration_seconds = time.perf_counter() - start
+    return scan
+
+
+def index_thread_count(disk_count: int, expected_seconds: float | None) -> int:
+    """
+    Get the number of scan threads to use.
+    
+    Uses a percentage of the currently free CPU threads: the "fast" share
+    for jobs expected to finish within five minutes, the "slow" share
+    otherwise. One thread per disk is the useful maximum.
+    """
+    cpus = os.cpu_count() or 1
+    try:
+        busy = round(os.getloadavg()[0])
+    except OSError:
+        busy = 0
+    free = max(1, cpus - busy)
+    
+    slow = expected_seconds is not None and expected_seconds > SLOW_JOB_SECONDS
+    percent = settings.index_threads_slow_percent if slow else settings.index_threads_fast_percent
+    
+    return max(1, min(disk_count, free * percent // 100))
+
+
+async def store_scan(scan: DiskScan, db: aiosqlite.Connection | None = None) -> IndexedDisk:
+    """Replace a disk's rows in the index with a fresh scan."""
+    db = db or await get_index_database()
+    dirs = scan.directories
+    files = scan.files
+    
+    async with index_write_lock():
+        await execute(
+            "DELETE FROM files WHERE dir_id IN (SELECT id FROM directories WHERE disk_id = ?)",
+            (scan.disk_id,),
+            db=db,
+        )
+        await execute("DELETE FROM directories WHERE disk_id = ?", (scan.disk_id,), db=db)
+        await insert_scan(scan, db)
+        await rebuild_usage(scan.disk_id, db)
+        
+        indexed_at = datetime.utcnow().isoformat()
+        indexed = IndexedDisk(
+            disk_id=scan.disk_id,
+            file_count=len(files),
+            total_bytes=dirs.total_sizes[0] if len(dirs) else 0,
+            duration_seconds=scan.duration_seconds,
+            errors=scan.errors,
+        )
+        await execute(
+            """
+            INSERT OR REPLACE INTO indexed_disks
+                (disk_id, file_count, total_bytes, duration_seconds, indexed_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                indexed.disk_id,
+                indexed.file_count,
+                indexed.total_bytes,
+                indexed.duration_seconds,
+                indexed_at,
+            ),
+            db=db,
+        )
+        await db.commit()
+    
+    if settings.index_snapshots and pyarrow_available():
+        try:
+            await asyncio.to_thread(write_snapshot, scan.disk_id, dirs, files, indexed_at)
+        except Exception as e:
+            # Readers fall back to index.db
+            logger.warning("Writing the snapshot of %s failed: %s", scan.disk_id, e)
+    
+    return indexed
+
+
+async def insert_scan(
+    scan: DiskScan,
+    db: aiosqlite.Connection,
+    prefix: str = "",
+    parent_id: int | None = None,
+) -> None:
+    """
+    Insert the tables of a scan without committing.
+    
+    A scan of a subdirectory is stored under `prefix` (its path relative to
+    the disk root) as a child of the directory row `parent_id`.
+    """
+    dirs = scan.directories
+    files = scan.files
+    
+    def full_path(dir_id: int) -> str:
+        path = dirs.paths[dir_id]
+        if not prefix:
+            return path
+        return f"{prefix}/{path}" if path else prefix
+    
+    # Local directory IDs become database IDs by adding a base offset
+    row = await fetch_one("SELECT COALESCE(MAX(id), 0) AS max_id FROM directories", db=db)
+    base = row["max_id"] + 1 if row else 1
+    root = DirectoryTable.ROOT_PARENT
+    
+    await execute_many(
+        """
+        INSERT INTO directories (
+            id, disk_id, path, parent_id, share,
+            file_count, size_bytes, total_files, total_bytes
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                base + i,
+                scan.disk_id,
+                full_path(i),
+                base + dirs.parent_ids[i] if dirs.parent_ids[i] != root else parent_id,
+                full_path(i).split("/", 1)[0] or None,
+                dirs.file_counts[i],
+                dirs.sizes[i],
+                dirs.total_files[i],
+                dirs.total_sizes[i],
+            )
+            for i in range(len(dirs))
+        ),
+        db=db,
+    )
+    await execute_many(
+        """
+        INSERT INTO files (dir_id, name, size, mtime_ns, atime_ns, inode)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                base + files.dir_ids[i],
+                files.name(i),
+                files.sizes[i],
+                files.mtimes[i],
+                files.atimes[i],
+                files.inodes[i],
+            )
+            for i in range(len(files))
+        ),
+        db=db,
+    )
+
+
+async def get_meta(key: str) -> str | None:
+    """Get an index-wide value."""
+    db = await get_index_database()
+    row = await fetch_one("SELECT value FROM index_meta WHERE key = ?", (key,), db=db)
+    return row["value"] if row else None
+
+
+async def set_meta(values: dict[str, str]) -> None:
+    """Set index-wide values."""
+    async with index_write_lock():
+        await _write_meta(values)
+
+
+async def bump_generation(values: dict[str, str] | None = None) -> None:
+    """Increment the index generation, setting other index-wide values with it."""
+    async with index_write_lock():
+        await _write_meta({"generation": str(await get_generation() + 1), **(values or {})})
+
+
+async def _write_meta(values: dict[str, str]) -> None:
+    db = await get_index_database()
+    await execute_many(
+        "INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)",
+        list(values.items()),
+        db=db,
+    )
+    await db.commit()
+
+
+async def get_generation() -> int:
+    """
+    Get the index generation.
+    
+    Incremented whenever the index content changes, so cached results
+    derived from it can be invalidated.
+    """
+    value = await get_meta("generation")
+    return int(value) if value else 0
+
+
+async def get_indexed_disks() -> list[aiosqlite.Row]:
+    """Get the stored per-disk index summaries."""
+    db = await get_index_database()
+    return await fetch_all("SELECT * FROM indexed_disks ORDER BY disk_id", db=db)
+
+
+class Indexer:
+    """Run index jobs in the background and track their progress."""
+    
+    def __init__(self) -> None:
+        self.progress = IndexProgress()
+        self._cancel = threading.Event()
+        self._task: asyncio.Task[list[IndexedDisk]] | None = None
+    
+    @property
+    def is_running(self) -> bool:
+        """Check if an index run is in progress."""
+        return self._task is not None and not self._task.done()
+    
+    def start(self, disk_ids: list[str] | None = None) -> None:
+        """
+        Start indexing in the background.
+        
+        Raises:
+            RuntimeError: If an index run is already in progress.
+        """
+        if self.is_running:
+            raise RuntimeError("Index is already running")
+        self._task = asyncio.create_task(self.run(disk_ids))
+    
+    def cancel(self) -> bool:
+        """Request cancellation, returns False if nothing is running."""
+        if not self.is_running:
+            return False
+        self._cancel.set()
+        return True
+    
+    async def run(self, disk_ids: list[str] | None = None) -> list[IndexedDisk]:
+        """Index the given disks (all by default) and store the results."""
+        await init_index_database()
+        
+        disks = discover_disks()
+        if disk_ids is not None:
+            disks = {d: p for d, p in disks.items() if d in disk_ids}
+        
+        previous = {row["disk_id"]: row for row in await get_indexed_disks()}
+        expected = [previous[d]["duration_seconds"] for d in disks if d in previous]
+        
+        self._cancel.clear()
+        self.progress = IndexProgress(
+            is_running=True,
+            current_disks=list(disks),
+            total_files_estimate=sum(previous[d]["file_count"] for d in disks if d in previous),
+            started_at=time.time(),
+        )
+        
+        threads = index_thread_count(len(disks), max(expected) if expected else None)
+        logger.info("Indexing %d disks with %d threads", len(disks), threads)
+        
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="indexer")
+        scans = [
+            loop.run_in_executor(pool, scan_disk, disk_id, mount_point, self._cancel, self._on_progress)
+            for disk_id, mount_point in disks.items()
+        ]
+        results: list[IndexedDisk] = []
+        
+        try:
+            for next_scan in asyncio.as_completed(scans):
+                scan = await next_scan
+                results.append(await store_scan(scan))
+                self.progress.current_disks.remove(scan.disk_id)
+                logger.info(
+                    "Indexed %s: %d files in %.1fs (%d errors)",
+                    scan.disk_id,
+                    len(scan.files),
+                    scan.duration_seconds,
+                    scan.errors,
+                )
+                # Drop the tables before the next disk is stored
+                del scan
+        except IndexCancelled:
+            self.progress.error = "Cancelled"
+            logger.info("Index cancelled")
+        except Exception as e:
+            self.progress.error = str(e)
+            logger.exception("Index failed")
+            raise
+        finally:
+            # Stop scans that are still walking
+            self._cancel.set()
+            for pending in scans:
+                pending.cancel()
+            pool.shutdown(wait=False)
+            
+            self.progress.is_running = False
+            self.progress.finished_at = time.time()
+            if results:
+                await bump_generation({
+                    "last_indexed_at": datetime.utcnow().isoformat(),
+                    "duration_seconds": str(self.progress.elapsed_seconds),
+                })
+        
+        return results
+    
+    def _on_progress(self, disk_id: str, files: int) -> None:
+        """Record progress reported from a scan thread."""
+        self.progress.files_processed += files
+        INDEX_FILES.labels(disk_id).inc(files)
+
+
+indexer = Indexer()
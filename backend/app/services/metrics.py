@@ -0,0 +1,82 @@
+"""Prometheus metrics for the API, database and long-running jobs."""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets from 1ms to 30s
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "array_balancer_http_request_duration_seconds",
+    "HTTP request latency by router",
+    ["router", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "array_balancer_db_query_duration_seconds",
+    "SQLite query latency",
+    ["database", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+INDEX_FILES = Counter(
+    "array_balancer_index_files_total",
+    "Files processed by the indexer",
+    ["disk"],
+)
+
+MOVE_BYTES = Counter(
+    "array_balancer_move_bytes_total",
+    "Bytes copied by the move executor",
+    ["disk", "direction"],  # direction: "read" from source, "write" to destination
+)
+
+CHECKSUM_BYTES = Counter(
+    "array_balancer_checksum_bytes_total",
+    "Bytes hashed for checksum verification",
+    ["algorithm"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "array_balancer_queue_tasks",
+    "Tasks in the queue by status",
+    ["status"],
+)
+
+THROTTLE_CONCURRENCY = Gauge(
+    "array_balancer_throttle_concurrency",
+    "Files the move executor may copy at once",
+)
+
+THROTTLE_BANDWIDTH = Gauge(
+    "array_balancer_throttle_bandwidth_bytes",
+    "Bandwidth limit per move in bytes per second, 0 when unlimited",
+)
+
+THROTTLE_PRESSURE = Gauge(
+    "array_balancer_throttle_pressure_percent",
+    "Share of time tasks stalled on a resource (Linux PSI) in the last interval",
+    ["resource"],
+)
+
+MOVER_PAUSES = Counter(
+    "array_balancer_mover_pauses_total",
+    "Times a move worker paused because the unRAID mover was running",
+)
+
+
+@contextmanager
+def observe_query(database: str, sql: str) -> Iterator[None]:
+    """Time a database query, labelled by its leading SQL keyword."""
+    operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "UNKNOWN"
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_LATENCY.labels(database, operation).observe(time.perf_counter() - start)
@@ -0,0 +1,25 @@
+"""Detect the unRAID mover, which moves files between the cache pool and the array.
+
+Moves of our own while it runs would compete for the same disks and may
+race it for the same files, so the executor waits for it to finish.
+"""
+
+from pathlib import Path
+
+from app.services.config import settings
+
+
+def mover_running() -> bool:
+    """
+    Check if the unRAID mover is running, from its pid file.
+    
+    A pid file whose process is gone was left behind by a crash and is
+    ignored. One that can't be read counts as running.
+    """
+    try:
+        pid = int(settings.mover_pid_path.read_text().strip())
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return True
+    return Path(f"/proc/{pid}").exists()
@@ -1,13 +1,24 @@
 """Permission checking service for verifying access rights."""
 
+import asyncio
+import contextlib
+import hashlib
+import logging
 import os
+import shutil
 from dataclasses import dataclass, field
+from datetime import datetime
+from fnmatch import fnmatch
 from glob import glob
 from pathlib import Path
 from typing import Literal
 
 from app.services.config import settings
 
+logger = logging.getLogger(__name__)
+
+MOUNTS_PATH = Path("/proc/self/mounts")
+
 
 @dataclass
 class PermissionCheck:
@@ -27,6 +38,8 @@ class PermissionReport:
     running_as_uid: int
     running_as_gid: int
     checks: list[PermissionCheck] = field(default_factory=list)
+    disks: list[str] = field(default_factory=list)
+    checked_at: datetime = field(default_factory=datetime.utcnow)
     
     @property
     def passed_checks(self) -> list[PermissionCheck]:
@@ -53,29 +66,123 @@ class PermissionReport:
     def all_passed(self) -> bool:
         """Check if all checks passed."""
         return len(self.failed_checks) == 0
+    
+    def get_check(self, name: str) -> PermissionCheck | None:
+        """Get a check by name."""
+        return next((c for c in self.checks if c.name == name), None)
+
+
+@dataclass
+class PermissionChange:
+    """A single check whose outcome changed between two reports."""
+    
+    name: str
+    old_status: Literal["ok", "warning", "error"] | None
+    new_status: Literal["ok", "warning", "error"] | None
+    error: str | None = None
+
+
+@dataclass
+class PermissionDiff:
+    """Difference between two permission reports."""
+    
+    disks_added: list[str] = field(default_factory=list)
+    disks_removed: list[str] = field(default_factory=list)
+    changes: list[PermissionChange] = field(default_factory=list)
+    
+    @property
+    def has_changes(self) -> bool:
+        """Check if anything changed."""
+        return bool(self.disks_added or self.disks_removed or self.changes)
+
+
+def diff_reports(old: PermissionReport | None, new: PermissionReport) -> PermissionDiff:
+    """Compare two reports, including per-disk details of each check."""
+    old_disks = set(old.disks) if old else set()
+    diff = PermissionDiff(
+        disks_added=sorted(set(new.disks) - old_disks),
+        disks_removed=sorted(old_disks - set(new.disks)),
+    )
+    
+    old_checks = {c.name: c for c in old.checks} if old else {}
+    new_checks = {c.name: c for c in new.checks}
+    
+    for name in sorted(old_checks.keys() | new_checks.keys()):
+        before = old_checks.get(name)
+        after = new_checks.get(name)
+        if (
+            before is not None
+            and after is not None
+            and before.status == after.status
+            and before.details == after.details
+        ):
+            continue
+        diff.changes.append(PermissionChange(
+            name=name,
+            old_status=before.status if before else None,
+            new_status=after.status if after else None,
+            error=after.error if after else None,
+        ))
+    
+    return diff
+
+
+def read_mount_options(mounts_path: Path = MOUNTS_PATH) -> dict[str, list[str]]:
+    """Get mount options for every mount point matching the disk pattern."""
+    options: dict[str, list[str]] = {}
+    try:
+        with open(mounts_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 4 and fnmatch(parts[1], settings.disk_mount_pattern):
+                    options[parts[1]] = parts[3].split(",")
+    except OSError:
+        pass
+    return options
+
+
+def mount_fingerprint(mounts_path: Path = MOUNTS_PATH) -> str:
+    """
+    Get a cheap fingerprint of the array mounts.
+    
+    Only lines for mount points matching the disk pattern are hashed, so
+    unrelated mount churn (other containers, overlays) doesn't trigger a
+    re-check.
+    """
+    digest = hashlib.sha1()
+    for mount_point, opts in sorted(read_mount_options(mounts_path).items()):
+        digest.update(f"{mount_point} {','.join(opts)}\n".encode())
+    return digest.hexdigest()
 
 
 class PermissionChecker:
     """Check permissions for all required operations."""
     
     async def check_all(self) -> PermissionReport:
-        """Run all permission checks and return a report."""
+        """Run all permission checks concurrently and return a report."""
         report = PermissionReport(
             running_as_uid=os.getuid(),
             running_as_gid=os.getgid(),
         )
         
-        # Run all checks
-        report.checks.append(await self._check_disk_read())
-        report.checks.append(await self._check_disk_write())
-        report.checks.append(await self._check_config_read())
-        report.checks.append(await self._check_appdata_write())
-        report.checks.append(await self._check_mover_status())
-        report.checks.append(await self._check_rsync())
+        # Glob once and share the result between the disk checks
+        disks = sorted(glob(settings.disk_mount_pattern))
+        report.disks = disks
+        
+        # The checks only stat/access paths, so run them in worker threads
+        checks = await asyncio.gather(
+            asyncio.to_thread(self._check_disk_read, disks),
+            asyncio.to_thread(self._check_disk_write, disks),
+            asyncio.to_thread(self._check_config_read),
+            asyncio.to_thread(self._check_appdata_write),
+            asyncio.to_thread(self._check_mover_status),
+            asyncio.to_thread(self._check_rsync),
+        )
+        report.checks.extend(checks)
         
         return report
     
-    async def _check_disk_read(self) -> PermissionCheck:
+    def _check_disk_read(self, disks: list[str]) -> PermissionCheck:
         """Check read access to all mounted disks."""
         check = PermissionCheck(
             name="disk_read",
@@ -83,7 +190,6 @@ class PermissionChecker:
             status="ok",
         )
         
-        disks = glob(settings.disk_mount_pattern)
         if not disks:
             check.status = "warning"
             check.error = "No disks found matching pattern"
@@ -104,7 +210,7 @@ class PermissionChecker:
         
         return check
     
-    async def _check_disk_write(self) -> PermissionCheck:
+    def _check_disk_write(self, disks: list[str]) -> PermissionCheck:
         """Check write access to all mounted disks."""
         check = PermissionCheck(
             name="disk_write",
@@ -112,28 +218,31 @@ class PermissionChecker:
             status="ok",
         )
         
-        disks = glob(settings.disk_mount_pattern)
         if not disks:
             check.status = "warning"
             check.error = "No disks found"
             return check
         
+        mount_options = read_mount_options()
+        
         unwritable = []
         for disk in disks:
-            if not os.access(disk, os.W_OK):
+            if "ro" in mount_options.get(disk, []):
+                unwritable.append(disk)
+                check.details[disk] = "read-only mount"
+            elif not os.access(disk, os.W_OK):
                 unwritable.append(disk)
+                check.details[disk] = "NOT writable"
             else:
                 check.details[disk] = "writable"
         
         if unwritable:
             check.status = "error"
             check.error = f"Cannot write: {', '.join(unwritable)}"
-            for disk in unwritable:
-                check.details[disk] = "NOT writable"
         
         return check
     
-    async def _check_config_read(self) -> PermissionCheck:
+    def _check_config_read(self) -> PermissionCheck:
         """Check read access to share configuration."""
         check = PermissionCheck(
             name="config_read",
@@ -156,7 +265,7 @@ class PermissionChecker:
         check.details["path"] = str(config_path)
         return check
     
-    async def _check_appdata_write(self) -> PermissionCheck:
+    def _check_appdata_write(self) -> PermissionCheck:
         """Check write access to app data directory."""
         check = PermissionCheck(
             name="appdata_write",
@@ -192,7 +301,7 @@ class PermissionChecker:
         check.details["path"] = str(data_dir)
         return check
     
-    async def _check_mover_status(self) -> PermissionCheck:
+    def _check_mover_status(self) -> PermissionCheck:
         """Check ability to read mover status."""
         check = PermissionCheck(
             name="mover_status",
@@ -210,7 +319,7 @@ class PermissionChecker:
         check.details["path"] = str(settings.mover_pid_path)
         return check
     
-    async def _check_rsync(self) -> PermissionCheck:
+    def _check_rsync(self) -> PermissionCheck:
         """Check if rsync is available."""
         check = PermissionCheck(
             name="rsync",
@@ -218,8 +327,6 @@ class PermissionChecker:
             status="ok",
         )
         
-        import shutil
-        
         rsync_path = shutil.which("rsync")
         if rsync_path is None:
             check.status = "error"
@@ -267,3 +374,106 @@ class PermissionChecker:
             check.error = "; ".join(errors)
         
         return check
+
+
+class PermissionMonitor:
+    """
+    Keep the permission report current while the app is running.
+    
+    The mount table is polled cheaply and the full check only re-runs when
+    the array mounts change or the re-check interval elapses, so disks
+    added or remounted read-only are noticed without a restart.
+    """
+    
+    def __init__(
+        self,
+        checker: PermissionChecker | None = None,
+        recheck_interval: float | None = None,
+        mount_poll_interval: float | None = None,
+    ) -> None:
+        self.checker = checker or PermissionChecker()
+        self.recheck_interval = (
+            recheck_interval
+            if recheck_interval is not None
+            else settings.permission_recheck_interval_seconds
+        )
+        self.mount_poll_interval = (
+            mount_poll_interval
+            if mount_poll_interval is not None
+            else settings.mount_poll_interval_seconds
+        )
+        self.report: PermissionReport | None = None
+        self.last_diff: PermissionDiff | None = None
+        self._fingerprint: str | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+    
+    async def refresh(self) -> PermissionDiff:
+        """Re-run all checks and diff against the previous report."""
+        async with self._lock:
+            fingerprint = await asyncio.to_thread(mount_fingerprint)
+            report = await self.checker.check_all()
+            diff = diff_reports(self.report, report)
+            
+            if self.report is not None and diff.has_changes:
+                self._log_diff(diff)
+                self.last_diff = diff
+            
+            self.report = report
+            self._fingerprint = fingerprint
+            return diff
+    
+    async def start(self) -> None:
+        """Run the initial check and start the background monitor."""
+        if self.report is None:
+            await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the background monitor."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+    
+    async def _run(self) -> None:
+        """Poll the mount table and re-check on change or schedule."""
+        loop = asyncio.get_running_loop()
+        last_check = loop.time()
+        
+        while True:
+            await asyncio.sleep(self.mount_poll_interval)
+            
+            try:
+                fingerprint = await asyncio.to_thread(mount_fingerprint)
+                due = loop.time() - last_check >= self.recheck_interval
+                
+                if fingerprint != self._fingerprint or due:
+                    if fingerprint != self._fingerprint:
+                        logger.info("Array mounts changed, re-checking permissions")
+                    await self.refresh()
+                    last_check = loop.time()
+            except Exception:
+                logger.exception("Permission re-check failed")
+    
+    @staticmethod
+    def _log_diff(diff: PermissionDiff) -> None:
+        """Log what changed since the last report."""
+        for disk in diff.disks_added:
+            logger.info("Disk appeared: %s", disk)
+        for disk in diff.disks_removed:
+            logger.warning("Disk disappeared: %s", disk)
+        for change in diff.changes:
+            log = logger.warning if change.new_status == "error" else logger.info
+            log(
+                "Permission check %s: %s -> %s%s",
+                change.name,
+                change.old_status,
+                change.new_status,
+                f" ({change.error})" if change.error else "",
+            )
+
+
+permission_monitor = PermissionMonitor()
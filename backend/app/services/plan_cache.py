@@ -0,0 +1,235 @@
+"""Cache balance plans and re-plan incrementally.
+
+Plans are stored in state.db under a key made of the index generation,
+the targets, the tolerance, the cost model, the share settings, the
+placement and a coarse fill level of each disk. An identical request is answered from
+the cache. Otherwise the most recent cached plan is used as a warm
+start: its moves whose files are still indexed are kept while they fit
+the new targets, and the index is only read for disks that still need
+moves. Nudging one target therefore re-plans only the disks it affects.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import asdict
+
+from app.services.balancer import (
+    NS_PER_DAY,
+    DiskState,
+    MoveCost,
+    Placement,
+    Plan,
+    PlannedMove,
+    equal_fill_targets,
+    generate_plan,
+)
+from app.services.database import (
+    execute,
+    fetch_all,
+    fetch_one,
+    get_database,
+    get_index_database,
+)
+from app.services.indexer import get_generation
+from app.services.shares import ShareConfig
+
+logger = logging.getLogger(__name__)
+
+# Cached plans kept, older ones are deleted
+PLAN_CACHE_ENTRIES = 20
+# Disk usage is part of the key at this granularity, finer changes reuse the plan
+USAGE_GRANULARITY_BYTES = 1024 * 1024 * 1024
+# Moves checked against the index per query, 3 parameters each
+_EXISTS_BATCH = 300
+
+
+def plan_key(
+    generation: int,
+    disks: dict[str, DiskState],
+    targets: dict[str, float],
+    cost: MoveCost,
+    tolerance_percent: float,
+    shares: dict[str, ShareConfig] | None = None,
+    placement: Placement | None = None,
+) -> str:
+    """Get the cache key of a planning request."""
+    payload = {
+        "shares": None if shares is None else {name: asdict(c) for name, c in shares.items()},
+        # Units turn hot or cold by the day
+        "placement": None if placement is None else {
+            "tiers": placement.tiers,
+            "hot_since": placement.hot_since_ns // NS_PER_DAY,
+            "cold_before": placement.cold_before_ns // NS_PER_DAY,
+        },
+        "generation": generation,
+        "targets": {d: round(t, 3) for d, t in sorted(targets.items())},
+        "usage": {d: disk.used_bytes // USAGE_GRANULARITY_BYTES for d, disk in disks.items()},
+        "tolerance": round(tolerance_percent, 3),
+        "cost": asdict(cost),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def get_plan(
+    disks: dict[str, DiskState],
+    targets: dict[str, float] | None = None,
+    cost: MoveCost | None = None,
+    tolerance_percent: float = 0.0,
+    shares: dict[str, ShareConfig] | None = None,
+    placement: Placement | None = None,
+) -> Plan:
+    """
+    Get a plan from the cache, re-planning from the latest one on a miss.
+    
+    Plans of whole directories (with `shares`) and of single files are
+    never used as warm starts for each other, nor are balance and hot/cold
+    plans.
+    """
+    cost = cost or MoveCost()
+    full_targets = {**equal_fill_targets(disks), **(targets or {})}
+    generation = await get_generation()
+    key = plan_key(generation, disks, full_targets, cost, tolerance_percent, shares, placement)
+    granularity = "file" if shares is None else "unit"
+    if placement is not None:
+        granularity += ":hot_cold"
+    
+    row = await fetch_one("SELECT * FROM plan_cache WHERE key = ?", (key,))
+    if row is not None:
+        plan = Plan(
+            disks=disks,
+            targets=full_targets,
+            moves=_decode_moves(row["moves"]),
+            tolerance_percent=tolerance_percent,
+            cost_seconds=row["cost_seconds"],
+            origin="cache",
+            placement="balance" if placement is None else "hot_cold",
+        )
+        db = await get_database()
+        await execute("UPDATE plan_cache SET used_at = ? WHERE key = ?", (time.time_ns(), key), db=db)
+        await db.commit()
+        return plan
+    
+    warm_start = None
+    latest = await fetch_one(
+        "SELECT * FROM plan_cache WHERE granularity = ? ORDER BY used_at DESC LIMIT 1",
+        (granularity,),
+    )
+    if latest is not None:
+        warm_start = _decode_moves(latest["moves"])
+        if latest["generation"] != generation:
+            warm_start = await still_indexed(warm_start)
+    
+    plan = await generate_plan(
+        disks, full_targets, cost, tolerance_percent, warm_start, shares, placement
+    )
+    plan.origin = "full" if warm_start is None else "warm"
+    await store_plan(key, generation, granularity, plan)
+    return plan
+
+
+async def still_indexed(moves: list[PlannedMove]) -> list[PlannedMove]:
+    """Drop moves whose file or directory is no longer indexed with the same size."""
+    db = await get_index_database()
+    by_disk: dict[str, list[PlannedMove]] = defaultdict(list)
+    dirs_by_disk: dict[str, list[PlannedMove]] = defaultdict(list)
+    for move in moves:
+        (dirs_by_disk if move.is_dir else by_disk)[move.source_disk].append(move)
+    
+    found: set[tuple[str, str]] = set()
+    for disk_id, disk_moves in dirs_by_disk.items():
+        for i in range(0, len(disk_moves), _EXISTS_BATCH):
+            batch = disk_moves[i : i + _EXISTS_BATCH]
+            rows = await fetch_all(
+                f"""
+                SELECT path FROM directories
+                WHERE disk_id = ? AND (path, total_bytes) IN (
+                    VALUES {", ".join("(?, ?)" for _ in batch)}
+                )
+                """,
+                (disk_id, *(value for move in batch for value in (move.path, move.size))),
+                db=db,
+            )
+            found.update((disk_id, row["path"]) for row in rows)
+    
+    for disk_id, disk_moves in by_disk.items():
+        for i in range(0, len(disk_moves), _EXISTS_BATCH):
+            batch = disk_moves[i : i + _EXISTS_BATCH]
+            rows = await fetch_all(
+                f"""
+                SELECT d.path AS dir_path, f.name
+                FROM files f
+                JOIN directories d ON d.id = f.dir_id
+                WHERE d.disk_id = ? AND (d.path, f.name, f.size) IN (
+                    VALUES {", ".join("(?, ?, ?)" for _ in batch)}
+                )
+                """,
+                (
+                    disk_id,
+                    *(
+                        value
+                        for move in batch
+                        for value in (move.dir_path, move.path.rpartition("/")[2], move.size)
+                    ),
+                ),
+                db=db,
+            )
+            found.update(
+                (disk_id, f"{row['dir_path']}/{row['name']}" if row["dir_path"] else row["name"])
+                for row in rows
+            )
+    
+    kept = [move for move in moves if (move.source_disk, move.path) in found]
+    if len(kept) < len(moves):
+        logger.info("Dropped %d cached moves no longer in the index", len(moves) - len(kept))
+    return kept
+
+
+async def store_plan(key: str, generation: int, granularity: str, plan: Plan) -> None:
+    """Save a plan and drop the least recently used ones beyond the limit."""
+    db = await get_database()
+    await execute(
+        """
+        INSERT OR REPLACE INTO plan_cache
+            (key, generation, granularity, tolerance_percent, cost_seconds, moves, used_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            key,
+            generation,
+            granularity,
+            plan.tolerance_percent,
+            plan.cost_seconds,
+            _encode_moves(plan.moves),
+            time.time_ns(),
+        ),
+        db=db,
+    )
+    await execute(
+        """
+        DELETE FROM plan_cache WHERE key NOT IN (
+            SELECT key FROM plan_cache ORDER BY used_at DESC LIMIT ?
+        )
+        """,
+        (PLAN_CACHE_ENTRIES,),
+        db=db,
+    )
+    await db.commit()
+
+
+def _encode_moves(moves: list[PlannedMove]) -> str:
+    """Serialize moves compactly, as rows of values."""
+    return json.dumps(
+        [
+            [m.source_disk, m.dest_disk, m.path, m.size, m.file_count, m.splits, m.is_dir]
+            for m in moves
+        ],
+        separators=(",", ":"),
+    )
+
+
+def _decode_moves(data: str) -> list[PlannedMove]:
+    """Deserialize moves stored by `_encode_moves`."""
+    return [PlannedMove(*values) for values in json.loads(data)]
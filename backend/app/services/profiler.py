@@ -0,0 +1,189 @@
+"""In-process sampling profiler for diagnosing slow code in production."""
+
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any
+
+from app import __version__
+
+MAX_STACK_DEPTH = 128
+
+
+@dataclass(frozen=True)
+class Frame:
+    """A single function in a sampled stack."""
+    
+    name: str
+    file: str
+    line: int
+
+
+@dataclass
+class Profile:
+    """Aggregated samples from a profiling run."""
+    
+    interval: float
+    started_at: float
+    duration: float = 0.0
+    sample_count: int = 0
+    # (thread name, stack from outermost to innermost frame) -> samples
+    stacks: Counter[tuple[str, tuple[Frame, ...]]] = field(default_factory=Counter)
+    
+    def to_collapsed(self) -> str:
+        """Render as collapsed stacks, as consumed by flamegraph.pl and speedscope."""
+        lines = []
+        for (thread, stack), count in self.stacks.most_common():
+            names = ";".join(f"{f.name} ({f.file}:{f.line})" for f in stack)
+            lines.append(f"{thread};{names} {count}")
+        return "\n".join(lines) + "\n"
+    
+    def to_speedscope(self) -> dict[str, Any]:
+        """Render as a speedscope sampled profile, one profile per thread."""
+        frames: list[Frame] = []
+        frame_ids: dict[Frame, int] = {}
+        threads: dict[str, dict[str, list[Any]]] = {}
+        
+        for (thread, stack), count in self.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in frame_ids:
+                    frame_ids[frame] = len(frames)
+                    frames.append(frame)
+                sample.append(frame_ids[frame])
+            profile = threads.setdefault(thread, {"samples": [], "weights": []})
+            profile["samples"].append(sample)
+            profile["weights"].append(count * self.interval)
+        
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"array-balancer {time.strftime('%Y.%m.%d_%H:%M:%S', time.localtime(self.started_at))}",
+            "exporter": f"unraid-array-balancer {__version__}",
+            "activeProfileIndex": 0,
+            "shared": {
+                "frames": [{"name": f.name, "file": f.file, "line": f.line} for f in frames],
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(profile["weights"]),
+                    "samples": profile["samples"],
+                    "weights": profile["weights"],
+                }
+                for thread, profile in sorted(threads.items())
+            ],
+        }
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads from a background thread.
+    
+    Uses `sys._current_frames()`, so it needs no signals or tracing hooks
+    and adds no overhead to the profiled code between samples. The event
+    loop shows up as the main thread.
+    """
+    
+    def __init__(self, interval: float = 0.01, max_duration: float = 300.0) -> None:
+        self.interval = interval
+        self.max_duration = max_duration
+        self.profile = Profile(interval=interval, started_at=time.time())
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+    
+    @property
+    def is_running(self) -> bool:
+        """Check if the sampler thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> None:
+        """Start sampling in a daemon thread."""
+        self._thread = threading.Thread(
+            target=self._run,
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+    
+    def stop(self) -> Profile:
+        """Stop sampling and return the collected profile."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.profile
+    
+    def _run(self) -> None:
+        """Take samples until stopped."""
+        own_id = threading.get_ident()
+        start = time.perf_counter()
+        
+        # Stops on its own after max_duration so a forgotten run can't go on forever
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() - start >= self.max_duration:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread = names.get(thread_id, f"thread-{thread_id}")
+                self.profile.stacks[(thread, _walk_stack(frame))] += 1
+            self.profile.sample_count += 1
+        
+        self.profile.duration = time.perf_counter() - start
+
+
+def _walk_stack(frame: FrameType | None) -> tuple[Frame, ...]:
+    """Convert a frame chain to a tuple ordered from outermost to innermost."""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(Frame(code.co_qualname, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+_active: SamplingProfiler | None = None
+_lock = threading.Lock()
+
+
+def start_profiler(interval: float = 0.01, max_duration: float = 300.0) -> SamplingProfiler:
+    """
+    Start the process-wide profiler.
+    
+    Raises:
+        RuntimeError: If a profiling run is already in progress.
+    """
+    global _active
+    with _lock:
+        if _active is not None and _active.is_running:
+            raise RuntimeError("Profiler is already running")
+        _active = SamplingProfiler(interval=interval, max_duration=max_duration)
+        _active.start()
+        return _active
+
+
+def stop_profiler() -> Profile:
+    """
+    Stop the process-wide profiler and return its profile.
+    
+    Raises:
+        RuntimeError: If no profiling run is in progress.
+    """
+    global _active
+    with _lock:
+        if _active is None:
+            raise RuntimeError("Profiler is not running")
+        profiler, _active = _active, None
+    return profiler.stop()
+
+
+def get_profiler() -> SamplingProfiler | None:
+    """Get the running profiler, if any."""
+    return _active
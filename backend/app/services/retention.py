@@ -0,0 +1,267 @@
+"""History compaction, undo retention and database maintenance.
+
+Every moved file adds a row to `operation_history` and `undo_log`. Left
+alone, state.db grows by millions of rows per large rebalance and every
+query, startup and backup of /app/data slows down. This service keeps it
+bounded:
+
+- Per-file history older than `history_detail_days` is rolled into
+  per-task totals in `history_summaries`
+- Expired undo records are deleted
+- Freed pages are returned to the OS with incremental VACUUM while the
+  app is idle
+
+All deletes run in bounded batches with a commit after each, so the
+single connection is never blocked for long.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import aiosqlite
+
+from app.services.config import settings
+from app.services.database import (
+    execute,
+    fetch_one,
+    get_database,
+    get_index_database,
+    sql_timestamp,
+)
+from app.services.undo import prune_expired_undo
+
+logger = logging.getLogger(__name__)
+
+COMPACT_BATCH_SIZE = 10000
+
+
+@dataclass
+class DatabaseStats:
+    """Size of one SQLite database."""
+    
+    name: str
+    path: Path
+    size_bytes: int
+    wal_bytes: int
+    page_size: int
+    page_count: int
+    free_pages: int
+    rows: dict[str, int] = field(default_factory=dict)
+    
+    @property
+    def free_bytes(self) -> int:
+        """Get the space taken by unused pages."""
+        return self.free_pages * self.page_size
+
+
+@dataclass
+class RetentionResult:
+    """Outcome of a maintenance run."""
+    
+    history_compacted: int = 0
+    undo_pruned: int = 0
+    pages_vacuumed: int = 0
+    duration_seconds: float = 0.0
+
+
+async def compact_history(
+    older_than: datetime | None = None,
+    batch_size: int = COMPACT_BATCH_SIZE,
+) -> int:
+    """
+    Roll per-file history into per-task summaries and delete it.
+    
+    Rows are processed in ID ranges; IDs increase with `created_at`, so
+    the cutoff is found with one lookup on `idx_history_created`.
+    Returns the number of rows compacted.
+    """
+    older_than = older_than or datetime.utcnow() - timedelta(days=settings.history_detail_days)
+    db = await get_database()
+    row = await fetch_one(
+        "SELECT MIN(id) AS first_id, MAX(id) AS last_id FROM operation_history WHERE created_at < ?",
+        (sql_timestamp(older_than),),
+        db=db,
+    )
+    if row is None or row["last_id"] is None:
+        return 0
+    
+    total = 0
+    for start in range(row["first_id"], row["last_id"] + 1, batch_size):
+        end = min(start + batch_size - 1, row["last_id"])
+        await execute(
+            """
+            INSERT INTO history_summaries (
+                task_id, operation, status, file_count, total_bytes,
+                total_duration_ms, first_at, last_at
+            )
+            SELECT
+                COALESCE(task_id, 0), operation, status, COUNT(*),
+                COALESCE(SUM(file_size), 0), COALESCE(SUM(duration_ms), 0),
+                MIN(created_at), MAX(created_at)
+            FROM operation_history
+            WHERE id BETWEEN ? AND ?
+            GROUP BY COALESCE(task_id, 0), operation, status
+            ON CONFLICT (task_id, operation, status) DO UPDATE SET
+                file_count = file_count + excluded.file_count,
+                total_bytes = total_bytes + excluded.total_bytes,
+                total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+                first_at = MIN(first_at, excluded.first_at),
+                last_at = MAX(last_at, excluded.last_at)
+            """,
+            (start, end),
+            db=db,
+        )
+        total += await execute(
+            "DELETE FROM operation_history WHERE id BETWEEN ? AND ?",
+            (start, end),
+            db=db,
+        )
+        await db.commit()
+    
+    if total:
+        logger.info("Compacted %d history rows into task summaries", total)
+    return total
+
+
+async def incremental_vacuum(pages: int | None = None) -> int:
+    """Return up to `pages` free pages of state.db to the OS, returns how many were freed."""
+    pages = settings.vacuum_step_pages if pages is None else pages
+    db = await get_database()
+    before = await _pragma(db, "freelist_count")
+    await execute(f"PRAGMA incremental_vacuum({int(pages)})", db=db)
+    await db.commit()
+    return before - await _pragma(db, "freelist_count")
+
+
+async def database_stats() -> list[DatabaseStats]:
+    """Get file sizes, page usage and row counts of both databases."""
+    return [
+        await _stats("state", await get_database(), settings.database_path, (
+            "tasks",
+            "undo_log",
+            "operation_history",
+            "history_summaries",
+        )),
+        await _stats("index", await get_index_database(), settings.index_database_path, (
+            "directories",
+            "hash_cache",
+        )),
+    ]
+
+
+async def _stats(
+    name: str,
+    db: aiosqlite.Connection,
+    path: Path,
+    tables: tuple[str, ...],
+) -> DatabaseStats:
+    """Collect stats for one database."""
+    rows = {}
+    for table in tables:
+        try:
+            row = await fetch_one(f"SELECT COUNT(*) AS n FROM {table}", db=db)
+        except aiosqlite.OperationalError:
+            continue
+        rows[table] = row["n"] if row else 0
+    
+    # Counting the files table takes seconds on a large array, use the run totals
+    if name == "index":
+        row = await fetch_one("SELECT COALESCE(SUM(file_count), 0) AS n FROM indexed_disks", db=db)
+        rows["files"] = row["n"] if row else 0
+    
+    return DatabaseStats(
+        name=name,
+        path=path,
+        size_bytes=_file_size(path),
+        wal_bytes=_file_size(path.with_name(path.name + "-wal")),
+        page_size=await _pragma(db, "page_size"),
+        page_count=await _pragma(db, "page_count"),
+        free_pages=await _pragma(db, "freelist_count"),
+        rows=rows,
+    )
+
+
+async def _pragma(db: aiosqlite.Connection, name: str) -> int:
+    """Read an integer pragma."""
+    row = await fetch_one(f"PRAGMA {name}", db=db)
+    return int(row[0]) if row else 0
+
+
+def _file_size(path: Path) -> int:
+    """Get a file's size, 0 if it doesn't exist."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class RetentionService:
+    """
+    Run database maintenance periodically in the background.
+    
+    Compaction and undo pruning always run. VACUUM only runs when
+    `is_busy` reports no indexing, moves or other heavy work in progress.
+    """
+    
+    def __init__(
+        self,
+        is_busy: Callable[[], bool] | None = None,
+        interval: float | None = None,
+    ) -> None:
+        self.is_busy = is_busy or (lambda: False)
+        self.interval = interval if interval is not None else settings.retention_interval_seconds
+        self.last_result: RetentionResult | None = None
+        self.last_run_at: datetime | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+    
+    async def run_once(self, vacuum: bool | None = None) -> RetentionResult:
+        """
+        Run all maintenance steps now.
+        
+        Vacuums only when idle unless `vacuum` is given explicitly.
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            result = RetentionResult(
+                history_compacted=await compact_history(),
+                undo_pruned=await prune_expired_undo(),
+            )
+            if vacuum is None:
+                vacuum = not self.is_busy()
+            if vacuum:
+                result.pages_vacuumed = await incremental_vacuum()
+            result.duration_seconds = loop.time() - start
+            
+            self.last_result = result
+            self.last_run_at = datetime.utcnow()
+            return result
+    
+    def start(self) -> None:
+        """Start periodic maintenance."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop periodic maintenance."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+    
+    async def _run(self) -> None:
+        """Run maintenance on every interval."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Database maintenance failed")
+            await asyncio.sleep(self.interval)
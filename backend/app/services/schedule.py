@@ -0,0 +1,123 @@
+"""Order queued move tasks to keep disk spin-ups down.
+
+Waking a spun-down disk costs about ten seconds and power. Running
+queued moves in creation order interleaves disk pairs, so every disk with
+any pending move keeps spinning until the whole queue is done.
+
+Instead, queued tasks of one priority are grouped by correlation group
+(in the order the groups were created) and, within a group, into runs
+of moves between the same two disks. Runs are ordered greedily: next is
+the run that wakes the fewest disks given the ones the previous run
+used, ties going to the oldest. Each disk pair is then handled in one
+contiguous stretch and disks with no pending work are never touched, so
+they can spin down. Tasks that aren't moves wake nothing and keep their
+relative order.
+"""
+
+import json
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+
+from app.services.checksum import array_disk_id
+
+# Task types whose details name a `source` and a `destination` path
+MOVE_TASK_TYPES = ("move_file", "move_dir")
+
+
+@dataclass
+class Run:
+    """Consecutive queued tasks that use the same disks."""
+    
+    correlation_group: str | None
+    disks: frozenset[str]
+    source_disk: str | None = None
+    dest_disk: str | None = None
+    tasks: list[aiosqlite.Row] = field(default_factory=list)
+    
+    @property
+    def first_id(self) -> int:
+        return self.tasks[0]["id"]
+
+
+def task_disk_pair(
+    task_type: str,
+    details: dict[str, Any],
+) -> tuple[str | None, str | None] | None:
+    """Get the source and destination disks of a move task, None for other tasks."""
+    if task_type not in MOVE_TASK_TYPES:
+        return None
+    return (
+        array_disk_id(Path(details.get("source", ""))),
+        array_disk_id(Path(details.get("destination", ""))),
+    )
+
+
+def task_disks(row: aiosqlite.Row) -> frozenset[str]:
+    """Get the array disks a task row touches."""
+    pair = task_disk_pair(row["type"], json.loads(row["details"]))
+    return frozenset(disk for disk in pair or () if disk is not None)
+
+
+def order_tasks(
+    rows: Sequence[aiosqlite.Row],
+    active_disks: Iterable[str] = (),
+    priorities: Sequence[str] = (),
+) -> list[Run]:
+    """
+    Order queued tasks into runs.
+    
+    `rows` are in priority and creation order, `priorities` lists the
+    priority names from most to least urgent. `active_disks` are the
+    disks the running or last task used, which are still spinning.
+    """
+    rank = {name: i for i, name in enumerate(priorities)}
+    levels: dict[int, list[aiosqlite.Row]] = {}
+    for row in rows:
+        levels.setdefault(rank.get(row["priority"], len(rank)), []).append(row)
+    
+    active = frozenset(active_disks)
+    ordered: list[Run] = []
+    for level in sorted(levels):
+        groups: dict[str | None, dict[tuple, Run]] = {}
+        for row in levels[level]:
+            pair = task_disk_pair(row["type"], json.loads(row["details"]))
+            # Non-move tasks are runs of their own
+            key = ("task", row["id"]) if pair is None else ("pair", *pair)
+            group = groups.setdefault(row["correlation_group"], {})
+            run = group.get(key)
+            if run is None:
+                disks = frozenset(disk for disk in pair or () if disk is not None)
+                run = Run(row["correlation_group"], disks, *(pair or (None, None)))
+                group[key] = run
+            run.tasks.append(row)
+        
+        # Groups in creation order, runs within a group by fewest disks woken
+        for group in sorted(groups.values(), key=lambda g: min(r.first_id for r in g.values())):
+            remaining = list(group.values())
+            while remaining:
+                run = min(remaining, key=lambda r: (len(r.disks - active), r.first_id))
+                remaining.remove(run)
+                ordered.append(run)
+                if run.disks:
+                    active = run.disks
+    return ordered
+
+
+def count_spin_ups(runs: Iterable[frozenset[str]], active_disks: Iterable[str] = ()) -> int:
+    """
+    Count the disks woken when work runs in this order.
+    
+    Disks are assumed to spin down once a run no longer uses them, which
+    is what happens when the gaps are long.
+    """
+    active = frozenset(active_disks)
+    spin_ups = 0
+    for disks in runs:
+        if disks:
+            spin_ups += len(disks - active)
+            active = disks
+    return spin_ups
@@ -0,0 +1,88 @@
+"""Read unRAID share settings from /config/shares.
+
+Each share has a `<name>.cfg` file of `key="value"` lines. The balancer
+needs the split level, which says how deep directories of a share may be
+spread over disks, and the included and excluded disks.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.services.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Depth below the disk root of the top level directories of a share
+TOP_LEVEL_DEPTH = 2
+
+
+@dataclass
+class ShareConfig:
+    """Placement settings of a user share."""
+    
+    name: str
+    # Directories deeper than this stay on one disk, 0 is "manual", None unset
+    split_level: int | None = None
+    include_disks: list[str] = field(default_factory=list)
+    exclude_disks: list[str] = field(default_factory=list)
+    allocator: str | None = None
+    
+    @property
+    def unit_depth(self) -> int:
+        """
+        Get the depth below the disk root of the directories moved as a whole.
+        
+        The share directory itself is depth 1, so split level 1 keeps each
+        top level directory of the share (a movie, a show) together. So do
+        shares without a split level and with split level 0 ("manual", where
+        unRAID never splits directories itself), rather than the whole share.
+        """
+        return self.split_level + 1 if self.split_level else TOP_LEVEL_DEPTH
+    
+    def allows_disk(self, disk_id: str) -> bool:
+        """Check if the share may be placed on a disk."""
+        if self.include_disks and disk_id not in self.include_disks:
+            return False
+        return disk_id not in self.exclude_disks
+
+
+def parse_share_config(name: str, text: str) -> ShareConfig:
+    """Parse the contents of a share's .cfg file."""
+    values = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            values[key.strip()] = value.strip().strip('"')
+    
+    split_level = values.get("shareSplitLevel", "")
+    return ShareConfig(
+        name=name,
+        split_level=int(split_level) if split_level.isdigit() else None,
+        include_disks=_disk_list(values.get("shareInclude", "")),
+        exclude_disks=_disk_list(values.get("shareExclude", "")),
+        allocator=values.get("shareAllocator") or None,
+    )
+
+
+def load_share_configs(path: Path | None = None) -> dict[str, ShareConfig]:
+    """Read all share configs, an empty dict if the directory is missing."""
+    path = path or settings.share_config_path
+    shares = {}
+    try:
+        config_files = sorted(path.glob("*.cfg"))
+    except OSError as e:
+        logger.warning("Can't read share configs in %s: %s", path, e)
+        return shares
+    
+    for config_file in config_files:
+        try:
+            shares[config_file.stem] = parse_share_config(config_file.stem, config_file.read_text())
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("Skipping share config %s: %s", config_file, e)
+    return shares
+
+
+def _disk_list(value: str) -> list[str]:
+    """Split a comma separated list of disk names."""
+    return [disk.strip() for disk in value.split(",") if disk.strip()]
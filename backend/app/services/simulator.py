@@ -0,0 +1,256 @@
+"""Predict how long a plan takes before running it.
+
+The executor runs one worker per disk pair, so the simulation does the
+same: pairs are started in order until the concurrency limit is reached,
+and each runs its moves one after another. While files are in flight,
+bandwidth is shared: a disk read or written by several workers splits its
+throughput between them, and every write also goes through the parity
+disk, which is shared by all workers. Each file also pays a fixed
+overhead (open, fsync, verify, delete, database writes).
+"""
+
+import logging
+import statistics
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from app.services.balancer import MoveCost, Placement, Plan, moves_by_pair
+from app.services.calibration import get_calibrated_throughput
+from app.services.checksum import array_disk_id
+from app.services.config import settings
+from app.services.database import fetch_all
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Used for disks without measurements
+DEFAULT_READ_BPS = 150 * MB
+DEFAULT_WRITE_BPS = 120 * MB
+# unRAID's read/modify/write parity mode roughly halves write speed
+DEFAULT_PARITY_BPS = 70 * MB
+DEFAULT_FILE_OVERHEAD = 0.05
+
+# Files below this size measure overhead, above it throughput
+SMALL_FILE_BYTES = 1 * MB
+LARGE_FILE_BYTES = 64 * MB
+
+
+@dataclass
+class ThroughputModel:
+    """Measured or assumed speeds used by the simulation."""
+    
+    read_bps: dict[str, float] = field(default_factory=dict)
+    write_bps: dict[str, float] = field(default_factory=dict)
+    parity_bps: float = DEFAULT_PARITY_BPS
+    file_overhead_seconds: float = DEFAULT_FILE_OVERHEAD
+    
+    def read(self, disk_id: str) -> float:
+        """Get a disk's sequential read speed."""
+        return self.read_bps.get(disk_id, DEFAULT_READ_BPS)
+    
+    def write(self, disk_id: str) -> float:
+        """Get a disk's sequential write speed."""
+        return self.write_bps.get(disk_id, DEFAULT_WRITE_BPS)
+    
+    def move_cost(self) -> MoveCost:
+        """Get the planner's cost model for these speeds."""
+        return MoveCost(
+            bytes_per_second=self.parity_bps,
+            read_bps=dict(self.read_bps),
+            write_bps=dict(self.write_bps),
+            file_overhead_seconds=self.file_overhead_seconds,
+            split_penalty_seconds=settings.plan_split_penalty_seconds,
+            max_overhead_ratio=settings.plan_max_overhead_ratio,
+        )
+    
+    def placement(self, now: float | None = None) -> Placement:
+        """
+        Get the hot/cold placement for the measured read speeds.
+        
+        Reads are what streaming waits for. Disks without measurements
+        get no tier, and speeds from the move history are bounded by
+        parity, so calibrate the disks for a meaningful split.
+        """
+        return Placement.from_speeds(
+            self.read_bps,
+            settings.placement_hot_days,
+            settings.placement_cold_days,
+            now,
+        )
+
+
+@dataclass
+class SimulationResult:
+    """Predicted run of a plan at one concurrency level."""
+    
+    concurrency: int
+    total_seconds: float
+    disk_busy_seconds: dict[str, float]
+    parity_busy_seconds: float
+    bottleneck: str  # "parity" or the disk ID that limited transfers the longest
+    total_bytes: int
+    total_files: int
+
+
+async def load_throughput_model() -> ThroughputModel:
+    """
+    Estimate speeds from calibration probes and the operation history.
+    
+    A move runs at the speed of the slowest of source, destination and
+    parity, so the fastest move seen for a disk is a lower bound for it.
+    Calibrated disks use their measured speeds instead. The per-file
+    overhead is the median duration of small files.
+    """
+    rows = await fetch_all(
+        """
+        SELECT source_path, dest_path, file_size, duration_ms
+        FROM operation_history
+        WHERE status = 'moved' AND duration_ms > 0
+            AND (file_size >= ? OR file_size < ?)
+        """,
+        (LARGE_FILE_BYTES, SMALL_FILE_BYTES),
+    )
+    
+    model = ThroughputModel()
+    small = []
+    fastest = 0.0
+    for row in rows:
+        seconds = row["duration_ms"] / 1000
+        if row["file_size"] < SMALL_FILE_BYTES:
+            small.append(seconds)
+            continue
+        rate = row["file_size"] / seconds
+        fastest = max(fastest, rate)
+        source, dest = array_disk_id(row["source_path"]), array_disk_id(row["dest_path"])
+        if source is not None:
+            model.read_bps[source] = max(model.read_bps.get(source, 0.0), rate)
+        if dest is not None:
+            model.write_bps[dest] = max(model.write_bps.get(dest, 0.0), rate)
+    
+    calibrated = await get_calibrated_throughput()
+    for disk_id, measured in calibrated.items():
+        model.read_bps[disk_id] = measured.read_bps
+        model.write_bps[disk_id] = measured.write_bps
+    
+    # Probe writes went through parity too, so the fastest one is a lower bound
+    fastest = max([fastest, *(m.write_bps for m in calibrated.values())])
+    if fastest:
+        model.parity_bps = fastest
+    if small:
+        model.file_overhead_seconds = statistics.median(small)
+    return model
+
+
+@dataclass(slots=True)
+class _Worker:
+    """A disk pair being worked on in the simulation."""
+    
+    source: str
+    dest: str
+    moves: list[tuple[int, int]]  # Remaining (size, file count), last one next
+    overhead_left: float = 0.0
+    bytes_left: float = 0.0
+    
+    def next_move(self, overhead: float) -> bool:
+        """Start the next move, returns False when the pair is done."""
+        if not self.moves:
+            return False
+        size, file_count = self.moves.pop()
+        self.bytes_left = float(size)
+        self.overhead_left = overhead * file_count
+        return True
+
+
+def simulate(plan: Plan, model: ThroughputModel, concurrency: int) -> SimulationResult:
+    """Simulate running a plan with up to `concurrency` disk pairs at once."""
+    # Largest pairs first, popped from the end
+    pending = sorted(
+        moves_by_pair(plan.moves).items(),
+        key=lambda item: sum(m.size for m in item[1]),
+    )
+    overhead = model.file_overhead_seconds
+    active: list[_Worker] = []
+    busy: dict[str, float] = defaultdict(float)
+    # Time each resource was the one limiting a transfer
+    limiting: dict[str, float] = defaultdict(float)
+    parity_busy = 0.0
+    now = 0.0
+    
+    def fill() -> None:
+        while pending and len(active) < concurrency:
+            (source, dest), moves = pending.pop()
+            worker = _Worker(source, dest, [(m.size, m.file_count) for m in reversed(moves)])
+            if worker.next_move(overhead):
+                active.append(worker)
+    
+    fill()
+    while active:
+        copying = [w for w in active if w.overhead_left <= 0]
+        readers = Counter(w.source for w in copying)
+        writers = Counter(w.dest for w in copying)
+        
+        # Each copying worker gets its share of the slowest resource it uses
+        limits: list[tuple[float, str]] = [
+            min(
+                (model.read(w.source) / readers[w.source], w.source),
+                (model.write(w.dest) / writers[w.dest], w.dest),
+                (model.parity_bps / len(copying), "parity"),
+            )
+            if w.overhead_left <= 0 else (0.0, "")
+            for w in active
+        ]
+        step = min(
+            w.overhead_left if w.overhead_left > 0 else w.bytes_left / rate
+            for w, (rate, _) in zip(active, limits, strict=True)
+        )
+        
+        now += step
+        if copying:
+            parity_busy += step
+        for disk in {w.source for w in active} | {w.dest for w in active}:
+            busy[disk] += step
+        
+        for w, (rate, resource) in zip(list(active), limits, strict=True):
+            if w.overhead_left > 0:
+                w.overhead_left -= step
+                if w.overhead_left <= 1e-9:
+                    w.overhead_left = 0.0
+                continue
+            limiting[resource] += step
+            w.bytes_left -= rate * step
+            if w.bytes_left <= 0.5 and not w.next_move(overhead):
+                active.remove(w)
+        fill()
+    
+    bottleneck = max(limiting, key=limiting.get, default="parity")
+    
+    return SimulationResult(
+        concurrency=concurrency,
+        total_seconds=now,
+        disk_busy_seconds=dict(busy),
+        parity_busy_seconds=parity_busy,
+        bottleneck=bottleneck,
+        total_bytes=plan.total_bytes,
+        total_files=plan.total_files,
+    )
+
+
+def compare_concurrency(
+    plan: Plan,
+    model: ThroughputModel,
+    levels: list[int],
+) -> tuple[list[SimulationResult], int]:
+    """
+    Simulate several concurrency levels.
+    
+    Returns all results and the recommended level: the lowest one within
+    5% of the fastest, since extra workers only add seeks and load.
+    """
+    results = [simulate(plan, model, level) for level in levels]
+    fastest = min((r.total_seconds for r in results), default=0.0)
+    recommended = min(
+        (r.concurrency for r in results if r.total_seconds <= fastest * 1.05),
+        default=1,
+    )
+    return results, recommended
@@ -0,0 +1,278 @@
+"""Columnar snapshots of the file index.
+
+index.db suits point lookups and incremental updates, but bulk readers
+(the planner, duplicate detection, offline analysis) pay for decoding
+every row through SQLite. So each index run also writes a disk's files
+to `snapshots/<disk_id>.arrow` in the data directory, an uncompressed
+Arrow IPC file. Its buffers are laid out as in memory, so readers
+memory-map the file and use the columns without copying: opening takes
+milliseconds whatever the size, and pages are read as columns are used.
+
+Columns: `dir` (path relative to the disk root, dictionary encoded),
+`name`, `size`, `mtime_ns`, `atime_ns` and `inode`. The schema metadata
+holds the format version, the disk ID and the disk's `indexed_at`. A
+snapshot is current while `indexed_disks` has the same `indexed_at`;
+changes applied by the watcher or after moves make it stale until the
+next index run or export, and readers use SQLite meanwhile.
+
+pyarrow is optional (the `snapshot` extra). Without it no snapshots are
+written and every reader uses SQLite.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.models.records import DirectoryTable, FileTable
+from app.services.config import settings
+from app.services.database import fetch_all, fetch_one, get_index_database
+
+logger = logging.getLogger(__name__)
+
+# Bump when the columns change, older snapshots are then ignored
+SNAPSHOT_VERSION = "1"
+# Rows per record batch in a snapshot, and per query when exporting from index.db
+BATCH_ROWS = 1024 * 1024
+MEDIA_TYPE = "application/vnd.apache.arrow.file"
+
+
+def pyarrow_available() -> bool:
+    """Check if pyarrow is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def snapshot_path(disk_id: str) -> Path:
+    """Get the snapshot file of a disk."""
+    return settings.data_dir / "snapshots" / f"{disk_id}.arrow"
+
+
+def write_snapshot(
+    disk_id: str,
+    directories: DirectoryTable,
+    files: FileTable,
+    indexed_at: str,
+) -> Path:
+    """
+    Write the tables of a disk scan as its snapshot, replacing the previous one.
+    
+    The typed arrays of the tables are handed to Arrow without copying.
+    
+    Raises:
+        pyarrow.ArrowInvalid: If a file name isn't valid UTF-8.
+    """
+    import pyarrow as pa
+    
+    count = len(files)
+    
+    def column(values: array, arrow_type: Any) -> Any:
+        return pa.Array.from_buffers(arrow_type, count, [None, pa.py_buffer(values)])
+    
+    names, offsets = files.name_buffers()
+    name_column = pa.Array.from_buffers(
+        pa.large_string(), count, [None, pa.py_buffer(offsets), pa.py_buffer(names)]
+    )
+    name_column.validate(full=True)
+    table = pa.table(
+        {
+            "dir": pa.DictionaryArray.from_arrays(
+                column(files.dir_ids, pa.int32()), pa.array(directories.paths, pa.string())
+            ),
+            "name": name_column,
+            "size": column(files.sizes, pa.int64()),
+            "mtime_ns": column(files.mtimes, pa.int64()),
+            "atime_ns": column(files.atimes, pa.int64()),
+            "inode": column(files.inodes, pa.uint64()),
+        },
+        metadata={"version": SNAPSHOT_VERSION, "disk_id": disk_id, "indexed_at": indexed_at},
+    )
+    
+    path = snapshot_path(disk_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    with pa.OSFile(str(partial), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=BATCH_ROWS)
+    os.replace(partial, path)
+    return path
+
+
+@dataclass
+class Snapshot:
+    """The memory-mapped snapshot of one disk's files."""
+    
+    disk_id: str
+    indexed_at: str
+    table: Any  # pyarrow.Table backed by the mapped file
+    
+    def __len__(self) -> int:
+        return self.table.num_rows
+    
+    def order_by_size(self) -> Any:
+        """
+        Get the row indices from the largest file to the smallest.
+        
+        Rows are in index order, so ties are broken like the index query
+        does: the most recently added file first.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        
+        keys = pa.table(
+            {
+                "size": self.table.column("size"),
+                "row": pa.array(range(len(self)), pa.int64()),
+            }
+        )
+        return pc.sort_indices(keys, sort_keys=[("size", "descending"), ("row", "descending")])
+    
+    def dir_file_counts(self) -> dict[str, int]:
+        """Count the files directly in each directory."""
+        import pyarrow.compute as pc
+        
+        counts = pc.value_counts(self.table.column("dir"))
+        return dict(
+            zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist(), strict=True)
+        )
+    
+    def rows(self, indices: Any) -> list[dict[str, Any]]:
+        """Materialize the given rows."""
+        return self.table.take(indices).to_pylist()
+
+
+def open_snapshot(disk_id: str) -> Snapshot | None:
+    """Map a disk's snapshot, None if there is none or pyarrow isn't installed."""
+    path = snapshot_path(disk_id)
+    if not pyarrow_available() or not path.exists():
+        return None
+    import pyarrow as pa
+    
+    try:
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.warning("Ignoring unreadable snapshot of %s: %s", disk_id, e)
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"version") != SNAPSHOT_VERSION.encode():
+        return None
+    return Snapshot(disk_id, metadata[b"indexed_at"].decode(), table)
+
+
+async def open_current(disk_id: str) -> Snapshot | None:
+    """Map a disk's snapshot if it still matches the index."""
+    snapshot = await asyncio.to_thread(open_snapshot, disk_id)
+    if snapshot is None:
+        return None
+    row = await fetch_one(
+        "SELECT indexed_at FROM indexed_disks WHERE disk_id = ?",
+        (disk_id,),
+        db=await get_index_database(),
+    )
+    return snapshot if row is not None and row["indexed_at"] == snapshot.indexed_at else None
+
+
+async def open_all_current() -> list[Snapshot] | None:
+    """Map the snapshots of all indexed disks, None unless every one is current."""
+    if not pyarrow_available():
+        return None
+    rows = await fetch_all("SELECT disk_id FROM indexed_disks", db=await get_index_database())
+    snapshots = [await open_current(row["disk_id"]) for row in rows]
+    if not snapshots or any(s is None for s in snapshots):
+        return None
+    return snapshots
+
+
+def same_size_rows(snapshots: list[Snapshot], min_size: int) -> list[dict[str, Any]]:
+    """
+    Get the files of at least `min_size` bytes that share their size with another file.
+    
+    Rows have the disk ID, `dir_path`, name, size, inode and mtime_ns,
+    ordered by size.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    sizes = pa.chunked_array(
+        [chunk for s in snapshots for chunk in s.table.column("size").chunks], pa.int64()
+    )
+    counts = pc.value_counts(pc.filter(sizes, pc.greater_equal(sizes, min_size)))
+    shared = pc.filter(counts.field("values"), pc.greater(counts.field("counts"), 1))
+    
+    rows = []
+    for snapshot in snapshots:
+        table = snapshot.table
+        matches = table.filter(pc.is_in(table.column("size"), value_set=shared))
+        rows.extend(
+            {"disk_id": snapshot.disk_id, "dir_path": row.pop("dir"), **row}
+            for row in matches.select(["dir", "name", "size", "inode", "mtime_ns"]).to_pylist()
+        )
+    rows.sort(key=lambda row: row["size"])
+    return rows
+
+
+async def load_tables(disk_id: str) -> tuple[DirectoryTable, FileTable]:
+    """Read a disk's files from index.db into scan tables."""
+    db = await get_index_database()
+    directories = DirectoryTable()
+    local_ids = {
+        row["id"]: directories.add(row["path"], DirectoryTable.ROOT_PARENT)
+        for row in await fetch_all(
+            "SELECT id, path FROM directories WHERE disk_id = ? ORDER BY id", (disk_id,), db=db
+        )
+    }
+    
+    files = FileTable()
+    last = 0
+    while True:
+        rows = await fetch_all(
+            """
+            SELECT id, dir_id, name, size, mtime_ns, atime_ns, inode
+            FROM files
+            WHERE dir_id IN (SELECT id FROM directories WHERE disk_id = ?) AND id > ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (disk_id, last, BATCH_ROWS),
+            db=db,
+        )
+        for row in rows:
+            files.append(
+                local_ids[row["dir_id"]],
+                row["name"],
+                row["size"],
+                row["mtime_ns"],
+                row["atime_ns"],
+                row["inode"],
+            )
+        if len(rows) < BATCH_ROWS:
+            return directories, files
+        last = rows[-1]["id"]
+
+
+async def export_snapshot(disk_id: str) -> Path | None:
+    """
+    Get a current snapshot file of a disk, writing it from index.db if stale.
+    
+    Returns None if the disk isn't indexed.
+    
+    Raises:
+        RuntimeError: If pyarrow isn't installed.
+    """
+    if not pyarrow_available():
+        raise RuntimeError("Snapshots need pyarrow, install the snapshot extra")
+    if await open_current(disk_id) is not None:
+        return snapshot_path(disk_id)
+    # Read before the rows: changes in between leave the snapshot stale, not wrong
+    row = await fetch_one(
+        "SELECT indexed_at FROM indexed_disks WHERE disk_id = ?",
+        (disk_id,),
+        db=await get_index_database(),
+    )
+    if row is None:
+        return None
+    directories, files = await load_tables(disk_id)
+    return await asyncio.to_thread(write_snapshot, disk_id, directories, files, row["indexed_at"])
@@ -0,0 +1,512 @@
+"""Persistent task queue.
+
+Tasks live in the `tasks` table of state.db, so they survive restarts.
+Tasks are picked by priority and then in the order of
+`schedule.order_tasks`, which keeps moves between the same disks
+together; tasks whose `depends_on` tasks haven't completed wait. The
+order is computed once and kept until tasks are added or cancelled, so
+draining a long queue doesn't re-order it for every task. Up to
+`MOVE_CONCURRENCY` move tasks run at once, each on disks no other running
+task uses; any other task runs alone. Each task type has
+a handler coroutine that receives a `TaskContext` with the task details
+and a cancellation event, and returns a result dict that is stored in the
+task details under "result".
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+
+from app.services.calibration import calibrate_disks
+from app.services.config import settings
+from app.services.database import execute, fetch_all, fetch_one, get_database
+from app.services.executor import (
+    MoveRequest,
+    MoveResult,
+    remove_empty_dirs,
+    run_moves,
+    unit_requests,
+)
+from app.services.schedule import MOVE_TASK_TYPES, Run, order_tasks, task_disks
+from app.services.undo import undo_correlation_group, undo_task
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("urgent", "high", "normal", "low")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+# Queued tasks considered when ordering, the rest wait for a later pass
+SCHEDULE_WINDOW = 5000
+# ORDER BY expression ranking tasks by priority
+_PRIORITY_ORDER = "CASE priority " + " ".join(
+    f"WHEN '{name}' THEN {rank}" for rank, name in enumerate(PRIORITIES)
+) + " END"
+
+
+class TaskCancelled(Exception):
+    """Raised by a handler to stop at a safe point."""
+
+
+@dataclass
+class TaskContext:
+    """What a task handler gets to work with."""
+    
+    task_id: int
+    details: dict[str, Any]
+    correlation_group: str | None
+    cancel: threading.Event
+    progress_percent: float = 0.0
+    
+    def check_cancelled(self) -> None:
+        """Raise TaskCancelled if cancellation was requested."""
+        if self.cancel.is_set():
+            raise TaskCancelled()
+
+
+TaskHandler = Callable[[TaskContext], Awaitable[dict[str, Any] | None]]
+
+
+@dataclass
+class _Schedule:
+    """The ordered window of queued tasks, with started tasks removed."""
+    
+    max_id: int  # Newest task when ordered, tasks added since invalidate it
+    runs: list[Run]
+    depends_on: dict[int, set[int]]
+
+
+class TaskQueue:
+    """Run queued tasks in the background."""
+    
+    def __init__(self, poll_interval: float = 1.0) -> None:
+        self.poll_interval = poll_interval
+        self._handlers: dict[str, TaskHandler] = {}
+        self._running: dict[int, TaskContext] = {}
+        # Correlation group (None for all) -> ordered queue
+        self._schedules: dict[str | None, _Schedule] = {}
+        self._task: asyncio.Task[None] | None = None
+        # Disks the running or last move task used, likely still spinning
+        self.active_disks: frozenset[str] = frozenset()
+    
+    def register(self, task_type: str, handler: TaskHandler) -> None:
+        """Register the handler for a task type."""
+        self._handlers[task_type] = handler
+    
+    @property
+    def task_types(self) -> list[str]:
+        """Get the task types that can be queued."""
+        return sorted(self._handlers)
+    
+    @property
+    def is_running(self) -> bool:
+        """Check if any task is running."""
+        return bool(self._running)
+    
+    def progress(self, task_id: int) -> float | None:
+        """Get the progress of a task if it is running."""
+        context = self._running.get(task_id)
+        return context.progress_percent if context is not None else None
+    
+    async def create(
+        self,
+        task_type: str,
+        details: dict[str, Any] | None = None,
+        priority: str = "normal",
+        correlation_group: str | None = None,
+        depends_on: list[int] | None = None,
+    ) -> int:
+        """Queue a task and return its ID."""
+        if task_type not in self._handlers:
+            raise ValueError(f"Unknown task type: {task_type}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        
+        db = await get_database()
+        row = await fetch_one(
+            """
+            INSERT INTO tasks (type, priority, details, correlation_group, depends_on)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id
+            """,
+            (
+                task_type,
+                priority,
+                json.dumps(details or {}),
+                correlation_group,
+                json.dumps(depends_on) if depends_on else None,
+            ),
+            db=db,
+        )
+        await db.commit()
+        self._schedules.clear()
+        logger.info("Queued %s task %d", task_type, row["id"])
+        return row["id"]
+    
+    async def get(self, task_id: int) -> aiosqlite.Row | None:
+        """Get a task row."""
+        return await fetch_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
+    
+    async def list_tasks(
+        self,
+        statuses: tuple[str, ...],
+        limit: int = 100,
+        correlation_group: str | None = None,
+    ) -> list[aiosqlite.Row]:
+        """Get tasks with any of the statuses, in queue order, optionally of one group."""
+        placeholders = ", ".join("?" * len(statuses))
+        group_filter = "" if correlation_group is None else "AND correlation_group = ?"
+        return await fetch_all(
+            f"""
+            SELECT * FROM tasks WHERE status IN ({placeholders}) {group_filter}
+            ORDER BY {_PRIORITY_ORDER}, id
+            LIMIT ?
+            """,
+            (*statuses, *([] if correlation_group is None else [correlation_group]), limit),
+        )
+    
+    async def list_finished(self, limit: int = 20) -> list[aiosqlite.Row]:
+        """Get the most recently finished tasks."""
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        return await fetch_all(
+            f"""
+            SELECT * FROM tasks WHERE status IN ({placeholders})
+            ORDER BY completed_at DESC, id DESC
+            LIMIT ?
+            """,
+            (*FINISHED_STATUSES, limit),
+        )
+    
+    async def cancel(self, task_id: int) -> bool:
+        """
+        Cancel a task.
+        
+        Pending tasks are cancelled right away, a running task stops at its
+        next safe point. Returns False if the task already finished.
+        """
+        if task_id in self._running:
+            self._running[task_id].cancel.set()
+            return True
+        
+        db = await get_database()
+        updated = await execute(
+            """
+            UPDATE tasks SET status = 'cancelled', completed_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('pending', 'queued', 'paused')
+            """,
+            (task_id,),
+            db=db,
+        )
+        await db.commit()
+        self._forget(task_id)
+        return updated > 0
+    
+    async def recover(self) -> int:
+        """Fail tasks left running by a crash or restart."""
+        db = await get_database()
+        updated = await execute(
+            """
+            UPDATE tasks SET status = 'failed', error = 'Interrupted by restart',
+                completed_at = CURRENT_TIMESTAMP
+            WHERE status = 'running'
+            """,
+            db=db,
+        )
+        await db.commit()
+        if updated:
+            logger.warning("Marked %d interrupted tasks as failed", updated)
+        return updated
+    
+    async def schedule(self, correlation_group: str | None = None) -> list[Run]:
+        """Get the queued tasks in the order they will run, as runs of tasks on the same disks."""
+        return (await self._schedule(correlation_group)).runs
+    
+    async def _schedule(self, correlation_group: str | None) -> _Schedule:
+        """Get the cached order, re-ordering if tasks were added or the window ran out."""
+        # Also catches tasks added by another process, like the CLI
+        row = await fetch_one("SELECT MAX(id) AS max_id FROM tasks")
+        max_id = row["max_id"] or 0
+        cached = self._schedules.get(correlation_group)
+        if cached is None or cached.max_id != max_id or not cached.runs:
+            rows = await self.list_tasks(("pending", "queued"), SCHEDULE_WINDOW, correlation_group)
+            cached = _Schedule(
+                max_id=max_id,
+                runs=order_tasks(rows, self.active_disks, PRIORITIES),
+                depends_on={
+                    row["id"]: set(json.loads(row["depends_on"]))
+                    for row in rows
+                    if row["depends_on"]
+                },
+            )
+            self._schedules[correlation_group] = cached
+        return cached
+    
+    def _forget(self, task_id: int) -> None:
+        """Drop a task that is no longer queued from the cached orders."""
+        for cached in self._schedules.values():
+            cached.depends_on.pop(task_id, None)
+            for run in cached.runs:
+                index = next((i for i, row in enumerate(run.tasks) if row["id"] == task_id), None)
+                if index is not None:
+                    del run.tasks[index]
+                    if not run.tasks:
+                        cached.runs.remove(run)
+                    break
+    
+    async def next_task(
+        self,
+        correlation_group: str | None = None,
+        busy_disks: frozenset[str] | None = None,
+    ) -> aiosqlite.Row | None:
+        """
+        Get the next task whose dependencies have completed, optionally only of one group.
+        
+        With `busy_disks`, only moves that touch none of them are considered.
+        """
+        cached = await self._schedule(correlation_group)
+        rows = (
+            row
+            for run in cached.runs
+            if busy_disks is None
+            or (run.tasks[0]["type"] in MOVE_TASK_TYPES and not run.disks & busy_disks)
+            for row in run.tasks
+        )
+        
+        dependencies = set().union(*cached.depends_on.values())
+        completed: set[int] = set()
+        if dependencies:
+            placeholders = ", ".join("?" * len(dependencies))
+            completed = {
+                row["id"]
+                for row in await fetch_all(
+                    f"SELECT id FROM tasks WHERE status = 'completed' AND id IN ({placeholders})",
+                    tuple(dependencies),
+                )
+            }
+        
+        for row in rows:
+            if cached.depends_on.get(row["id"], set()) <= completed:
+                return row
+        return None
+    
+    async def run_next(self, correlation_group: str | None = None) -> bool:
+        """Run the next runnable task, returns False if there is none."""
+        row = await self.next_task(correlation_group)
+        if row is None:
+            return False
+        if await self._claim(row):
+            await self._execute(row)
+        return True
+    
+    async def run_available(
+        self,
+        correlation_group: str | None = None,
+        on_finished: Callable[[int], Awaitable[None]] | None = None,
+    ) -> int:
+        """
+        Run tasks until none is runnable, moves on separate disks in parallel.
+        
+        `on_finished` is awaited with the ID of each task once it is done.
+        Returns the number of tasks run.
+        """
+        running: dict[asyncio.Task[None], aiosqlite.Row] = {}
+        count = 0
+        try:
+            while True:
+                # A task that isn't a move runs alone
+                while len(running) < max(1, settings.move_concurrency) and all(
+                    row["type"] in MOVE_TASK_TYPES for row in running.values()
+                ):
+                    busy = None
+                    if running:
+                        busy = frozenset().union(*(task_disks(row) for row in running.values()))
+                    row = await self.next_task(correlation_group, busy)
+                    if row is None:
+                        break
+                    # Claimed before the next pick, which then no longer sees it as queued
+                    if await self._claim(row):
+                        running[asyncio.create_task(self._execute(row))] = row
+                if not running:
+                    return count
+                
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    row = running.pop(task)
+                    count += 1
+                    if (error := task.exception()) is not None:
+                        logger.error("Running task %d failed", row["id"], exc_info=error)
+                    if on_finished is not None:
+                        await on_finished(row["id"])
+        finally:
+            for task in running:
+                task.cancel()
+    
+    async def _claim(self, row: aiosqlite.Row) -> bool:
+        """
+        Mark a task as running, False if it is no longer queued.
+        
+        The CLI and the web app can share state.db, so another process may
+        have claimed or cancelled the task since it was picked.
+        """
+        db = await get_database()
+        claimed = await execute(
+            """
+            UPDATE tasks SET status = 'running', started_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('pending', 'queued')
+            """,
+            (row["id"],),
+            db=db,
+        )
+        await db.commit()
+        self._forget(row["id"])
+        if not claimed:
+            logger.info("Task %d was taken or cancelled elsewhere, skipping it", row["id"])
+            return False
+        if disks := task_disks(row):
+            self.active_disks = disks
+        return True
+    
+    async def _execute(self, row: aiosqlite.Row) -> None:
+        """Run a claimed task with its handler and store the outcome."""
+        details = json.loads(row["details"])
+        context = TaskContext(
+            task_id=row["id"],
+            details=details,
+            correlation_group=row["correlation_group"],
+            cancel=threading.Event(),
+        )
+        self._running[row["id"]] = context
+        status, error, result = "completed", None, None
+        try:
+            result = await self._handlers[row["type"]](context)
+            if context.cancel.is_set():
+                status = "cancelled"
+        except TaskCancelled:
+            status = "cancelled"
+        except Exception as e:
+            logger.exception("Task %d (%s) failed", row["id"], row["type"])
+            status, error = "failed", str(e)
+        finally:
+            del self._running[row["id"]]
+        
+        if result is not None:
+            details["result"] = result
+        db = await get_database()
+        await execute(
+            """
+            UPDATE tasks SET status = ?, error = ?, details = ?, completed_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            (status, error, json.dumps(details), row["id"]),
+            db=db,
+        )
+        await db.commit()
+        logger.info("Task %d (%s) %s", row["id"], row["type"], status)
+    
+    def start(self) -> None:
+        """Start running queued tasks in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the runner, cancelling the running task."""
+        for context in self._running.values():
+            context.cancel.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+    
+    async def _run(self) -> None:
+        """Run tasks as they become runnable."""
+        await self.recover()
+        while True:
+            try:
+                await self.run_available()
+            except Exception:
+                logger.exception("Task queue error")
+            await asyncio.sleep(self.poll_interval)
+
+
+async def run_move_task(context: TaskContext) -> dict[str, Any]:
+    """Move a single file: details are `source`, `destination` and optionally `size`."""
+    source = Path(context.details["source"])
+    size = context.details.get("size")
+    if size is None:
+        size = (await asyncio.to_thread(source.stat)).st_size
+    [result] = await run_moves(
+        [MoveRequest(source, Path(context.details["destination"]), size)],
+        task_id=context.task_id,
+        cancel=context.cancel,
+    )
+    if result.status == "failed":
+        raise RuntimeError(result.error or "Move failed")
+    return {"status": result.status, "checksum": result.checksum, "duration_ms": result.duration_ms}
+
+
+async def run_move_dir_task(context: TaskContext) -> dict[str, Any]:
+    """
+    Move a directory with everything below it: details are `source` and `destination`.
+    
+    Files move one by one with the usual verification; source directories
+    are removed once empty. Failed files stay where they were.
+    """
+    source = Path(context.details["source"])
+    moves = await asyncio.to_thread(unit_requests, source, Path(context.details["destination"]))
+    done = 0
+    
+    def on_result(_result: MoveResult) -> None:
+        nonlocal done
+        done += 1
+        context.progress_percent = done / len(moves) * 100
+    
+    results = await run_moves(moves, task_id=context.task_id, cancel=context.cancel, on_result=on_result)
+    counts = Counter(result.status for result in results)
+    if counts["moved"] == len(moves):
+        await asyncio.to_thread(remove_empty_dirs, source)
+    if counts["failed"]:
+        raise RuntimeError(f"{counts['failed']} of {len(moves)} files failed to move")
+    return {"files": len(moves), **counts}
+
+
+async def run_undo_task(context: TaskContext) -> dict[str, Any]:
+    """Undo the moves of `task_id` or of every task in `correlation_group`."""
+    if "task_id" in context.details:
+        result = await undo_task(int(context.details["task_id"]), context.cancel)
+    elif "correlation_group" in context.details:
+        result = await undo_correlation_group(context.details["correlation_group"], context.cancel)
+    else:
+        raise ValueError("Undo needs a task_id or correlation_group")
+    return {
+        "undone": result.undone,
+        "invalid": result.invalid,
+        "failed": result.failed,
+        "cancelled": result.cancelled,
+    }
+
+
+async def run_calibration_task(context: TaskContext) -> dict[str, Any]:
+    """Measure disk throughput, optionally limited to `disk_ids`."""
+    def on_disk(done: int, total: int) -> None:
+        context.progress_percent = done / total * 100
+    
+    results = await calibrate_disks(context.details.get("disk_ids"), context.cancel, on_disk)
+    return {
+        r.disk_id: {"read_bps": round(r.read_bps), "write_bps": round(r.write_bps)}
+        for r in results
+    }
+
+
+task_queue = TaskQueue()
+task_queue.register("move_file", run_move_task)
+task_queue.register("move_dir", run_move_dir_task)
+task_queue.register("undo", run_undo_task)
+task_queue.register("calibrate", run_calibration_task)
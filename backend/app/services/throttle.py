@@ -0,0 +1,472 @@
+"""Throttle moves so they only use bandwidth the rest of the server leaves idle.
+
+The same machine runs Plex, VMs and downloads. Instead of one fixed
+speed, a controller samples the kernel every `THROTTLE_INTERVAL_SECONDS`:
+
+- PSI (`io.pressure` and `cpu.pressure`): the share of time some task
+  stalled waiting for I/O or CPU, from the `total` counters so the
+  reaction isn't smoothed over ten seconds like `avg10`. The copies stall
+  on I/O themselves, so with cgroup v2 the other cgroups are read (the
+  siblings of ours and of its ancestors, such as other containers and
+  VMs) and the most stalled one counts. Stall time isn't additive, so
+  subtracting our own from the host's would hide a foreground stall that
+  overlaps ours. Where no other cgroup is visible (a container with its
+  own cgroup namespace) the host's `full` stall time counts instead, the
+  time no task at all made progress; without cgroup v2 its `some` time.
+- `/proc/diskstats` of each array disk, minus the bytes the moves
+  themselves read and wrote: disks other processes are using are busy.
+
+Above the pressure targets the per-move bandwidth is halved, and once it
+is at its floor concurrency is reduced. Below half the targets both ramp
+back up until moves run unthrottled again. Moves touching a busy disk run
+at the floor rate. Quiet hours pause moves or hold them at a fixed rate;
+they are also checked whenever a copy asks for a slot or sends a chunk,
+so they apply before the controller's next sample.
+
+There is one throttle per process, `move_throttle`, shared by every batch
+of moves, so the back-off state carries over from one task to the next.
+Its controller starts with the first batch and keeps running.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime
+from datetime import time as clock
+from functools import lru_cache
+from pathlib import Path
+
+from app.services.config import settings
+from app.services.indexer import discover_disks
+from app.services.metrics import THROTTLE_BANDWIDTH, THROTTLE_CONCURRENCY, THROTTLE_PRESSURE
+
+logger = logging.getLogger(__name__)
+
+PRESSURE_PATH = Path("/proc/pressure")
+DISKSTATS_PATH = Path("/proc/diskstats")
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+SECTOR_SIZE = 512
+MB = 1024 * 1024
+
+# Bytes a move may send at once after idling, in seconds of its rate
+_BURST_SECONDS = 0.5
+# Bandwidth grows by this factor per calm interval
+_RAMP_FACTOR = 1.5
+# Files are only timed for the peak rate once this much was copied
+_PEAK_MIN_BYTES = 64 * MB
+
+
+@dataclass
+class Pressure:
+    """System load over one sampling interval."""
+    
+    io_percent: float = 0.0
+    cpu_percent: float = 0.0
+    # Disk ID -> bytes per second read and written by other processes
+    foreground_bps: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ThrottleLimits:
+    """What moves may currently use."""
+    
+    concurrency: int
+    bandwidth_bps: float | None = None  # Per move, None is unlimited
+    busy_disks: frozenset[str] = frozenset()
+    quiet: bool = False
+    
+    @property
+    def paused(self) -> bool:
+        """Check if moves must wait, for quiet hours without a bandwidth."""
+        return self.quiet and not self.concurrency
+
+
+@lru_cache(maxsize=4)
+def parse_quiet_hours(value: str) -> tuple[tuple[clock, clock], ...]:
+    """
+    Parse windows like "18:00-23:30,06:00-07:00".
+    
+    A window whose end is before its start runs past midnight.
+    
+    Raises:
+        ValueError: If a window is malformed.
+    """
+    windows = []
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        start, sep, end = part.strip().partition("-")
+        if not sep:
+            raise ValueError(f"Quiet hours window needs a start and an end: {part!r}")
+        windows.append((clock.fromisoformat(start.strip()), clock.fromisoformat(end.strip())))
+    return tuple(windows)
+
+
+def in_quiet_hours(now: datetime, windows: Iterable[tuple[clock, clock]]) -> bool:
+    """Check if a time falls in any quiet hours window."""
+    moment = now.time()
+    for start, end in windows:
+        if start <= end:
+            if start <= moment < end:
+                return True
+        elif moment >= start or moment < end:
+            return True
+    return False
+
+
+def quiet_limits(busy_disks: frozenset[str] = frozenset()) -> ThrottleLimits:
+    """Get the limits during quiet hours: one move at the quiet rate, or none."""
+    quiet_bps = settings.quiet_hours_bandwidth_mbps * MB
+    return ThrottleLimits(
+        concurrency=1 if quiet_bps > 0 else 0,
+        bandwidth_bps=quiet_bps,
+        busy_disks=busy_disks,
+        quiet=True,
+    )
+
+
+def next_limits(
+    limits: ThrottleLimits,
+    pressure: Pressure,
+    max_concurrency: int,
+    peak_bps: float,
+    quiet: bool = False,
+) -> ThrottleLimits:
+    """
+    Adjust the limits to one pressure sample.
+    
+    `peak_bps` is the fastest per-move rate seen; ramping past it lifts the
+    bandwidth limit entirely.
+    """
+    floor = settings.throttle_min_bandwidth_mbps * MB
+    busy = frozenset(
+        disk_id
+        for disk_id, bps in pressure.foreground_bps.items()
+        if bps > settings.throttle_foreground_mbps * MB
+    )
+    
+    if quiet:
+        return quiet_limits(busy)
+    if limits.quiet:
+        # Leaving quiet hours: start low and ramp up like after pressure
+        limits = ThrottleLimits(concurrency=1, bandwidth_bps=floor)
+    
+    concurrency = limits.concurrency
+    bandwidth = limits.bandwidth_bps
+    io_target = settings.throttle_io_pressure_percent
+    cpu_target = settings.throttle_cpu_pressure_percent
+    
+    if pressure.io_percent > io_target or pressure.cpu_percent > cpu_target:
+        if bandwidth is not None and bandwidth <= floor:
+            concurrency = max(1, concurrency - 1)
+        else:
+            bandwidth = max(floor, (bandwidth or peak_bps or floor) / 2)
+    elif pressure.io_percent < io_target / 2 and pressure.cpu_percent < cpu_target / 2:
+        if bandwidth is not None:
+            bandwidth *= _RAMP_FACTOR
+            if bandwidth >= peak_bps:
+                bandwidth = None
+        elif concurrency < max_concurrency:
+            concurrency += 1
+    
+    return ThrottleLimits(
+        concurrency=min(max(concurrency, 1), max_concurrency),
+        bandwidth_bps=bandwidth,
+        busy_disks=busy,
+    )
+
+
+class PressureSampler:
+    """Turn the kernel's cumulative counters into per-interval pressure."""
+    
+    def __init__(self, disks: dict[str, Path] | None = None) -> None:
+        disks = disks if disks is not None else discover_disks()
+        self._devices = {}
+        for disk_id, mount_point in disks.items():
+            try:
+                dev = os.stat(mount_point).st_dev
+            except OSError:
+                continue
+            self._devices[(os.major(dev), os.minor(dev))] = disk_id
+        self._cgroup = _own_cgroup()
+        if self._cgroup is None:
+            logger.info("No cgroup pressure for this process, the moves' own stalls count too")
+        elif not _other_cgroups(*self._cgroup):
+            logger.info("No other cgroups visible, using the time all tasks stalled")
+        self._last: tuple[float, dict[str, dict[str, float]], dict[str, int]] | None = None
+        self._own: dict[str, int] = {}
+    
+    def sample(self, own_bytes: dict[str, int]) -> Pressure:
+        """
+        Get the pressure since the previous call.
+        
+        `own_bytes` are the cumulative bytes the moves read or wrote per
+        disk, subtracted from the disk counters. The first call returns no
+        pressure.
+        """
+        now = time.monotonic()
+        stalls = {resource: self._stall_totals(resource) for resource in ("io", "cpu")}
+        disk_bytes = self._disk_bytes()
+        previous, self._last = self._last, (now, stalls, disk_bytes)
+        if previous is None:
+            self._own = dict(own_bytes)
+            return Pressure()
+        
+        then, old_stalls, old_bytes = previous
+        elapsed = max(now - then, 1e-6)
+        
+        def stall_percent(resource: str) -> float:
+            # PSI totals are microseconds of stall time, cgroups that came and went don't count
+            old = old_stalls[resource]
+            deltas = [
+                total - old[source] for source, total in stalls[resource].items() if source in old
+            ]
+            stalled = max(deltas, default=0.0)
+            return min(100.0, max(0.0, stalled) / 1e6 / elapsed * 100)
+        
+        foreground = {}
+        for disk_id, total in disk_bytes.items():
+            own = own_bytes.get(disk_id, 0) - self._own.get(disk_id, 0)
+            foreground[disk_id] = max(0.0, (total - old_bytes.get(disk_id, total) - own) / elapsed)
+        self._own = dict(own_bytes)
+        return Pressure(stall_percent("io"), stall_percent("cpu"), foreground)
+    
+    def _stall_totals(self, resource: str) -> dict[str, float]:
+        """Get the cumulative stall time of the processes other than ours, per cgroup."""
+        if self._cgroup is None:
+            return {"host": _psi_total(PRESSURE_PATH / resource)}
+        others = _other_cgroups(*self._cgroup)
+        if not others:
+            return {"host": _psi_total(PRESSURE_PATH / resource, "full")}
+        return {str(path): _psi_total(path / f"{resource}.pressure") for path in others}
+    
+    def _disk_bytes(self) -> dict[str, int]:
+        """Get the bytes read and written so far by each array disk."""
+        result = {}
+        try:
+            lines = DISKSTATS_PATH.read_text().splitlines()
+        except OSError:
+            return result
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            disk_id = self._devices.get((int(fields[0]), int(fields[1])))
+            if disk_id is not None:
+                result[disk_id] = (int(fields[5]) + int(fields[9])) * SECTOR_SIZE
+        return result
+
+
+def _own_cgroup() -> tuple[Path, Path] | None:
+    """Get the cgroup v2 root and this process's cgroup directory, if it reports pressure."""
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        if line.startswith("0::"):
+            # Hybrid hierarchies mount cgroup v2 at unified/
+            for root in (CGROUP_ROOT, CGROUP_ROOT / "unified"):
+                path = root / line[3:].lstrip("/")
+                if (path / "io.pressure").is_file():
+                    return root, path
+    return None
+
+
+def _other_cgroups(root: Path, own: Path) -> list[Path]:
+    """
+    Get the cgroups holding every process outside `own`.
+    
+    Those are the siblings of `own` and of each of its ancestors below
+    `root`, each covering its whole subtree.
+    """
+    others = []
+    path = own
+    while path != root and root in path.parents:
+        try:
+            entries = list(path.parent.iterdir())
+        except OSError:
+            entries = []
+        others.extend(
+            entry for entry in entries if entry != path and (entry / "io.pressure").is_file()
+        )
+        path = path.parent
+    return others
+
+
+def _psi_total(path: Path, kind: str = "some") -> float:
+    """Get the cumulative stall time in a PSI file line ("some" or "full"), 0 without PSI."""
+    try:
+        text = path.read_text()
+    except OSError:
+        return 0.0
+    for line in text.splitlines():
+        if line.startswith(f"{kind} "):
+            for item in line.split()[1:]:
+                key, _, value = item.partition("=")
+                if key == "total":
+                    return float(value)
+    return 0.0
+
+
+class MoveThrottle:
+    """
+    Gate and pace the copies of moves.
+    
+    Worker threads hold a slot while they copy a file and report each
+    chunk, which sleeps as needed to keep to the bandwidth limit.
+    """
+    
+    def __init__(self, max_concurrency: int | None = None) -> None:
+        # None follows MOVE_CONCURRENCY
+        self._max_concurrency = max_concurrency
+        self.limits = ThrottleLimits(concurrency=self.max_concurrency)
+        self.peak_bps = 0.0
+        # Cumulative bytes copied per disk, for telling our I/O from others'
+        self.bytes_by_disk: dict[str, int] = defaultdict(int)
+        self._active = 0
+        self._condition = threading.Condition()
+        self._controller: asyncio.Task[None] | None = None
+    
+    @property
+    def max_concurrency(self) -> int:
+        """Get the most copies allowed at once."""
+        return max(1, self._max_concurrency or settings.move_concurrency)
+    
+    def current_limits(self) -> ThrottleLimits:
+        """Get the limits, with quiet hours applied even if the controller hasn't yet."""
+        limits = self.limits
+        if not limits.quiet:
+            try:
+                quiet = in_quiet_hours(datetime.now(), parse_quiet_hours(settings.quiet_hours))
+            except ValueError:
+                quiet = False  # Logged by the controller
+            if quiet:
+                limits = quiet_limits(limits.busy_disks)
+        if limits.concurrency > self.max_concurrency:
+            limits = ThrottleLimits(
+                self.max_concurrency, limits.bandwidth_bps, limits.busy_disks, limits.quiet
+            )
+        return limits
+    
+    def start(self) -> None:
+        """Start the controller on the running event loop, unless it already runs there."""
+        loop = asyncio.get_running_loop()
+        controller = self._controller
+        if controller is None or controller.done() or controller.get_loop() is not loop:
+            self._controller = loop.create_task(control(self))
+    
+    async def stop(self) -> None:
+        """Stop the controller."""
+        controller, self._controller = self._controller, None
+        if controller is not None and controller.get_loop() is asyncio.get_running_loop():
+            controller.cancel()
+            with suppress(asyncio.CancelledError):
+                await controller
+    
+    def update(self, limits: ThrottleLimits) -> None:
+        """Apply new limits; waiting workers start if slots opened."""
+        with self._condition:
+            if limits != self.limits:
+                logger.debug("Move limits now %s", limits)
+            self.limits = limits
+            self._condition.notify_all()
+        THROTTLE_CONCURRENCY.set(limits.concurrency)
+        THROTTLE_BANDWIDTH.set(limits.bandwidth_bps or 0)
+    
+    def acquire(self, cancel: threading.Event | None = None) -> bool:
+        """Wait for a copy slot, False if cancelled while waiting."""
+        with self._condition:
+            while self._active >= self.current_limits().concurrency:
+                if cancel is not None and cancel.is_set():
+                    return False
+                self._condition.wait(timeout=0.5)
+            self._active += 1
+            return True
+    
+    def release(self) -> None:
+        """Give a copy slot back."""
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+    
+    def pacer(
+        self,
+        disk_pair: tuple[str | None, str | None],
+        cancel: threading.Event | None = None,
+    ) -> Callable[[int], None]:
+        """
+        Get a callback that accounts for and paces the chunks of one file.
+        
+        While moves are paused it blocks until they resume or `cancel` is
+        set, so a copy that started before quiet hours stops too.
+        """
+        tokens = 0.0
+        last = time.monotonic()
+        start = last
+        sent = 0
+        
+        def on_chunk(n: int) -> None:
+            nonlocal tokens, last, sent
+            for disk_id in disk_pair:
+                if disk_id is not None:
+                    self.bytes_by_disk[disk_id] += n
+            
+            now = time.monotonic()
+            sent += n
+            if sent >= _PEAK_MIN_BYTES:
+                self.peak_bps = max(self.peak_bps, sent / (now - start))
+            
+            limits = self.current_limits()
+            if limits.paused:
+                with self._condition:
+                    while self.current_limits().paused and not (cancel and cancel.is_set()):
+                        self._condition.wait(timeout=0.5)
+                tokens, last = 0.0, time.monotonic()
+                return
+            bandwidth = limits.bandwidth_bps
+            if limits.busy_disks.intersection(disk_pair):
+                floor = settings.throttle_min_bandwidth_mbps * MB
+                bandwidth = min(bandwidth or floor, floor)
+            if bandwidth is None:
+                tokens, last = 0.0, now
+                return
+            
+            tokens = min(tokens + (now - last) * bandwidth, bandwidth * _BURST_SECONDS) - n
+            last = now
+            if tokens < 0:
+                time.sleep(-tokens / bandwidth)
+        
+        return on_chunk
+
+
+async def control(throttle: MoveThrottle) -> None:
+    """Adjust a throttle to the system pressure until cancelled."""
+    sampler = await asyncio.to_thread(PressureSampler)
+    while True:
+        try:
+            pressure = await asyncio.to_thread(sampler.sample, dict(throttle.bytes_by_disk))
+            THROTTLE_PRESSURE.labels("io").set(pressure.io_percent)
+            THROTTLE_PRESSURE.labels("cpu").set(pressure.cpu_percent)
+            quiet = in_quiet_hours(datetime.now(), parse_quiet_hours(settings.quiet_hours))
+            limits = next_limits(
+                throttle.limits, pressure, throttle.max_concurrency, throttle.peak_bps, quiet
+            )
+            if quiet and not throttle.limits.quiet:
+                state = "slowed" if limits.concurrency else "paused"
+                logger.info("Quiet hours started, moves %s", state)
+            throttle.update(limits)
+        except Exception:
+            # Never leave moves paused on a sampling error
+            logger.exception("Adjusting move limits failed")
+            throttle.update(ThrottleLimits(concurrency=throttle.max_concurrency))
+        await asyncio.sleep(settings.throttle_interval_seconds)
+
+
+move_throttle = MoveThrottle()
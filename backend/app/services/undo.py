@@ -0,0 +1,263 @@
+"""Reversing recorded moves from the undo log.
+
+Entries are validated in bulk before anything is moved: a stat per file
+catches missing, resized and conflicting files, and the hash cache
+confirms the content of files that haven't changed since they were
+moved without reading them. Files the cache can't vouch for are checked
+against their recorded checksum while they're copied back, so no file is
+read more often than during the original move.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiosqlite
+
+from app.services.checksum import FileKey, array_disk_id, get_cached_hashes
+from app.services.config import settings
+from app.services.database import execute, execute_many, fetch_all, get_database, sql_timestamp
+from app.services.executor import MoveRequest, run_moves
+
+logger = logging.getLogger(__name__)
+
+PRUNE_BATCH_SIZE = 10000
+
+
+@dataclass
+class UndoEntry:
+    """A move that can be reversed."""
+    
+    id: int
+    task_id: int | None
+    source_path: Path
+    dest_path: Path
+    file_size: int
+    checksum: str | None
+    
+    @classmethod
+    def from_row(cls, row: aiosqlite.Row) -> "UndoEntry":
+        """Create an entry from an `undo_log` row."""
+        return cls(
+            id=row["id"],
+            task_id=row["task_id"],
+            source_path=Path(row["source_path"]),
+            dest_path=Path(row["dest_path"]),
+            file_size=row["file_size"],
+            checksum=row["checksum"],
+        )
+    
+    def reversal(self) -> MoveRequest:
+        """Get the move that puts the file back."""
+        return MoveRequest(
+            source=self.dest_path,
+            dest=self.source_path,
+            size=self.file_size,
+            expected_checksum=self.checksum,
+        )
+
+
+@dataclass
+class UndoResult:
+    """Outcome of an undo run."""
+    
+    undone: int = 0
+    invalid: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    duration_seconds: float = 0.0
+    # Entry ID -> why it wasn't undone
+    errors: dict[int, str] = field(default_factory=dict)
+
+
+async def load_undo_entries(
+    task_ids: list[int] | None = None,
+    correlation_group: str | None = None,
+) -> list[UndoEntry]:
+    """Get valid, unexpired entries, most recent first."""
+    sql = """
+        SELECT u.* FROM undo_log u
+        LEFT JOIN tasks t ON t.id = u.task_id
+        WHERE u.is_valid AND u.expires_at > ?
+    """
+    params: list = [sql_timestamp()]
+    if task_ids is not None:
+        sql += f" AND u.task_id IN ({','.join('?' * len(task_ids))})"
+        params.extend(task_ids)
+    if correlation_group is not None:
+        sql += " AND t.correlation_group = ?"
+        params.append(correlation_group)
+    sql += " ORDER BY u.id DESC"
+    
+    rows = await fetch_all(sql, params)
+    return [UndoEntry.from_row(row) for row in rows]
+
+
+def stat_entry(entry: UndoEntry) -> FileKey | str | None:
+    """
+    Quick check of a single entry without reading file content.
+    
+    Returns the reason it can't be undone, or the moved file's cache key
+    (None if it's not on an array disk).
+    """
+    if os.path.lexists(entry.source_path):
+        return "Original location is occupied"
+    try:
+        st = os.stat(entry.dest_path)
+    except FileNotFoundError:
+        return "Moved file no longer exists"
+    except OSError as e:
+        return f"Moved file can't be read: {e}"
+    if st.st_size != entry.file_size:
+        return "Moved file changed size"
+    
+    disk_id = array_disk_id(entry.dest_path)
+    if disk_id is None:
+        return None
+    return FileKey(disk_id, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def stat_entries(entries: list[UndoEntry]) -> list[FileKey | str | None]:
+    """Run `stat_entry` for many entries, one thread per disk."""
+    by_disk: dict[str | None, list[int]] = defaultdict(list)
+    for i, entry in enumerate(entries):
+        by_disk[array_disk_id(entry.dest_path)].append(i)
+    
+    results: list[FileKey | str | None] = [None] * len(entries)
+    
+    def stat_disk(indices: list[int]) -> None:
+        for i in indices:
+            results[i] = stat_entry(entries[i])
+    
+    if by_disk:
+        with ThreadPoolExecutor(max_workers=len(by_disk), thread_name_prefix="undo-stat") as pool:
+            list(pool.map(stat_disk, by_disk.values()))
+    return results
+
+
+async def validate_entries(entries: list[UndoEntry]) -> tuple[list[UndoEntry], dict[int, str]]:
+    """
+    Split entries into those that can be undone and those that can't.
+    
+    Returns the valid entries and the reasons for the rest, by entry ID.
+    """
+    checks = await asyncio.to_thread(stat_entries, entries)
+    reasons = {e.id: check for e, check in zip(entries, checks, strict=True) if isinstance(check, str)}
+    keys = {e.id: check for e, check in zip(entries, checks, strict=True) if isinstance(check, FileKey)}
+    
+    cached = await get_cached_hashes(keys.values(), settings.checksum_algorithm)
+    for entry in entries:
+        key = keys.get(entry.id)
+        digest = cached.get(key) if key is not None else None
+        if entry.checksum and digest is not None and digest != entry.checksum:
+            reasons[entry.id] = "Moved file content changed"
+    
+    return [e for e in entries if e.id not in reasons], reasons
+
+
+async def invalidate_entries(reasons: dict[int, str]) -> None:
+    """Mark entries as no longer undoable."""
+    if not reasons:
+        return
+    db = await get_database()
+    await execute_many(
+        "UPDATE undo_log SET is_valid = FALSE, invalidation_reason = ? WHERE id = ?",
+        [(reason, entry_id) for entry_id, reason in reasons.items()],
+        db=db,
+    )
+    await db.commit()
+
+
+async def undo_entries(
+    entries: list[UndoEntry],
+    cancel: threading.Event | None = None,
+    max_workers: int | None = None,
+) -> UndoResult:
+    """
+    Validate and reverse a batch of moves.
+    
+    Reversals go through the move executor, so they run in parallel per
+    disk pair with the same copy-verify-delete safety as the original moves.
+    """
+    start = time.perf_counter()
+    valid, reasons = await validate_entries(entries)
+    result = UndoResult(invalid=len(reasons), errors=dict(reasons))
+    
+    moves = await run_moves(
+        [entry.reversal() for entry in valid],
+        operation="undo",
+        cancel=cancel,
+        max_workers=max_workers,
+    )
+    
+    for entry, move in zip(valid, moves, strict=True):
+        if move.status == "moved":
+            reasons[entry.id] = "Undone"
+            result.undone += 1
+        elif move.status == "failed":
+            result.failed += 1
+            result.errors[entry.id] = move.error or "Failed"
+        elif move.status == "cancelled":
+            result.cancelled += 1
+    
+    await invalidate_entries(reasons)
+    result.duration_seconds = time.perf_counter() - start
+    logger.info(
+        "Undo: %d undone, %d invalid, %d failed, %d cancelled in %.1fs",
+        result.undone,
+        result.invalid,
+        result.failed,
+        result.cancelled,
+        result.duration_seconds,
+    )
+    return result
+
+
+async def undo_task(task_id: int, cancel: threading.Event | None = None) -> UndoResult:
+    """Reverse all moves of a task."""
+    return await undo_entries(await load_undo_entries(task_ids=[task_id]), cancel)
+
+
+async def undo_correlation_group(
+    correlation_group: str,
+    cancel: threading.Event | None = None,
+) -> UndoResult:
+    """Reverse all moves of the tasks in a correlation group."""
+    entries = await load_undo_entries(correlation_group=correlation_group)
+    return await undo_entries(entries, cancel)
+
+
+async def prune_expired_undo(batch_size: int = PRUNE_BATCH_SIZE) -> int:
+    """
+    Delete expired undo records and return how many were removed.
+    
+    Deletes in bounded batches using `idx_undo_expires`, committing after
+    each, so a large backlog never holds the write lock for long.
+    """
+    db = await get_database()
+    now = sql_timestamp()
+    total = 0
+    while True:
+        deleted = await execute(
+            """
+            DELETE FROM undo_log WHERE id IN (
+                SELECT id FROM undo_log WHERE expires_at <= ? LIMIT ?
+            )
+            """,
+            (now, batch_size),
+            db=db,
+        )
+        await db.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+    
+    if total:
+        logger.info("Pruned %d expired undo records", total)
+    return total
@@ -0,0 +1,712 @@
+"""Keep the file index current from filesystem change events.
+
+Between index runs, Sonarr, Radarr and friends keep writing to the
+array. The watcher subscribes to change events on each indexed disk and
+applies them to index.db, so the index never needs periodic full walks.
+
+Two event sources are supported:
+
+- fanotify with a filesystem mark covers a whole disk with one
+  subscription and no per-directory setup. It reports the directory an
+  event happened in as a file handle, which is resolved to a path with
+  `open_by_handle_at`. It needs CAP_SYS_ADMIN and CAP_DAC_READ_SEARCH.
+- inotify needs one watch per directory, so it only covers the "hot"
+  shares from `WATCHER_SHARES` (all shares if unset), up to a watch limit.
+
+Events only mark directories dirty. Every `watcher_batch_seconds` the
+dirty directories are re-listed and their rows replaced; new
+subdirectories are scanned whole, vanished ones are dropped with their
+subtree, and the rollups of each changed directory and its ancestors are
+recomputed. A directory written to a thousand times in one interval is
+refreshed once. If the kernel queue overflows, events were lost and the
+disk is re-indexed in full.
+"""
+
+import asyncio
+import ctypes
+import errno
+import logging
+import os
+import struct
+from collections import defaultdict
+from collections.abc import Iterable
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+
+import aiosqlite
+
+from app.services.analytics import UsageDelta, apply_delta
+from app.services.config import settings
+from app.services.database import (
+    execute,
+    execute_many,
+    fetch_all,
+    fetch_one,
+    get_index_database,
+    index_write_lock,
+)
+from app.services.indexer import (
+    bump_generation,
+    discover_disks,
+    get_indexed_disks,
+    indexer,
+    insert_scan,
+    scan_disk,
+)
+
+logger = logging.getLogger(__name__)
+
+# fanotify (linux/fanotify.h)
+FAN_CLOEXEC = 0x01
+FAN_NONBLOCK = 0x02
+FAN_CLASS_NOTIF = 0x00
+FAN_REPORT_DFID_NAME = 0x400 | 0x800  # FAN_REPORT_DIR_FID | FAN_REPORT_NAME
+FAN_MARK_ADD = 0x01
+FAN_MARK_FILESYSTEM = 0x100
+FAN_CLOSE_WRITE = 0x08
+FAN_MOVED_FROM = 0x40
+FAN_MOVED_TO = 0x80
+FAN_CREATE = 0x100
+FAN_DELETE = 0x200
+FAN_Q_OVERFLOW = 0x4000
+FAN_ONDIR = 0x40000000
+FAN_EVENT_INFO_TYPE_DFID_NAME = 2
+FAN_EVENTS = FAN_CLOSE_WRITE | FAN_MOVED_FROM | FAN_MOVED_TO | FAN_CREATE | FAN_DELETE | FAN_ONDIR
+AT_FDCWD = -100
+
+# inotify (linux/inotify.h)
+IN_CLOEXEC = os.O_CLOEXEC
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# event_len, vers, reserved, metadata_len, mask, fd, pid
+_FAN_EVENT = struct.Struct("=IBBHQii")
+# info_type, pad, len, fsid (2 x int32), handle_bytes
+_FAN_INFO = struct.Struct("=BBHiiI")
+# wd, mask, cookie, len
+_IN_EVENT = struct.Struct("=iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _os_error(call: str) -> OSError:
+    """Build an OSError from errno after a failed libc call."""
+    code = ctypes.get_errno()
+    return OSError(code, f"{call}: {os.strerror(code)}")
+
+
+def _relative(mount_point: Path, path: str) -> str | None:
+    """Get a path relative to a disk root, None if it's outside."""
+    root = str(mount_point)
+    if path == root:
+        return ""
+    if path.startswith(root + "/"):
+        return path[len(root) + 1 :]
+    return None
+
+
+class FanotifySource:
+    """Change events of a whole disk from one fanotify filesystem mark."""
+    
+    backend = "fanotify"
+    
+    def __init__(self, disk_id: str, mount_point: Path) -> None:
+        self.disk_id = disk_id
+        self.mount_point = mount_point
+        flags = FAN_CLASS_NOTIF | FAN_CLOEXEC | FAN_NONBLOCK | FAN_REPORT_DFID_NAME
+        fd = _libc.fanotify_init(flags, os.O_RDONLY)
+        if fd < 0:
+            raise _os_error("fanotify_init")
+        self.fd = fd
+        try:
+            mark = _libc.fanotify_mark
+            mark.argtypes = [
+                ctypes.c_int, ctypes.c_uint, ctypes.c_uint64, ctypes.c_int, ctypes.c_char_p
+            ]
+            flags = FAN_MARK_ADD | FAN_MARK_FILESYSTEM
+            if mark(fd, flags, FAN_EVENTS, AT_FDCWD, bytes(mount_point)) < 0:
+                raise _os_error("fanotify_mark")
+            self._mount_fd = os.open(mount_point, os.O_RDONLY | os.O_DIRECTORY)
+        except BaseException:
+            os.close(fd)
+            raise
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def read(self) -> tuple[set[str], bool]:
+        """Read queued events, returning the dirty directories and whether events were lost."""
+        handles: set[bytes] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _FAN_EVENT.size <= len(data):
+                event = _FAN_EVENT.unpack_from(data, offset)
+                event_len, _, _, metadata_len, mask, event_fd, _ = event
+                if event_fd >= 0:
+                    os.close(event_fd)
+                if mask & FAN_Q_OVERFLOW:
+                    overflow = True
+                info = offset + metadata_len
+                end = offset + event_len
+                while info + _FAN_INFO.size <= end:
+                    info_type, _, info_len, _, _, handle_bytes = _FAN_INFO.unpack_from(data, info)
+                    if info_type == FAN_EVENT_INFO_TYPE_DFID_NAME:
+                        # struct file_handle: handle_bytes, handle_type, f_handle
+                        start = info + 12
+                        handles.add(bytes(data[start : start + 8 + handle_bytes]))
+                    if info_len == 0:
+                        break
+                    info += info_len
+                offset += event_len
+        
+        dirty = set()
+        for handle in handles:
+            path = self._resolve(handle)
+            if path is not None:
+                dirty.add(path)
+        return dirty, overflow
+    
+    def close(self) -> None:
+        os.close(self._mount_fd)
+        os.close(self.fd)
+    
+    def _resolve(self, handle: bytes) -> str | None:
+        """Turn a directory handle into a path relative to the disk root."""
+        fd = _libc.open_by_handle_at(self._mount_fd, handle, os.O_PATH)
+        if fd < 0:
+            # Deleted since; its parent has an event of its own
+            return None
+        try:
+            path = os.readlink(f"/proc/self/fd/{fd}")
+        finally:
+            os.close(fd)
+        if path.endswith(" (deleted)"):
+            return None
+        return _relative(self.mount_point, path)
+
+
+class InotifySource:
+    """Change events of the hot shares of a disk from per-directory inotify watches."""
+    
+    backend = "inotify"
+    
+    def __init__(
+        self,
+        disk_id: str,
+        mount_point: Path,
+        shares: list[str] | None = None,
+        max_watches: int | None = None,
+    ) -> None:
+        self.disk_id = disk_id
+        self.mount_point = mount_point
+        self.shares = shares
+        self.max_watches = max_watches if max_watches is not None else settings.watcher_max_watches
+        self.truncated = False
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise _os_error("inotify_init1")
+        self.fd = fd
+        self._add = _libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._paths: dict[int, str] = {}
+        
+        try:
+            # The disk root catches new shares, the shares are watched whole
+            self._watch("")
+            for share in self._shares():
+                self._watch_tree(share)
+        except BaseException:
+            os.close(fd)
+            raise
+    
+    @property
+    def watch_count(self) -> int:
+        return len(self._paths)
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def read(self) -> tuple[set[str], bool]:
+        """Read queued events, returning the dirty directories and whether events were lost."""
+        dirty = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _IN_EVENT.size <= len(data):
+                wd, mask, _, name_len = _IN_EVENT.unpack_from(data, offset)
+                start = offset + _IN_EVENT.size
+                name = data[start : start + name_len].rstrip(b"\0").decode(errors="surrogateescape")
+                offset = start + name_len
+                
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                path = self._paths.get(wd)
+                if path is None:
+                    continue
+                dirty.add(path)
+                
+                if mask & IN_ISDIR and name:
+                    child = f"{path}/{name}" if path else name
+                    if mask & IN_MOVED_FROM:
+                        self._unwatch_tree(child)
+                    elif mask & (IN_CREATE | IN_MOVED_TO) and (path or self._is_hot(name)):
+                        self._watch_tree(child)
+        return dirty, overflow
+    
+    def close(self) -> None:
+        os.close(self.fd)
+    
+    def _shares(self) -> list[str]:
+        """Get the share directories on this disk that should be watched."""
+        try:
+            names = sorted(entry.name for entry in os.scandir(self.mount_point) if entry.is_dir())
+        except OSError:
+            return []
+        return [name for name in names if self._is_hot(name)]
+    
+    def _is_hot(self, share: str) -> bool:
+        return not self.shares or share in self.shares
+    
+    def _watch(self, path: str) -> bool:
+        """Add a watch for one directory, False once the limit is reached."""
+        if len(self._paths) >= self.max_watches:
+            if not self.truncated:
+                logger.warning(
+                    "Reached %d inotify watches on %s, deeper directories aren't watched",
+                    self.max_watches,
+                    self.disk_id,
+                )
+                self.truncated = True
+            return False
+        wd = self._add(
+            self.fd,
+            os.fsencode(self.mount_point / path),
+            IN_EVENTS | IN_ONLYDIR | IN_DONT_FOLLOW,
+        )
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                self.max_watches = len(self._paths)
+                return self._watch(path)
+            return True
+        self._paths[wd] = path
+        return True
+    
+    def _watch_tree(self, path: str) -> None:
+        """Watch a directory and everything below it."""
+        for root, dirs, _ in os.walk(self.mount_point / path):
+            if not self._watch(_relative(self.mount_point, root) or ""):
+                return
+            dirs.sort()
+    
+    def _unwatch_tree(self, path: str) -> None:
+        """Stop watching a directory that was moved away, and its subdirectories."""
+        prefix = path + "/"
+        for wd, watched in list(self._paths.items()):
+            if watched == path or watched.startswith(prefix):
+                _libc.inotify_rm_watch(self.fd, wd)
+                del self._paths[wd]
+
+
+ChangeSource = FanotifySource | InotifySource
+
+
+def open_source(disk_id: str, mount_point: Path, backend: str | None = None) -> ChangeSource:
+    """
+    Subscribe to the changes of a disk.
+    
+    "auto" tries fanotify and falls back to inotify.
+    
+    Raises:
+        OSError: If the requested backend isn't available.
+    """
+    backend = backend or settings.watcher_backend
+    if backend in ("auto", "fanotify"):
+        try:
+            return FanotifySource(disk_id, mount_point)
+        except OSError as e:
+            if backend == "fanotify":
+                raise
+            logger.info("fanotify unavailable for %s (%s), using inotify", disk_id, e)
+    shares = [s.strip() for s in settings.watcher_shares.split(",") if s.strip()]
+    return InotifySource(disk_id, mount_point, shares or None)
+
+
+async def apply_changes(disk_id: str, mount_point: Path, paths: Iterable[str]) -> int:
+    """
+    Refresh changed directories of a disk in the index in one transaction.
+    
+    Nothing is applied while an index run is in progress, since it replaces
+    the same rows. Returns the number of directories refreshed.
+    """
+    async with index_write_lock():
+        if indexer.is_running:
+            return 0
+        return await _apply_changes(disk_id, mount_point, paths)
+
+
+async def _apply_changes(disk_id: str, mount_point: Path, paths: Iterable[str]) -> int:
+    db = await get_index_database()
+    # Parents first, so a new subtree is scanned once from its top
+    pending = sorted(set(paths), key=lambda p: (p.count("/") + bool(p), p))
+    changed: set[str] = set()
+    scanned: set[str] = set()
+    usage = UsageDelta()
+    
+    for path in pending:
+        if not any(path == top or path.startswith(top + "/") for top in scanned):
+            await _refresh_directory(db, disk_id, mount_point, path, changed, scanned, usage)
+    if not changed:
+        return 0
+    await apply_delta(usage, db)
+    
+    # Recompute rollups deepest first, so children are final before their parents
+    affected = set()
+    for path in changed:
+        parts = path.split("/") if path else []
+        affected.update("/".join(parts[:depth]) for depth in range(len(parts) + 1))
+    await execute_many(
+        """
+        UPDATE directories SET
+            total_files = file_count + COALESCE(
+                (SELECT SUM(c.total_files) FROM directories c WHERE c.parent_id = directories.id), 0
+            ),
+            total_bytes = size_bytes + COALESCE(
+                (SELECT SUM(c.total_bytes) FROM directories c WHERE c.parent_id = directories.id), 0
+            )
+        WHERE disk_id = ? AND path = ?
+        """,
+        [
+            (disk_id, path)
+            for path in sorted(affected, key=lambda p: p.count("/") + bool(p), reverse=True)
+        ],
+        db=db,
+    )
+    await execute(
+        """
+        UPDATE indexed_disks SET
+            file_count = (SELECT total_files FROM directories WHERE disk_id = ? AND path = ''),
+            total_bytes = (SELECT total_bytes FROM directories WHERE disk_id = ? AND path = ''),
+            indexed_at = ?
+        WHERE disk_id = ?
+        """,
+        (disk_id, disk_id, datetime.utcnow().isoformat(), disk_id),
+        db=db,
+    )
+    await db.commit()
+    return len(changed)
+
+
+async def refresh_paths(paths: Iterable[Path]) -> int:
+    """
+    Refresh the directories containing moved files right away.
+    
+    Moves change the index just like other writes, but aren't left to the
+    watcher: it may not run (e.g. from the CLI) and plans and analytics
+    should see the result as soon as a move finishes. Paths outside the
+    indexed disks are ignored. Returns the number of directories refreshed.
+    """
+    if indexer.is_running:
+        return 0
+    disks = discover_disks()
+    dirty: dict[str, set[str]] = defaultdict(set)
+    for path in paths:
+        for disk_id, mount_point in disks.items():
+            relative = _relative(mount_point, str(path.parent))
+            if relative is not None:
+                dirty[disk_id].add(relative)
+                break
+    
+    refreshed = 0
+    try:
+        indexed = {row["disk_id"] for row in await get_indexed_disks()}
+        for disk_id, directories in dirty.items():
+            if disk_id in indexed:
+                refreshed += await apply_changes(disk_id, disks[disk_id], directories)
+    except aiosqlite.OperationalError:
+        # Schema not created yet
+        return 0
+    if refreshed:
+        await bump_generation()
+    return refreshed
+
+
+async def _refresh_directory(
+    db: aiosqlite.Connection,
+    disk_id: str,
+    mount_point: Path,
+    path: str,
+    changed: set[str],
+    scanned: set[str],
+    usage: UsageDelta,
+) -> None:
+    """
+    Replace the files and subdirectory rows of one directory with what's on disk.
+    
+    Adds the directory to `changed`, new subtrees scanned whole to
+    `scanned` and the files removed and added to `usage`.
+    """
+    row = await fetch_one(
+        "SELECT id, share FROM directories WHERE disk_id = ? AND path = ?", (disk_id, path), db=db
+    )
+    if row is None:
+        # Not indexed yet: refreshing the parent picks it up as a new subtree
+        parent = path.rpartition("/")[0]
+        if path and parent not in changed:
+            await _refresh_directory(db, disk_id, mount_point, parent, changed, scanned, usage)
+        return
+    dir_id = row["id"]
+    
+    try:
+        files, subdirs = await asyncio.to_thread(_list_directory, mount_point / path)
+    except (FileNotFoundError, NotADirectoryError):
+        if path:
+            await _delete_tree(db, disk_id, path, usage)
+            changed.add(path.rpartition("/")[0])
+        return
+    except OSError as e:
+        logger.warning("Can't refresh %s on %s: %s", path or "/", disk_id, e)
+        return
+    
+    old = await fetch_all("SELECT size, mtime_ns FROM files WHERE dir_id = ?", (dir_id,), db=db)
+    usage.remove(disk_id, row["share"], old)
+    for _name, size, mtime_ns, *_ in files:
+        usage.add(disk_id, row["share"], size, mtime_ns)
+    await execute("DELETE FROM files WHERE dir_id = ?", (dir_id,), db=db)
+    await execute_many(
+        """
+        INSERT INTO files (dir_id, name, size, mtime_ns, atime_ns, inode)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [(dir_id, *values) for values in files],
+        db=db,
+    )
+    await execute(
+        "UPDATE directories SET file_count = ?, size_bytes = ? WHERE id = ?",
+        (len(files), sum(values[1] for values in files), dir_id),
+        db=db,
+    )
+    
+    indexed = {
+        row["path"].rpartition("/")[2]
+        for row in await fetch_all(
+            "SELECT path FROM directories WHERE parent_id = ?", (dir_id,), db=db
+        )
+    }
+    for name in indexed - subdirs:
+        await _delete_tree(db, disk_id, f"{path}/{name}" if path else name, usage)
+    for name in sorted(subdirs - indexed):
+        child = f"{path}/{name}" if path else name
+        scan = await asyncio.to_thread(scan_disk, disk_id, mount_point / child)
+        await insert_scan(scan, db, prefix=child, parent_id=dir_id)
+        share = child.split("/", 1)[0]
+        for size, mtime_ns in zip(scan.files.sizes, scan.files.mtimes, strict=True):
+            usage.add(disk_id, share, size, mtime_ns)
+        scanned.add(child)
+    changed.add(path)
+
+
+def _list_directory(directory: Path) -> tuple[list[tuple], set[str]]:
+    """List the files (as index rows without dir_id) and subdirectory names of a directory."""
+    files = []
+    subdirs = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.add(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    files.append(
+                        (entry.name, st.st_size, st.st_mtime_ns, st.st_atime_ns, st.st_ino)
+                    )
+            except OSError:
+                continue
+    return files, subdirs
+
+
+async def _delete_tree(
+    db: aiosqlite.Connection,
+    disk_id: str,
+    path: str,
+    usage: UsageDelta,
+) -> None:
+    """Remove a directory, its subdirectories and their files from the index."""
+    params = (disk_id, path, len(path) + 1, path + "/")
+    where = "disk_id = ? AND (path = ? OR substr(path, 1, ?) = ?)"
+    # A subtree lies within one share
+    usage.remove(
+        disk_id,
+        path.split("/", 1)[0],
+        await fetch_all(
+            f"""
+            SELECT size, mtime_ns FROM files
+            WHERE dir_id IN (SELECT id FROM directories WHERE {where})
+            """,
+            params,
+            db=db,
+        ),
+    )
+    await execute(
+        f"DELETE FROM files WHERE dir_id IN (SELECT id FROM directories WHERE {where})",
+        params,
+        db=db,
+    )
+    await execute(f"DELETE FROM directories WHERE {where}", params, db=db)
+
+
+class IndexWatcher:
+    """Apply change events of all indexed disks to the index in small batches."""
+    
+    def __init__(self) -> None:
+        self._sources: dict[str, ChangeSource] = {}
+        self._unavailable: set[str] = set()
+        self._dirty: dict[str, set[str]] = defaultdict(set)
+        self._overflowed: set[str] = set()
+        self._task: asyncio.Task[None] | None = None
+        self.directories_refreshed = 0
+    
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    @property
+    def backends(self) -> dict[str, str]:
+        """Get the event source of each watched disk."""
+        return {disk_id: source.backend for disk_id, source in self._sources.items()}
+    
+    @property
+    def pending(self) -> int:
+        """Get the number of dirty directories waiting for the next batch."""
+        return sum(len(paths) for paths in self._dirty.values())
+    
+    def is_current(self, disk_id: str) -> bool:
+        """Check if a disk's index is kept current, so its age doesn't matter."""
+        return disk_id in self._sources and disk_id not in self._overflowed
+    
+    def start(self) -> None:
+        """Start watching in the background."""
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop watching and close all event sources."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.close()
+    
+    def close(self) -> None:
+        """Close all event sources, dropping unapplied changes."""
+        loop = asyncio.get_running_loop()
+        for source in self._sources.values():
+            loop.remove_reader(source.fileno())
+            source.close()
+        self._sources.clear()
+        self._unavailable.clear()
+        self._dirty.clear()
+        self._overflowed.clear()
+    
+    async def watch_indexed_disks(self) -> None:
+        """Subscribe to every indexed disk that isn't watched yet."""
+        disks = discover_disks()
+        loop = asyncio.get_running_loop()
+        for row in await get_indexed_disks():
+            disk_id = row["disk_id"]
+            if disk_id in self._sources or disk_id in self._unavailable or disk_id not in disks:
+                continue
+            try:
+                source = await asyncio.to_thread(open_source, disk_id, disks[disk_id])
+            except OSError as e:
+                logger.warning("Can't watch %s: %s", disk_id, e)
+                self._unavailable.add(disk_id)
+                continue
+            self._sources[disk_id] = source
+            loop.add_reader(source.fileno(), self._on_readable, source)
+            logger.info("Watching %s with %s", disk_id, source.backend)
+    
+    async def flush(self) -> int:
+        """
+        Apply the pending changes now.
+        
+        Waits while an index run is in progress, since it replaces the
+        same rows. Returns the number of directories refreshed.
+        """
+        if indexer.is_running:
+            return 0
+        if self._overflowed:
+            lost = sorted(self._overflowed)
+            logger.warning("Change events lost on %s, re-indexing", ", ".join(lost))
+            for disk_id in self._overflowed:
+                self._dirty.pop(disk_id, None)
+            indexer.start(lost)
+            self._overflowed.clear()
+            return 0
+        
+        pending, self._dirty = self._dirty, defaultdict(set)
+        disks = discover_disks()
+        refreshed = 0
+        for disk_id, paths in pending.items():
+            if disk_id not in disks:
+                continue
+            ordered = sorted(paths)
+            for i in range(0, len(ordered), settings.watcher_batch_size):
+                refreshed += await apply_changes(
+                    disk_id, disks[disk_id], ordered[i : i + settings.watcher_batch_size]
+                )
+        
+        if refreshed:
+            self.directories_refreshed += refreshed
+            await bump_generation({"last_indexed_at": datetime.utcnow().isoformat()})
+        return refreshed
+    
+    def _on_readable(self, source: ChangeSource) -> None:
+        """Collect the events of a source when the event loop sees them."""
+        try:
+            dirty, overflow = source.read()
+        except OSError as e:
+            logger.warning("Reading change events of %s failed: %s", source.disk_id, e)
+            return
+        self._dirty[source.disk_id].update(dirty)
+        if overflow:
+            self._overflowed.add(source.disk_id)
+    
+    async def _run(self) -> None:
+        """Watch newly indexed disks and apply changes periodically."""
+        while True:
+            try:
+                if not indexer.is_running:
+                    await self.watch_indexed_disks()
+                await self.flush()
+            except Exception:
+                logger.exception("Applying index changes failed")
+            await asyncio.sleep(settings.watcher_batch_seconds)
+
+
+index_watcher = IndexWatcher()
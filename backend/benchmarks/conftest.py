@@ -0,0 +1,65 @@
+"""Benchmark fixtures.
+
+Run with:
+    pytest benchmarks --benchmark-storage=benchmarks/results --benchmark-autosave
+
+Set BENCH_ROOT to a tmpfs (e.g. /dev/shm/bench) to keep the generated array
+off real disks, and BENCH_FILES_PER_DISK / BENCH_DISKS to scale it.
+"""
+
+import asyncio
+import os
+import shutil
+from collections.abc import Callable, Coroutine, Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.config import settings
+from benchmarks.generator import ArraySpec, SyntheticArray, generate_array
+
+
+@pytest.fixture(scope="session")
+def synthetic_array(tmp_path_factory: pytest.TempPathFactory) -> Iterator[SyntheticArray]:
+    """Generate one synthetic array for the whole benchmark session."""
+    bench_root = os.environ.get("BENCH_ROOT")
+    root = Path(bench_root) if bench_root else tmp_path_factory.mktemp("array")
+    
+    spec = ArraySpec(
+        disk_count=int(os.environ.get("BENCH_DISKS", "4")),
+        files_per_disk=int(os.environ.get("BENCH_FILES_PER_DISK", "2000")),
+    )
+    array = generate_array(root, spec)
+    
+    yield array
+    
+    if bench_root:
+        for disk in array.disks:
+            shutil.rmtree(disk, ignore_errors=True)
+
+
+@pytest.fixture
+def array_settings(
+    synthetic_array: SyntheticArray,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> SyntheticArray:
+    """Point settings at the synthetic array and a scratch data dir."""
+    monkeypatch.setattr(settings, "disk_mount_pattern", synthetic_array.mount_pattern)
+    monkeypatch.setattr(settings, "data_dir", tmp_path / "data")
+    monkeypatch.setattr(settings, "log_dir", tmp_path / "data" / "logs")
+    settings.ensure_directories()
+    return synthetic_array
+
+
+@pytest.fixture
+def run_async() -> Iterator[Callable[[Callable[[], Coroutine[Any, Any, Any]]], Any]]:
+    """Run a coroutine factory on a dedicated event loop."""
+    loop = asyncio.new_event_loop()
+    
+    def run(factory: Callable[[], Coroutine[Any, Any, Any]]) -> Any:
+        return loop.run_until_complete(factory())
+    
+    yield run
+    loop.close()
@@ -0,0 +1,150 @@
+"""Synthetic unRAID array generator for benchmarks."""
+
+import argparse
+import math
+import os
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+SizeProfile = Literal["media", "mixed", "small"]
+
+# Log-normal mixture per profile: (weight, median bytes, sigma)
+SIZE_PROFILES: dict[SizeProfile, list[tuple[float, float, float]]] = {
+    "media": [(0.8, 4 * 1024**3, 0.8), (0.2, 64 * 1024, 1.5)],
+    "mixed": [(0.2, 2 * 1024**3, 1.0), (0.5, 256 * 1024, 2.0), (0.3, 4 * 1024, 1.5)],
+    "small": [(1.0, 32 * 1024, 1.5)],
+}
+
+_WRITE_CHUNK = 1024 * 1024
+
+
+@dataclass
+class ArraySpec:
+    """Shape of a synthetic array."""
+    
+    disk_count: int = 4
+    files_per_disk: int = 1000
+    shares: tuple[str, ...] = ("media", "backups", "documents")
+    max_depth: int = 3
+    dirs_per_level: int = 4
+    size_profile: SizeProfile = "mixed"
+    size_scale: float = 1.0  # Multiply every generated size, e.g. 1e-4 for real data
+    sparse: bool = True  # Sparse files cost no space, use False for move benchmarks
+    seed: int = 0
+
+
+@dataclass
+class SyntheticArray:
+    """A generated array on disk."""
+    
+    root: Path
+    spec: ArraySpec
+    disks: list[Path] = field(default_factory=list)
+    file_count: int = 0
+    total_bytes: int = 0
+    
+    @property
+    def mount_pattern(self) -> str:
+        """Get the glob matching the generated disks, for `disk_mount_pattern`."""
+        return str(self.root / "disk*")
+
+
+def _pick_size(rng: random.Random, profile: SizeProfile, scale: float) -> int:
+    """Draw a file size from the profile's log-normal mixture."""
+    buckets = SIZE_PROFILES[profile]
+    _, median, sigma = rng.choices(buckets, weights=[b[0] for b in buckets])[0]
+    size = rng.lognormvariate(math.log(median), sigma) * scale
+    return max(0, int(size))
+
+
+def _directory_tree(rng: random.Random, spec: ArraySpec) -> list[Path]:
+    """Build the relative directory layout shared by every disk."""
+    dirs: list[Path] = []
+    level = [Path(share) for share in spec.shares]
+    dirs.extend(level)
+    
+    for depth in range(1, spec.max_depth):
+        next_level = []
+        for parent in level:
+            for i in range(rng.randint(1, spec.dirs_per_level)):
+                next_level.append(parent / f"dir_{depth}_{i:03d}")
+        dirs.extend(next_level)
+        level = next_level
+    
+    return dirs
+
+
+def _write_file(path: Path, size: int, sparse: bool, chunk: bytes) -> None:
+    """Create a file of the given size, sparse or with real data."""
+    with open(path, "wb") as f:
+        if sparse:
+            f.truncate(size)
+            return
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, len(chunk))
+            f.write(chunk[:n])
+            remaining -= n
+
+
+def generate_array(root: Path, spec: ArraySpec | None = None) -> SyntheticArray:
+    """
+    Generate a synthetic array of `/diskN` trees under `root`.
+    
+    Point `root` at a tmpfs (e.g. /dev/shm) to keep the benchmark off real
+    disks. Generation is deterministic for a given spec.
+    """
+    spec = spec or ArraySpec()
+    rng = random.Random(spec.seed)
+    chunk = rng.randbytes(_WRITE_CHUNK) if not spec.sparse else b""
+    
+    array = SyntheticArray(root=root, spec=spec)
+    tree = _directory_tree(rng, spec)
+    
+    for disk_num in range(1, spec.disk_count + 1):
+        disk = root / f"disk{disk_num}"
+        array.disks.append(disk)
+        
+        for rel in tree:
+            (disk / rel).mkdir(parents=True, exist_ok=True)
+        
+        for i in range(spec.files_per_disk):
+            rel_dir = rng.choice(tree)
+            size = _pick_size(rng, spec.size_profile, spec.size_scale)
+            _write_file(disk / rel_dir / f"file_{i:06d}.bin", size, spec.sparse, chunk)
+            array.file_count += 1
+            array.total_bytes += size
+    
+    return array
+
+
+def main() -> None:
+    """Generate a synthetic array from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("root", type=Path, help="Directory to create diskN trees in")
+    parser.add_argument("--disks", type=int, default=4)
+    parser.add_argument("--files-per-disk", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--profile", choices=list(SIZE_PROFILES), default="mixed")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--no-sparse", action="store_true", help="Write real data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    os.makedirs(args.root, exist_ok=True)
+    array = generate_array(args.root, ArraySpec(
+        disk_count=args.disks,
+        files_per_disk=args.files_per_disk,
+        max_depth=args.depth,
+        size_profile=args.profile,
+        size_scale=args.scale,
+        sparse=not args.no_sparse,
+        seed=args.seed,
+    ))
+    print(f"{array.file_count} files, {array.total_bytes} bytes in {array.mount_pattern}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmarks for the disk and file browser endpoints."""
+
+from typing import Any
+
+from app.api.disks import list_disks
+from app.api.files import browse_disk
+from benchmarks.generator import SyntheticArray
+
+
+def test_list_disks(benchmark: Any, array_settings: SyntheticArray, run_async: Any) -> None:
+    """Benchmark listing all array disks."""
+    result = benchmark(run_async, list_disks)
+    
+    assert result.total_count == array_settings.spec.disk_count
+
+
+def test_browse_disk_share_root(
+    benchmark: Any,
+    array_settings: SyntheticArray,
+    run_async: Any,
+) -> None:
+    """Benchmark browsing a share root on a single disk."""
+    share = array_settings.spec.shares[0]
+    
+    result = benchmark(run_async, lambda: browse_disk("disk1", path=share))
+    
+    assert result.directory_count > 0
+
+
+def test_browse_disk_deepest_level(
+    benchmark: Any,
+    array_settings: SyntheticArray,
+    run_async: Any,
+) -> None:
+    """Benchmark browsing a leaf directory, where most files live."""
+    disk = array_settings.disks[0]
+    leaf = max(
+        (p for p in disk.rglob("*") if p.is_dir()),
+        key=lambda p: len(list(p.iterdir())),
+    )
+    
+    result = benchmark(run_async, lambda: browse_disk("disk1", path=str(leaf.relative_to(disk))))
+    
+    assert result.file_count > 0
@@ -0,0 +1,111 @@
+"""Benchmarks for move copies in each I/O mode.
+
+Besides throughput, each run records how much of the source and the copy
+is left in the page cache, which is what the uncached modes are for.
+Copies go to a temporary directory, or BENCH_COPY_DIR; tmpfs doesn't
+support O_DIRECT, so point it at a real disk to compare the modes.
+BENCH_COPY_MB sets the file size.
+"""
+
+import ctypes
+import ctypes.util
+import mmap
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.checksum import hash_file
+from app.services.direct_io import IO_MODES, buffer_pool, chunk_size, copy_file
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [
+    ctypes.c_void_p,
+    ctypes.c_size_t,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_long,
+]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+
+
+def cached_bytes(path: Path) -> int:
+    """Count the bytes of a file that are in the page cache."""
+    size = path.stat().st_size
+    if size == 0:
+        return 0
+    pages = -(-size // mmap.PAGESIZE)
+    vec = (ctypes.c_ubyte * pages)()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Mapping without touching the pages doesn't read them in
+        address = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if address == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), "mmap failed")
+        try:
+            if _libc.mincore(address, size, vec) != 0:
+                raise OSError(ctypes.get_errno(), "mincore failed")
+        finally:
+            _libc.munmap(address, size)
+    finally:
+        os.close(fd)
+    return sum(page & 1 for page in vec) * mmap.PAGESIZE
+
+
+def drop_cache(path: Path) -> None:
+    """Evict a file from the page cache."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+@pytest.fixture(scope="module")
+def copy_source(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Path]:
+    """Write one source file for all copy benchmarks."""
+    copy_dir = os.environ.get("BENCH_COPY_DIR")
+    root = Path(copy_dir) if copy_dir else tmp_path_factory.mktemp("copy")
+    root.mkdir(parents=True, exist_ok=True)
+    source = root / "source.bin"
+    size = int(os.environ.get("BENCH_COPY_MB", "256")) * 1024 * 1024
+    with open(source, "wb") as f:
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+        f.write(os.urandom(size % (1024 * 1024)))
+    os.sync()
+    
+    yield source
+    
+    for path in root.glob("*.bin"):
+        path.unlink()
+
+
+@pytest.mark.parametrize("mode", IO_MODES)
+def test_copy(benchmark: Any, copy_source: Path, mode: str) -> None:
+    """Benchmark copying and re-reading a file, as a verified move does."""
+    dest = copy_source.with_name(f"dest-{mode}.bin")
+    size = copy_source.stat().st_size
+    
+    def setup() -> None:
+        dest.unlink(missing_ok=True)
+        drop_cache(copy_source)
+    
+    def copy() -> str:
+        with buffer_pool.buffer(chunk_size(mode)) as buffer:
+            copy_file(copy_source, dest, buffer, mode)
+            return hash_file(dest, "md5", buffer, mode)
+    
+    benchmark.pedantic(copy, setup=setup, rounds=3, iterations=1)
+    
+    # No timings with --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info["mb_per_second"] = round(size / benchmark.stats.stats.mean / 1e6)
+    benchmark.extra_info["source_cached_mb"] = round(cached_bytes(copy_source) / 1e6, 1)
+    benchmark.extra_info["dest_cached_mb"] = round(cached_bytes(dest) / 1e6, 1)
+    assert dest.stat().st_size == size
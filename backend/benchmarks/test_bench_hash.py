@@ -0,0 +1,73 @@
+"""Benchmarks for whole-file hashing and its effect on the event loop.
+
+Dozens of files are hashed at once, as when several moves verify their
+copies, while a probe measures how late the event loop wakes up. That
+lag is added to every API request served in the meantime.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.checksum import HashPool
+from app.services.config import settings
+
+FILE_COUNT = 48
+PROBE_INTERVAL = 0.005
+
+
+@pytest.fixture(scope="module")
+def hash_files(tmp_path_factory: pytest.TempPathFactory) -> list[Path]:
+    """Write a mix of small and large files."""
+    root = tmp_path_factory.mktemp("hash")
+    paths = []
+    for i in range(FILE_COUNT):
+        path = root / f"file{i}.bin"
+        path.write_bytes(os.urandom(4 * 1024 * 1024 if i % 4 == 0 else 64 * 1024))
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_hash_concurrently(
+    benchmark: Any,
+    hash_files: list[Path],
+    run_async: Any,
+    monkeypatch: pytest.MonkeyPatch,
+    backend: str,
+) -> None:
+    """Benchmark hashing many files at once and record the event loop lag."""
+    monkeypatch.setattr(settings, "hash_backend", backend)
+    pool = HashPool()
+    lags: list[float] = []
+    
+    async def probe(done: asyncio.Event) -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+    
+    async def hash_all() -> list[str]:
+        done = asyncio.Event()
+        probing = asyncio.create_task(probe(done))
+        try:
+            return await asyncio.gather(*(pool.hash_async(path) for path in hash_files))
+        finally:
+            done.set()
+            await probing
+    
+    try:
+        # Start the worker processes outside the measurement
+        run_async(lambda: pool.hash_async(hash_files[0]))
+        digests = benchmark.pedantic(run_async, args=(hash_all,), rounds=3, iterations=1)
+    finally:
+        pool.shutdown()
+    
+    benchmark.extra_info["loop_lag_median_ms"] = round(statistics.median(lags) * 1000, 2)
+    benchmark.extra_info["loop_lag_max_ms"] = round(max(lags) * 1000, 2)
+    assert len(set(digests)) == FILE_COUNT
@@ -0,0 +1,48 @@
+"""Benchmarks for the indexer."""
+
+import tracemalloc
+from typing import Any
+
+from app.services.database import close_database
+from app.services.indexer import Indexer, scan_disk
+from benchmarks.generator import SyntheticArray
+
+
+def test_scan_disk(benchmark: Any, array_settings: SyntheticArray) -> None:
+    """Benchmark walking one disk into compact tables."""
+    disk = array_settings.disks[0]
+    
+    scan = benchmark(scan_disk, "disk1", disk)
+    
+    benchmark.extra_info["files"] = len(scan.files)
+    assert len(scan.files) == array_settings.spec.files_per_disk
+
+
+def test_scan_memory_per_file(benchmark: Any, array_settings: SyntheticArray) -> None:
+    """Record the peak memory a scan needs per file."""
+    disk = array_settings.disks[0]
+    
+    def measure() -> float:
+        tracemalloc.start()
+        scan = scan_disk("disk1", disk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak / len(scan.files)
+    
+    bytes_per_file = benchmark.pedantic(measure, rounds=1, iterations=1)
+    
+    benchmark.extra_info["peak_bytes_per_file"] = round(bytes_per_file)
+
+
+def test_full_index(benchmark: Any, array_settings: SyntheticArray, run_async: Any) -> None:
+    """Benchmark a full index run of every disk, including database writes."""
+    
+    async def index() -> int:
+        results = await Indexer().run()
+        await close_database()
+        return sum(r.file_count for r in results)
+    
+    files = benchmark.pedantic(run_async, args=(index,), rounds=3, iterations=1)
+    
+    benchmark.extra_info["files"] = files
+    assert files == array_settings.file_count
@@ -0,0 +1,113 @@
+"""Benchmarks for balance planning and keeping its input index current."""
+
+import itertools
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.balancer import DiskState, equal_fill_targets, generate_plan
+from app.services.database import close_database, init_database
+from app.services.indexer import Indexer, get_indexed_disks
+from app.services.plan_cache import get_plan
+from app.services.watcher import refresh_paths
+from benchmarks.generator import SyntheticArray
+
+# Directories written to per round of the incremental index benchmark
+CHANGED_DIRS = 50
+
+
+@pytest.fixture
+def indexed_array(
+    array_settings: SyntheticArray,
+    run_async: Any,
+) -> Iterator[dict[str, DiskState]]:
+    """Index the synthetic array and describe its disks as twice the size of the largest."""
+    
+    async def index() -> dict[str, DiskState]:
+        await init_database()
+        await Indexer().run()
+        rows = await get_indexed_disks()
+        capacity = 2 * max(row["total_bytes"] for row in rows)
+        return {
+            row["disk_id"]: DiskState(
+                row["disk_id"],
+                array_settings.root / row["disk_id"],
+                total_bytes=capacity,
+                used_bytes=row["total_bytes"],
+            )
+            for row in rows
+        }
+    
+    yield run_async(index)
+    
+    run_async(close_database)
+
+
+def test_cold_plan(benchmark: Any, indexed_array: dict[str, DiskState], run_async: Any) -> None:
+    """Benchmark planning every file of the array from scratch."""
+    plan = benchmark(run_async, lambda: generate_plan(indexed_array))
+    
+    benchmark.extra_info["moves"] = len(plan.moves)
+    assert plan.origin == "full"
+
+
+def test_warm_start_plan(
+    benchmark: Any,
+    indexed_array: dict[str, DiskState],
+    run_async: Any,
+) -> None:
+    """Benchmark re-planning from the previous plan after the targets were nudged."""
+    targets = equal_fill_targets(indexed_array)
+    run_async(lambda: get_plan(indexed_array, targets))
+    # Every round misses the cache, its plan is the next round's warm start
+    nudges = itertools.count(1)
+    
+    def nudged() -> Any:
+        step = next(nudges) * 0.01
+        return get_plan(indexed_array, {**targets, "disk1": targets["disk1"] - step})
+    
+    plan = benchmark(run_async, nudged)
+    
+    benchmark.extra_info["moves"] = len(plan.moves)
+    assert plan.origin == "warm"
+
+
+def test_cached_plan(benchmark: Any, indexed_array: dict[str, DiskState], run_async: Any) -> None:
+    """Benchmark getting an unchanged plan from the cache."""
+    run_async(lambda: get_plan(indexed_array))
+    
+    plan = benchmark(run_async, lambda: get_plan(indexed_array))
+    
+    assert plan.origin == "cache"
+
+
+def test_refresh_after_moves(
+    benchmark: Any,
+    indexed_array: dict[str, DiskState],
+    run_async: Any,
+) -> None:
+    """Benchmark refreshing the index for files written to many directories, as after moves."""
+    disk = indexed_array["disk1"].mount_point
+    directories = sorted(p for p in disk.rglob("*") if p.is_dir())[:CHANGED_DIRS]
+    rounds = itertools.count()
+    written: list[Path] = []
+    
+    def write_files() -> tuple[tuple[Any], dict]:
+        # New files each round, so every refresh has changes to apply
+        round_number = next(rounds)
+        paths = [directory / f"moved_{round_number:04d}.bin" for directory in directories]
+        for path in paths:
+            path.write_bytes(b"x" * 1024)
+        written.extend(paths)
+        return (lambda: refresh_paths(paths),), {}
+    
+    try:
+        refreshed = benchmark.pedantic(run_async, setup=write_files, rounds=5, iterations=1)
+    finally:
+        for path in written:
+            path.unlink(missing_ok=True)
+    
+    benchmark.extra_info["directories"] = refreshed
+    assert refreshed == len(directories)
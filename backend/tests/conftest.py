@@ -1,9 +1,24 @@
 """Pytest configuration and fixtures."""
 
+from pathlib import Path
+
 import pytest
 from httpx import AsyncClient
 
 from app.main import app
+from app.services.config import settings
+from app.services.database import close_database
+
+
+@pytest.fixture(autouse=True)
+async def data_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep databases and logs in a per-test data directory."""
+    path = tmp_path / "appdata"
+    monkeypatch.setattr(settings, "data_dir", path)
+    monkeypatch.setattr(settings, "log_dir", path / "logs")
+    monkeypatch.setattr(settings, "mover_pid_path", path / "mover.pid")
+    yield path
+    await close_database()
 
 
 @pytest.fixture
@@ -0,0 +1,76 @@
+"""Tests for admin endpoints and the sampling profiler."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.config import settings
+from app.services.profiler import SamplingProfiler
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    """Spin until stopped, so the profiler has something to sample."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_other_threads() -> None:
+    """Test that stacks from worker threads end up in the profile."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    time.sleep(0.1)
+    profile = profiler.stop()
+    stop.set()
+    worker.join()
+    
+    assert profile.sample_count > 0
+    assert "busy-worker;" in profile.to_collapsed()
+    
+    speedscope = profile.to_speedscope()
+    assert "busy-worker" in {p["name"] for p in speedscope["profiles"]}
+    assert any(f["name"] == "_busy_loop" for f in speedscope["shared"]["frames"])
+
+
+@pytest.mark.asyncio
+async def test_profile_requires_auth(client: AsyncClient) -> None:
+    """Test that the profiler endpoint rejects anonymous requests."""
+    response = await client.post("/api/admin/profile", params={"seconds": 0.05})
+    
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint(client: AsyncClient) -> None:
+    """Test a one-shot profiling run with HTTP Basic credentials."""
+    response = await client.post(
+        "/api/admin/profile",
+        params={"seconds": 0.05, "interval_ms": 1, "format": "collapsed"},
+        auth=(settings.auth_username, settings.auth_password),
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.strip()
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_stopped_elsewhere(client: AsyncClient) -> None:
+    """Test that a one-shot run stopped by another request gets a conflict."""
+    auth = (settings.auth_username, settings.auth_password)
+    run = asyncio.create_task(
+        client.post("/api/admin/profile", params={"seconds": 0.2}, auth=auth)
+    )
+    await asyncio.sleep(0.05)
+    
+    stopped = await client.post("/api/admin/profile/stop", auth=auth)
+    response = await run
+    
+    assert stopped.status_code == 200
+    assert response.status_code == 409
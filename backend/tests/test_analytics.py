@@ -0,0 +1,103 @@
+"""Tests for the precomputed usage analytics."""
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.analytics import TABLES, rebuild_usage
+from app.services.config import settings
+from app.services.database import fetch_all, get_index_database, init_database
+from app.services.executor import MoveRequest, run_moves
+from app.services.indexer import Indexer
+from app.services.watcher import apply_changes
+
+DAY = 86_400
+
+
+def write(path: Path, size: int, age_days: float = 0) -> None:
+    """Write a file last modified `age_days` ago."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_days * DAY
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+async def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Index two disks with a few shares."""
+    root = tmp_path / "mnt"
+    write(root / "disk1" / "Movies" / "a.mkv", 4000, age_days=400)
+    write(root / "disk1" / "TV" / "Show" / "e01.mkv", 1000)
+    write(root / "disk1" / "readme.txt", 10)
+    write(root / "disk2" / "Movies" / "b.mkv", 2000, age_days=10)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    monkeypatch.setattr(settings, "dry_run", False)
+    await init_database()
+    await Indexer().run()
+    return root
+
+
+async def _aggregates() -> dict[str, list[tuple]]:
+    db = await get_index_database()
+    return {
+        table: [
+            tuple(row) for row in await fetch_all(f"SELECT * FROM {table} ORDER BY 1, 2", db=db)
+        ]
+        for table in TABLES
+    }
+
+
+@pytest.mark.usefixtures("array_root")
+async def test_analytics_endpoint(client: AsyncClient) -> None:
+    """Test the share x disk matrix and the size and age histograms."""
+    response = await client.get("/api/analytics")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["disks"] == ["disk1", "disk2"]
+    assert [(s["share"], s["total_bytes"]) for s in data["shares"]] == [
+        ("Movies", 6000),
+        ("TV", 1000),
+        ("", 10),
+    ]
+    assert data["shares"][0]["disks"] == {
+        "disk1": {"file_count": 1, "total_bytes": 4000},
+        "disk2": {"file_count": 1, "total_bytes": 2000},
+    }
+    assert [(s["min_bytes"], s["max_bytes"], s["file_count"]) for s in data["sizes"]] == [
+        (8, 15, 1),
+        (512, 1023, 1),
+        (1024, 2047, 1),
+        (2048, 4095, 1),
+    ]
+    assert [(a["min_days"], a["max_days"], a["total_bytes"]) for a in data["ages"]] == [
+        (0, 1, 1010),
+        (7, 30, 2000),
+        (365, 730, 4000),
+    ]
+
+
+async def test_changes_and_moves_keep_aggregates_current(array_root: Path) -> None:
+    """Test that watcher changes and moves leave the same aggregates as a rebuild."""
+    disk1 = array_root / "disk1"
+    write(disk1 / "TV" / "Show" / "e02.mkv", 3000)
+    write(disk1 / "Music" / "Album" / "01.flac", 700, age_days=100)
+    (disk1 / "readme.txt").unlink()
+    await apply_changes("disk1", disk1, ["", "TV/Show", "Music/Album"])
+    await run_moves([
+        MoveRequest(
+            source=disk1 / "Movies" / "a.mkv",
+            dest=array_root / "disk2" / "Movies" / "a.mkv",
+            size=4000,
+        )
+    ])
+    
+    maintained = await _aggregates()
+    await rebuild_usage()
+    
+    assert maintained == await _aggregates()
+    assert ("disk2", "Movies", 2, 6000) in maintained["share_usage"]
+    assert not any(row[:2] == ("disk1", "Movies") for row in maintained["share_usage"])
@@ -0,0 +1,297 @@
+"""Tests for balance planning and plan simulation."""
+
+import os
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services import balancer
+from app.services.balancer import (
+    DiskState,
+    MoveCost,
+    MoveUnit,
+    Placement,
+    Plan,
+    PlannedMove,
+    generate_plan,
+    iter_units_by_size,
+    pareto_plans,
+)
+from app.services.config import settings
+from app.services.database import init_database
+from app.services.indexer import Indexer
+from app.services.plan_cache import get_plan
+from app.services.shares import ShareConfig, parse_share_config
+from app.services.simulator import MB, ThroughputModel, compare_concurrency, simulate
+
+GB = 1024 * MB
+
+
+@pytest.fixture
+async def indexed_array(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict[str, DiskState]:
+    """Index a small array and describe it as two 10 KB disks."""
+    root = tmp_path / "mnt"
+    (root / "disk1" / "media").mkdir(parents=True)
+    (root / "disk2").mkdir()
+    for size in (4000, 2000, 1000, 500):
+        (root / "disk1" / "media" / f"{size}.bin").write_bytes(b"x" * size)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    
+    return {
+        "disk1": DiskState("disk1", root / "disk1", total_bytes=10000, used_bytes=7500),
+        "disk2": DiskState("disk2", root / "disk2", total_bytes=10000, used_bytes=0),
+    }
+
+
+async def test_generate_plan_fills_up_to_target(indexed_array: dict[str, DiskState]) -> None:
+    """Test that the planner moves the largest files that fit below the target."""
+    plan = await generate_plan(indexed_array)
+    
+    assert plan.targets == {"disk1": 37.5, "disk2": 37.5}
+    # 4000 bytes would push disk2 past its 3750 byte target
+    assert [m.path for m in plan.moves] == ["media/2000.bin", "media/1000.bin", "media/500.bin"]
+    assert {m.dest_disk for m in plan.moves} == {"disk2"}
+    assert plan.max_deviation() == pytest.approx(2.5)
+    assert plan.move_requests()[0].dest == indexed_array["disk2"].mount_point / "media" / "2000.bin"
+
+
+async def test_generate_plan_skips_moves_not_worth_their_cost(
+    indexed_array: dict[str, DiskState],
+) -> None:
+    """Test that files whose fixed costs outweigh their transfer stay put."""
+    cost = MoveCost(bytes_per_second=1000, file_overhead_seconds=1.0)
+    
+    plan = await generate_plan(indexed_array, cost=cost)
+    
+    # 500 bytes transfer in 0.5s, less than the 1s overhead
+    assert [m.path for m in plan.moves] == ["media/2000.bin", "media/1000.bin"]
+    assert plan.cost_seconds == pytest.approx(5.0)
+
+
+async def test_generate_plan_charges_split_once(indexed_array: dict[str, DiskState]) -> None:
+    """Test that splitting a directory is paid once, then its files follow."""
+    cost = MoveCost(bytes_per_second=1000, split_penalty_seconds=1.5)
+    
+    plan = await generate_plan(indexed_array, cost=cost)
+    
+    assert len(plan.moves) == 3
+    assert plan.cost_seconds == pytest.approx(3.5 + 1.5)
+
+
+async def test_pareto_plans_trade_balance_for_cost(indexed_array: dict[str, DiskState]) -> None:
+    """Test that looser tolerances give cheaper, less balanced plans."""
+    plans = await pareto_plans(
+        indexed_array,
+        cost=MoveCost(bytes_per_second=1000),
+        tolerances=(0.0, 10.0, 10.0),
+    )
+    
+    assert [p.tolerance_percent for p in plans] == [10.0, 0.0]
+    assert [len(p.moves) for p in plans] == [2, 3]
+    assert plans[0].max_deviation() == pytest.approx(7.5)
+    assert plans[0].cost_seconds < plans[1].cost_seconds
+
+
+async def test_plan_cache_and_warm_start(indexed_array: dict[str, DiskState]) -> None:
+    """Test that repeated requests hit the cache and changed targets start warm."""
+    await init_database()
+    
+    first = await get_plan(indexed_array)
+    again = await get_plan(indexed_array)
+    nudged = await get_plan(indexed_array, {"disk1": 40.0, "disk2": 35.0})
+    
+    assert (first.origin, again.origin, nudged.origin) == ("full", "cache", "warm")
+    assert again.moves == first.moves
+    cold = await generate_plan(indexed_array, {"disk1": 40.0, "disk2": 35.0})
+    assert nudged.moves == cold.moves
+
+
+async def test_warm_start_drops_files_gone_from_index(
+    indexed_array: dict[str, DiskState],
+) -> None:
+    """Test that a re-index invalidates cached moves of deleted files."""
+    await init_database()
+    await get_plan(indexed_array)
+    (indexed_array["disk1"].mount_point / "media" / "2000.bin").unlink()
+    await Indexer().run()
+    
+    plan = await get_plan(indexed_array)
+    
+    assert plan.origin == "warm"
+    assert [m.path for m in plan.moves] == ["media/1000.bin", "media/500.bin"]
+
+
+@pytest.fixture
+async def movie_array(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict[str, DiskState]:
+    """Index a Movies share on disk1 and describe three 10 KB disks."""
+    root = tmp_path / "mnt"
+    (root / "disk1" / "Movies" / "A" / "extras").mkdir(parents=True)
+    (root / "disk1" / "Movies" / "B").mkdir()
+    for name in ("a1", "a2", "extras/a3"):
+        (root / "disk1" / "Movies" / "A" / name).write_bytes(b"x" * 1000)
+    (root / "disk1" / "Movies" / "B" / "b1").write_bytes(b"x" * 1500)
+    (root / "disk1" / "Movies" / "top.nfo").write_bytes(b"x" * 100)
+    for disk in ("disk2", "disk3"):
+        (root / disk).mkdir()
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    
+    return {
+        disk: DiskState(disk, root / disk, total_bytes=10000, used_bytes=used)
+        for disk, used in (("disk1", 7000), ("disk2", 0), ("disk3", 0))
+    }
+
+
+@pytest.mark.usefixtures("movie_array")
+async def test_units_follow_split_level() -> None:
+    """Test that split level 1 makes each movie folder one unit."""
+    split = {"Movies": ShareConfig("Movies", split_level=1)}
+    deeper = {"Movies": ShareConfig("Movies", split_level=2)}
+    
+    units = [(u.path, u.size, u.file_count, u.is_dir) async for u in iter_units_by_size("disk1", split)]
+    
+    assert units == [
+        ("Movies/A", 3000, 3, True),
+        ("Movies/B", 1500, 1, True),
+        ("Movies/top.nfo", 100, 1, False),
+    ]
+    assert sorted([u.path async for u in iter_units_by_size("disk1", deeper)]) == [
+        "Movies/A/a1", "Movies/A/a2", "Movies/A/extras", "Movies/B/b1", "Movies/top.nfo"
+    ]
+    # Without a config or split level, and with "manual", movie folders aren't split either
+    for shares in ({}, {"Movies": ShareConfig("Movies")}, {"Movies": ShareConfig("Movies", 0)}):
+        paths = [(u.path, u.is_dir) async for u in iter_units_by_size("disk1", shares)]
+        assert paths == [("Movies/A", True), ("Movies/B", True), ("Movies/top.nfo", False)]
+
+
+async def test_plan_moves_units_to_allowed_disks(movie_array: dict[str, DiskState]) -> None:
+    """Test that a movie folder moves whole and only to disks its share allows."""
+    shares = {"Movies": parse_share_config("Movies", 'shareSplitLevel="1"\nshareExclude="disk3"\n')}
+    
+    plan = await generate_plan(
+        movie_array,
+        {"disk1": 40.0, "disk2": 30.0, "disk3": 30.0},
+        shares=shares,
+    )
+    
+    assert plan.moves == [
+        PlannedMove("disk1", "disk2", "Movies/A", 3000, file_count=3, is_dir=True),
+    ]
+    requests = plan.move_requests()
+    assert sorted(r.dest.relative_to(movie_array["disk2"].mount_point).as_posix() for r in requests) == [
+        "Movies/A/a1",
+        "Movies/A/a2",
+        "Movies/A/extras/a3",
+    ]
+
+
+def _plan(*moves: tuple[str, str, int]) -> Plan:
+    """Build a plan from (source, dest, size) tuples."""
+    return Plan(
+        disks={},
+        targets={},
+        moves=[PlannedMove(source, dest, f"f{i}", size) for i, (source, dest, size) in enumerate(moves)],
+    )
+
+
+def test_simulate_parity_bound() -> None:
+    """Test that parallel pairs share the parity bandwidth."""
+    model = ThroughputModel(parity_bps=50 * MB, file_overhead_seconds=0)
+    plan = _plan(("disk1", "disk2", 100 * MB), ("disk3", "disk4", 100 * MB))
+    
+    results, recommended = compare_concurrency(plan, model, [1, 2])
+    
+    assert [r.total_seconds for r in results] == [pytest.approx(4), pytest.approx(4)]
+    assert results[1].bottleneck == "parity"
+    assert recommended == 1
+
+
+def test_simulate_disk_bound() -> None:
+    """Test that pairs on different disks run in parallel when parity keeps up."""
+    model = ThroughputModel(
+        read_bps={"disk1": 100 * MB, "disk3": 100 * MB},
+        write_bps={"disk2": 50 * MB, "disk4": 100 * MB},
+        parity_bps=1 * GB,
+        file_overhead_seconds=1,
+    )
+    plan = _plan(("disk1", "disk2", 100 * MB), ("disk3", "disk4", 100 * MB))
+    
+    result = simulate(plan, model, 2)
+    
+    assert result.total_seconds == pytest.approx(3)
+    assert result.bottleneck == "disk2"
+    assert result.disk_busy_seconds["disk4"] == pytest.approx(2)
+
+
+def _write(path: Path, size: int, age_days: float) -> None:
+    """Write a file last used `age_days` ago."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    used = time.time() - age_days * 86400
+    os.utime(path, (used, used))
+
+
+@pytest.fixture
+async def tiered_array(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict[str, DiskState]:
+    """Index old movies on disk1 and a new one on disk2, both at the same fill."""
+    root = tmp_path / "mnt"
+    _write(root / "disk1" / "Movies" / "Old" / "old.mkv", 2000, age_days=400)
+    _write(root / "disk1" / "Movies" / "Older" / "older.mkv", 1000, age_days=500)
+    _write(root / "disk2" / "Movies" / "New" / "a.mkv", 1000, age_days=0)
+    _write(root / "disk2" / "Movies" / "New" / "b.mkv", 1000, age_days=2)
+    _write(root / "disk2" / "Movies" / "Mid" / "mid.mkv", 1000, age_days=60)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    
+    return {
+        disk: DiskState(disk, root / disk, total_bytes=10000, used_bytes=3000)
+        for disk in ("disk1", "disk2")
+    }
+
+
+async def test_hot_cold_placement_swaps_units(tiered_array: dict[str, DiskState]) -> None:
+    """Test that a new movie moves to the fast disk in exchange for an old one of its size."""
+    shares = {"Movies": ShareConfig("Movies", split_level=1)}
+    placement = Placement.from_speeds({"disk1": 200 * MB, "disk2": 100 * MB}, 30, 180)
+    
+    plan = await generate_plan(tiered_array, shares=shares, placement=placement)
+    
+    assert placement.tiers == {"disk1": "fast", "disk2": "slow"}
+    assert plan.moves == [
+        PlannedMove("disk2", "disk1", "Movies/New", 2000, file_count=2, is_dir=True),
+        PlannedMove("disk1", "disk2", "Movies/Old", 2000, file_count=1, is_dir=True),
+    ]
+    assert plan.max_deviation() == 0.0
+    assert plan.placement == "hot_cold"
+    
+    # Speeds too close to tell apart leave a balanced array alone
+    same = Placement.from_speeds({"disk1": 105 * MB, "disk2": 100 * MB}, 30, 180)
+    assert (await generate_plan(tiered_array, shares=shares, placement=same)).moves == []
+
+
+async def test_hot_cold_placement_reads_units_once(
+    tiered_array: dict[str, DiskState],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that the swap of hot and cold units reuses the units of the main pass."""
+    reads: list[str] = []
+    iter_units = balancer.iter_units_by_size
+    
+    def counting(disk_id: str, *args: Any, **kwargs: Any) -> AsyncIterator[MoveUnit]:
+        reads.append(disk_id)
+        return iter_units(disk_id, *args, **kwargs)
+    
+    monkeypatch.setattr(balancer, "iter_units_by_size", counting)
+    shares = {"Movies": ShareConfig("Movies", split_level=1)}
+    placement = Placement.from_speeds({"disk1": 200 * MB, "disk2": 100 * MB}, 30, 180)
+    
+    # disk1 is over its target, so the main pass reads it before the swap
+    await generate_plan(
+        tiered_array, {"disk1": 20.0, "disk2": 40.0}, shares=shares, placement=placement
+    )
+    
+    assert sorted(reads) == ["disk1", "disk2"]
@@ -0,0 +1,120 @@
+"""Tests for checksums and the persistent hash cache."""
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from app.services import checksum
+from app.services.checksum import (
+    FileKey,
+    file_key,
+    get_cached_hashes,
+    hash_file_cached,
+    prune_hash_cache,
+    store_hashes,
+)
+from app.services.config import settings
+from app.services.database import get_index_database, init_index_database
+from app.services.direct_io import IO_MODES, BufferPool, chunk_size, copy_file
+
+
+@pytest.fixture
+async def array_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a file on a fake array disk."""
+    path = tmp_path / "mnt" / "disk1" / "media" / "film.mkv"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"x" * 1000)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(tmp_path / "mnt" / "disk*"))
+    await init_index_database()
+    return path
+
+
+def test_file_key_outside_array(tmp_path: Path) -> None:
+    """Test that files outside the array disks have no cache key."""
+    path = tmp_path / "file.txt"
+    path.write_text("x")
+    
+    assert file_key(path) is None
+
+
+@pytest.mark.parametrize("mode", IO_MODES)
+def test_copy_file_modes(tmp_path: Path, mode: str) -> None:
+    """Test that every I/O mode copies and hashes files of unaligned sizes."""
+    pool = BufferPool()
+    source = tmp_path / "source.bin"
+    for size in (0, 1000, chunk_size(mode) * 2 + 12345):
+        source.write_bytes(os.urandom(size))
+        dest = tmp_path / f"dest-{size}.bin"
+        chunks: list[int] = []
+        with pool.buffer(chunk_size(mode)) as buffer:
+            st = copy_file(source, dest, buffer, mode, lambda c, seen=chunks: seen.append(len(c)))
+            copied = checksum.hash_file(dest, "md5", buffer, mode)
+        
+        assert copied == checksum.hash_file(source, "md5")
+        
+        assert dest.read_bytes() == source.read_bytes()
+        assert st.st_size == sum(chunks) == size
+    
+    # One buffer, reused for every file
+    assert pool.allocated == 1
+
+
+async def test_process_hash_pool(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that worker processes return the same digests and errors as threads."""
+    monkeypatch.setattr(settings, "hash_backend", "process")
+    monkeypatch.setattr(settings, "hash_workers", 2)
+    paths = []
+    for i in range(4):
+        paths.append(tmp_path / f"file{i}.bin")
+        paths[-1].write_bytes(os.urandom(100_000 * i))
+    pool = checksum.HashPool()
+    
+    try:
+        digests = await asyncio.gather(*(pool.hash_async(path) for path in paths))
+        assert digests == [checksum.hash_file(path) for path in paths]
+        assert pool.hash(paths[1], "md5") == checksum.hash_file(paths[1], "md5")
+        with pytest.raises(FileNotFoundError):
+            await pool.hash_async(tmp_path / "missing")
+    finally:
+        pool.shutdown()
+
+
+async def test_hash_file_cached_skips_unchanged_files(
+    array_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that an unchanged file is read once and a modified one again."""
+    reads = []
+    original = checksum.hash_file
+    monkeypatch.setattr(checksum, "hash_file", lambda *args: reads.append(args) or original(*args))
+    
+    first = await hash_file_cached(array_file)
+    second = await hash_file_cached(array_file)
+    
+    assert first == second
+    assert len(reads) == 1
+    
+    array_file.write_bytes(b"y" * 1000)
+    os.utime(array_file, ns=(0, 1))
+    third = await hash_file_cached(array_file)
+    
+    assert third != first
+    assert len(reads) == 2
+
+
+@pytest.mark.usefixtures("array_file")
+async def test_prune_hash_cache_keeps_recently_used() -> None:
+    """Test that pruning removes the least recently used entries first."""
+    keys = [FileKey("disk1", inode, 1, 1) for inode in range(3)]
+    await store_hashes({key: f"digest{key.inode}" for key in keys}, "sha256")
+    db = await get_index_database()
+    await db.execute("UPDATE hash_cache SET last_used_at = inode")
+    await db.commit()
+    await get_cached_hashes([keys[0]], "sha256")
+    
+    deleted = await prune_hash_cache(max_entries=2)
+    
+    assert deleted == 1
+    assert set(await get_cached_hashes(keys, "sha256")) == {keys[0], keys[2]}
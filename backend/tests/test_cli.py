@@ -0,0 +1,69 @@
+"""Tests for the command line interface."""
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app import cli
+from app.services.balancer import DiskState
+from app.services.config import settings
+
+
+def events(capsys: pytest.CaptureFixture[str]) -> list[dict[str, Any]]:
+    """Parse the NDJSON written since the last call."""
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_index_plan_move_undo(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test a full cycle through the CLI, as a scheduled script would run it."""
+    root = tmp_path / "mnt"
+    (root / "disk2").mkdir(parents=True)
+    for size in (4000, 2000, 1000, 500):
+        (root / "disk1" / "media" / str(size)).mkdir(parents=True)
+        (root / "disk1" / "media" / str(size) / "file.bin").write_bytes(b"x" * size)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    monkeypatch.setattr(settings, "dry_run", True)
+    # Files this small aren't worth moving by the default cost model
+    monkeypatch.setattr(settings, "plan_max_overhead_ratio", 1e9)
+    monkeypatch.setattr(
+        cli,
+        "get_disk_states",
+        lambda: {
+            "disk1": DiskState("disk1", root / "disk1", total_bytes=10000, used_bytes=7500),
+            "disk2": DiskState("disk2", root / "disk2", total_bytes=10000, used_bytes=0),
+        },
+    )
+    
+    assert cli.main(["index"]) == 0
+    *_, done = events(capsys)
+    assert done == {**done, "event": "done", "disks": 2, "files": 4}
+    
+    assert cli.main(["plan", "--limit", "2"]) == 0
+    plan, *moves = events(capsys)
+    assert plan["event"] == "plan" and plan["move_count"] == 3
+    assert [(m["path"], m["is_dir"]) for m in moves] == [("media/2000", True), ("media/1000", True)]
+    
+    assert cli.main(["move", "--no-dry-run", "--group", "nightly"]) == 0
+    output = events(capsys)
+    assert [e["status"] for e in output if e["event"] == "task"] == ["completed"] * 3
+    assert output[-1]["completed"] == 3
+    assert sorted(p.name for p in (root / "disk2" / "media").iterdir()) == ["1000", "2000", "500"]
+    
+    assert cli.main(["undo", "--group", "nightly", "--no-dry-run"]) == 0
+    assert events(capsys)[-1]["undone"] == 3
+    assert len(list((root / "disk1" / "media").glob("*/file.bin"))) == 4
+
+
+def test_invalid_target(capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that malformed targets are rejected by the parser."""
+    with pytest.raises(SystemExit) as exc:
+        cli.main(["plan", "--target", "disk1"])
+    
+    assert exc.value.code == 2
+    assert "DISK=PERCENT" in capsys.readouterr().err
@@ -0,0 +1,74 @@
+"""Tests for duplicate file detection."""
+
+import os
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.checksum import PARTIAL_EDGE_BYTES, hash_edges, hash_file
+from app.services.config import settings
+from app.services.dedupe import DedupeJob
+from app.services.indexer import Indexer
+
+
+@pytest.fixture
+def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a two-disk array with duplicates, near-duplicates and hardlinks."""
+    root = tmp_path / "mnt"
+    (root / "disk1" / "media").mkdir(parents=True)
+    (root / "disk2" / "media").mkdir(parents=True)
+    big = os.urandom(3 * PARTIAL_EDGE_BYTES)
+    # Same size and edges as `big`, different middle
+    near = big[:PARTIAL_EDGE_BYTES] + os.urandom(PARTIAL_EDGE_BYTES) + big[-PARTIAL_EDGE_BYTES:]
+    
+    (root / "disk1" / "media" / "big.mkv").write_bytes(big)
+    (root / "disk2" / "media" / "big copy.mkv").write_bytes(big)
+    (root / "disk2" / "media" / "near.mkv").write_bytes(near)
+    (root / "disk1" / "media" / "a.txt").write_bytes(b"same")
+    (root / "disk2" / "media" / "b.txt").write_bytes(b"same")
+    (root / "disk1" / "media" / "c.txt").write_bytes(b"diff")
+    os.link(root / "disk1" / "media" / "c.txt", root / "disk1" / "media" / "c-link.txt")
+    
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    return root
+
+
+def test_hash_edges_matches_full_hash_for_small_files(tmp_path: Path) -> None:
+    """Test that small files get their full hash from the edge stage."""
+    path = tmp_path / "small.bin"
+    path.write_bytes(b"x" * 1000)
+    
+    assert hash_edges(path, 1000) == hash_file(path)
+
+
+@pytest.mark.usefixtures("array_root")
+async def test_dedupe_finds_groups_and_uses_cache() -> None:
+    """Test the staged funnel and that a rerun is served from the cache."""
+    await Indexer().run()
+    job = DedupeJob()
+    
+    report = await job.run(min_size=0)
+    
+    groups = {tuple(sorted(c.path.name for c in g.files)) for g in report.groups}
+    assert groups == {("big copy.mkv", "big.mkv"), ("a.txt", "b.txt")}
+    assert report.groups[0].size == 3 * PARTIAL_EDGE_BYTES
+    assert report.wasted_bytes == 3 * PARTIAL_EDGE_BYTES + 4
+    # The hardlinked pair counts as one candidate
+    assert report.size_candidates == 6
+    assert report.full_hashed == 3
+    assert report.cache_hits == 0
+    
+    rerun = await job.run(min_size=0)
+    
+    assert rerun.partial_hashed == 0
+    assert rerun.full_hashed == 0
+    assert rerun.cache_hits == report.partial_hashed + report.full_hashed
+    assert len(rerun.groups) == 2
+
+
+async def test_dedupe_report_requires_run(client: AsyncClient) -> None:
+    """Test that the report is 404 before the first run."""
+    response = await client.get("/api/dedupe/report")
+    
+    assert response.status_code == 404
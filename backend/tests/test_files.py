@@ -0,0 +1,68 @@
+"""Tests for the merged share view."""
+
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.config import settings
+from app.services.indexer import Indexer
+
+
+@pytest.fixture
+async def split_share(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Spread a Movies share over two indexed disks."""
+    root = tmp_path / "mnt"
+    (root / "disk1" / "Movies" / "Alien").mkdir(parents=True)
+    (root / "disk1" / "Movies" / "Alien" / "alien.mkv").write_bytes(b"a" * 3000)
+    (root / "disk2" / "Movies" / "Alien").mkdir(parents=True)
+    (root / "disk2" / "Movies" / "Alien" / "alien.srt").write_bytes(b"s" * 100)
+    (root / "disk2" / "Movies" / "notes.txt").write_bytes(b"n" * 50)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    return root
+
+
+@pytest.mark.usefixtures("split_share")
+@pytest.mark.parametrize("source", ["index", "scan"])
+async def test_union_merges_disks(client: AsyncClient, source: str) -> None:
+    """Test that a directory on several disks is listed once with each disk's part."""
+    response = await client.get("/api/files/union", params={"path": "/Movies", "source": source})
+    assert response.status_code == 200
+    data = response.json()
+    
+    assert data["sources"] == {"disk1": source, "disk2": source}
+    assert [item["name"] for item in data["items"]] == ["Alien", "notes.txt"]
+    alien = data["items"][0]
+    assert alien["is_directory"]
+    assert [d["disk_id"] for d in alien["disks"]] == ["disk1", "disk2"]
+    if source == "index":
+        assert [d["size_bytes"] for d in alien["disks"]] == [3000, 100]
+        assert data["total_size_bytes"] == 3150
+    else:
+        assert alien["size_bytes"] is None
+    notes = data["items"][1]["disks"]
+    assert [(d["disk_id"], d["size_bytes"]) for d in notes] == [("disk2", 50)]
+    assert notes[0]["modified_at"] > 0
+
+
+async def test_union_scans_unindexed_disks(client: AsyncClient, split_share: Path) -> None:
+    """Test that a disk added after indexing is scanned live."""
+    (split_share / "disk3" / "Movies").mkdir(parents=True)
+    (split_share / "disk3" / "Movies" / "heat.mkv").write_bytes(b"h" * 700)
+    
+    response = await client.get("/api/files/union", params={"path": "Movies"})
+    data = response.json()
+    
+    assert data["sources"] == {"disk1": "index", "disk2": "index", "disk3": "scan"}
+    heat = next(item for item in data["items"] if item["name"] == "heat.mkv")
+    assert heat["size_bytes"] == 700
+    assert heat["path"] == "Movies/heat.mkv"
+    assert data["parent_path"] == ""
+
+
+@pytest.mark.usefixtures("split_share")
+async def test_union_rejects_bad_paths(client: AsyncClient) -> None:
+    """Test that traversal is refused and missing directories are 404."""
+    assert (await client.get("/api/files/union", params={"path": "../etc"})).status_code == 400
+    assert (await client.get("/api/files/union", params={"path": "Shows"})).status_code == 404
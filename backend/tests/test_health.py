@@ -1,5 +1,9 @@
 """Tests for health check endpoint."""
 
+import subprocess
+import sys
+from pathlib import Path
+
 import pytest
 from httpx import AsyncClient
 
@@ -16,3 +20,33 @@ async def test_health_endpoint(client: AsyncClient) -> None:
     assert "version" in data
     assert "uptime_seconds" in data
     assert data["status"] in ["healthy", "degraded", "unhealthy"]
+
+
+@pytest.mark.asyncio
+async def test_health_reports_starting(client: AsyncClient) -> None:
+    """Test that health answers with "starting" before startup work is done."""
+    from app.main import app
+    
+    app.state.startup_status = "starting"
+    try:
+        response = await client.get("/api/health")
+    finally:
+        del app.state.startup_status
+    
+    assert response.status_code == 200
+    assert response.json()["status"] == "starting"
+
+
+def test_app_import_leaves_heavy_libraries() -> None:
+    """Test that importing the app doesn't load libraries only some features use."""
+    heavy = ("multiprocessing", "numpy", "pyarrow", "jose")
+    code = f"import sys, app.main; print([m for m in {heavy!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parents[1],
+        text=True,
+    )
+    
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,104 @@
+"""Tests for the indexer and its compact record tables."""
+
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.records import DirectoryTable, FileTable
+from app.services.config import settings
+from app.services.database import fetch_all, get_index_database
+from app.services.indexer import Indexer, scan_disk
+
+
+@pytest.fixture
+def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a small two-disk array."""
+    root = tmp_path / "mnt"
+    (root / "disk1" / "media" / "movies" / "Film (2020)").mkdir(parents=True)
+    (root / "disk1" / "media" / "movies" / "Film (2020)" / "film.mkv").write_bytes(b"x" * 1000)
+    (root / "disk1" / "media" / "movies" / "Film (2020)" / "film.srt").write_bytes(b"x" * 10)
+    (root / "disk1" / "backups").mkdir()
+    (root / "disk1" / "backups" / "b.tar").write_bytes(b"x" * 500)
+    (root / "disk2" / "media").mkdir(parents=True)
+    (root / "disk2" / "media" / "song.flac").write_bytes(b"x" * 200)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    return root
+
+
+def test_file_table_round_trip() -> None:
+    """Test that names, including undecodable ones, survive the byte buffer."""
+    table = FileTable()
+    table.append(0, "a.mkv", 10, 1, 2, 3)
+    table.append(1, "caf\udce9.txt", 20, 4, 5, 6)
+    
+    assert len(table) == 2
+    assert table.name(0) == "a.mkv"
+    assert table.name(1) == "caf\udce9.txt"
+    assert table.record(1).size == 20
+    assert table.total_size() == 30
+
+
+def test_directory_rollup() -> None:
+    """Test that rollups include all nested directories."""
+    dirs = DirectoryTable()
+    root = dirs.add("", DirectoryTable.ROOT_PARENT)
+    media = dirs.add("media", root)
+    movies = dirs.add("media/movies", media)
+    dirs.add_file(movies, 100)
+    dirs.add_file(media, 5)
+    
+    dirs.rollup()
+    
+    assert dirs.total_sizes[root] == 105
+    assert dirs.total_files[media] == 2
+    assert dirs.share(movies) == "media"
+    assert dirs.share(root) is None
+
+
+def test_scan_disk(array_root: Path) -> None:
+    """Test walking a disk into tables."""
+    scan = scan_disk("disk1", array_root / "disk1")
+    
+    assert len(scan.files) == 3
+    assert scan.directories.total_sizes[0] == 1510
+    assert sorted(scan.files.name(i) for i in range(len(scan.files))) == [
+        "b.tar", "film.mkv", "film.srt",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("array_root")
+async def test_index_run_stores_rows() -> None:
+    """Test a full index run writes directories, files and rollups."""
+    results = await Indexer().run()
+    
+    assert {r.disk_id: r.file_count for r in results} == {"disk1": 3, "disk2": 1}
+    
+    db = await get_index_database()
+    rows = await fetch_all(
+        "SELECT disk_id, path, total_bytes, share FROM directories ORDER BY disk_id, path",
+        db=db,
+    )
+    by_path = {(r["disk_id"], r["path"]): r for r in rows}
+    assert by_path[("disk1", "media")]["total_bytes"] == 1010
+    assert by_path[("disk1", "media/movies/Film (2020)")]["share"] == "media"
+    assert by_path[("disk2", "")]["total_bytes"] == 200
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("array_root")
+async def test_reindex_replaces_rows(client: AsyncClient) -> None:
+    """Test that indexing twice doesn't duplicate rows and bumps the generation."""
+    await Indexer().run()
+    await Indexer().run()
+    
+    db = await get_index_database()
+    rows = await fetch_all("SELECT COUNT(*) AS n FROM files", db=db)
+    assert rows[0]["n"] == 4
+    
+    response = await client.get("/api/index/status")
+    data = response.json()
+    assert data["status"] == "current"
+    assert data["total_files"] == 4
+    assert data["disks_indexed"] == ["disk1", "disk2"]
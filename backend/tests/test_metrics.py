@@ -0,0 +1,18 @@
+"""Tests for the Prometheus metrics endpoint."""
+
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient) -> None:
+    """Test that metrics are exposed in Prometheus text format."""
+    await client.get("/api/health")
+    
+    response = await client.get("/api/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'array_balancer_http_request_duration_seconds_count{method="GET",router="health"' in body
+    assert "array_balancer_queue_tasks" in body
@@ -0,0 +1,78 @@
+"""Tests for the permission checker and background monitor."""
+
+from pathlib import Path
+
+import pytest
+
+from app.services.config import settings
+from app.services.permissions import PermissionMonitor, mount_fingerprint
+
+
+@pytest.fixture
+def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point disk detection at a temporary array with one disk."""
+    (tmp_path / "disk1").mkdir()
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(tmp_path / "disk*"))
+    monkeypatch.setattr(settings, "data_dir", tmp_path / "data")
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_check_all_shares_disk_list(array_root: Path) -> None:
+    """Test that both disk checks report on the same globbed disks."""
+    monitor = PermissionMonitor()
+    await monitor.refresh()
+    
+    report = monitor.report
+    assert report is not None
+    assert report.disks == [str(array_root / "disk1")]
+    assert set(report.get_check("disk_read").details) == set(report.disks)
+    assert set(report.get_check("disk_write").details) == set(report.disks)
+
+
+@pytest.mark.asyncio
+async def test_refresh_detects_added_disk(array_root: Path) -> None:
+    """Test that a disk added after the first check shows up in the diff."""
+    monitor = PermissionMonitor()
+    await monitor.refresh()
+    assert monitor.last_diff is None
+    
+    (array_root / "disk2").mkdir()
+    diff = await monitor.refresh()
+    
+    assert diff.disks_added == [str(array_root / "disk2")]
+    assert {c.name for c in diff.changes} >= {"disk_read", "disk_write"}
+    assert monitor.last_diff is diff
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("array_root")
+async def test_refresh_without_changes() -> None:
+    """Test that an unchanged array produces an empty diff."""
+    monitor = PermissionMonitor()
+    await monitor.refresh()
+    
+    diff = await monitor.refresh()
+    
+    assert not diff.has_changes
+
+
+def test_mount_fingerprint_ignores_unrelated_mounts(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that only array mounts affect the fingerprint."""
+    monkeypatch.setattr(settings, "disk_mount_pattern", "/mnt/disk*")
+    mounts = tmp_path / "mounts"
+    
+    mounts.write_text("/dev/md1 /mnt/disk1 xfs rw,noatime 0 0\n")
+    before = mount_fingerprint(mounts)
+    
+    mounts.write_text(
+        "/dev/md1 /mnt/disk1 xfs rw,noatime 0 0\n"
+        "overlay /var/lib/docker/overlay2/x overlay rw 0 0\n"
+    )
+    assert mount_fingerprint(mounts) == before
+    
+    mounts.write_text("/dev/md1 /mnt/disk1 xfs ro,noatime 0 0\n")
+    assert mount_fingerprint(mounts) != before
@@ -0,0 +1,77 @@
+"""Tests for history compaction and database maintenance."""
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.config import settings
+from app.services.database import (
+    execute_many,
+    fetch_all,
+    get_database,
+    init_database,
+    init_index_database,
+)
+from app.services.retention import RetentionService, compact_history
+
+
+@pytest.fixture
+async def history() -> None:
+    """Add old and recent history rows for two tasks."""
+    await init_database()
+    await init_index_database()
+    db = await get_database()
+    await execute_many(
+        """
+        INSERT INTO operation_history
+            (task_id, operation, source_path, dest_path, file_size, status, duration_ms, created_at)
+        VALUES (?, 'move', 'a', 'b', ?, ?, 10, ?)
+        """,
+        [
+            *[(1, 100, "moved", "2000-01-01 00:00:00") for _ in range(5)],
+            (1, 100, "failed", "2000-01-01 00:00:01"),
+            *[(None, 50, "moved", "2000-01-02 00:00:00") for _ in range(3)],
+            (2, 100, "moved", "2999-01-01 00:00:00"),
+        ],
+        db=db,
+    )
+    await db.commit()
+
+
+@pytest.mark.usefixtures("history")
+async def test_compact_history_rolls_up_old_rows() -> None:
+    """Test that old rows become per-task totals and recent rows are kept."""
+    compacted = await compact_history(batch_size=2)
+    
+    assert compacted == 9
+    rows = await fetch_all("SELECT * FROM operation_history")
+    assert [row["task_id"] for row in rows] == [2]
+    summaries = {
+        (row["task_id"], row["status"]): (row["file_count"], row["total_bytes"])
+        for row in await fetch_all("SELECT * FROM history_summaries")
+    }
+    assert summaries == {(1, "moved"): (5, 500), (1, "failed"): (1, 100), (0, "moved"): (3, 150)}
+
+
+@pytest.mark.usefixtures("history")
+async def test_vacuum_skipped_while_busy() -> None:
+    """Test that compaction runs while busy but VACUUM waits for idle."""
+    service = RetentionService(is_busy=lambda: True)
+    
+    result = await service.run_once()
+    
+    assert result.history_compacted == 9
+    assert result.pages_vacuumed == 0
+
+
+async def test_database_info_endpoint(client: AsyncClient) -> None:
+    """Test that both databases are reported."""
+    await init_database()
+    await init_index_database()
+    
+    response = await client.get(
+        "/api/admin/database",
+        auth=(settings.auth_username, settings.auth_password),
+    )
+    
+    assert response.status_code == 200
+    assert {db["name"] for db in response.json()} == {"state", "index"}
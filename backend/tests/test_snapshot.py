@@ -0,0 +1,106 @@
+"""Tests for the columnar index snapshots."""
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.balancer import iter_files_by_size
+from app.services.config import settings
+from app.services.database import fetch_all, get_index_database
+from app.services.dedupe import load_size_groups
+from app.services.indexer import Indexer
+from app.services.snapshot import open_current, snapshot_path
+from app.services.watcher import apply_changes
+
+pa = pytest.importorskip("pyarrow")
+
+
+def write(path: Path, size: int) -> None:
+    """Write a file of `size` bytes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+
+
+@pytest.fixture
+async def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Index two disks with files of shared and distinct sizes."""
+    root = tmp_path / "mnt"
+    write(root / "disk1" / "Movies" / "a.mkv", 4000)
+    write(root / "disk1" / "Movies" / "b.mkv", 4000)
+    write(root / "disk1" / "TV" / "Show" / "e01.mkv", 1000)
+    write(root / "disk1" / "Täst ünïcode.txt", 10)
+    os.link(root / "disk1" / "Movies" / "a.mkv", root / "disk1" / "Movies" / "a-link.mkv")
+    write(root / "disk2" / "Movies" / "c.mkv", 1000)
+    write(root / "disk2" / "Movies" / "d.mkv", 2000)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    return root
+
+
+async def _read_all() -> tuple[dict[str, list], list[list[tuple]]]:
+    files = {
+        disk_id: [
+            (u.path, u.size, u.dir_file_count, u.newest_ns)
+            async for u in iter_files_by_size(disk_id)
+        ]
+        for disk_id in ("disk1", "disk2")
+    }
+    groups = sorted(
+        sorted((c.key.disk_id, c.key.inode, str(c.path)) for c in group)
+        for group in await load_size_groups(0)
+    )
+    return files, groups
+
+
+async def test_readers_match_the_index(array_root: Path) -> None:
+    """Test that the planner and dedupe read the same from snapshots as from index.db."""
+    snapshot = await open_current("disk1")
+    assert snapshot is not None
+    assert len(snapshot) == 5
+    
+    from_snapshots = await _read_all()
+    shutil.rmtree(settings.data_dir / "snapshots")
+    from_index = await _read_all()
+    
+    assert from_snapshots == from_index
+    files, groups = from_snapshots
+    assert [path for path, *_ in files["disk2"]] == ["Movies/d.mkv", "Movies/c.mkv"]
+    assert files["disk1"][-1][:3] == ("Täst ünïcode.txt", 10, 1)
+    # Sizes 1000 and 4000 are shared, the hardlink counts once
+    assert [len(group) for group in groups] == [2, 2]
+    assert any(str(array_root / "disk2" / "Movies" / "c.mkv") in g[1] for g in groups)
+
+
+async def test_changes_make_snapshot_stale_until_export(
+    array_root: Path, client: AsyncClient
+) -> None:
+    """Test that watcher changes invalidate a snapshot and the export rewrites it."""
+    write(array_root / "disk1" / "TV" / "Show" / "e02.mkv", 3000)
+    await apply_changes("disk1", array_root / "disk1", ["TV/Show"])
+    
+    assert await open_current("disk1") is None
+    
+    response = await client.get("/api/index/snapshot/disk1")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.file"
+    table = pa.ipc.open_file(pa.py_buffer(response.content)).read_all()
+    db = await get_index_database()
+    indexed = await fetch_all(
+        """
+        SELECT d.path, f.name, f.size FROM files f JOIN directories d ON d.id = f.dir_id
+        WHERE d.disk_id = 'disk1'
+        """,
+        db=db,
+    )
+    columns = table.select(["dir", "name", "size"]).to_pydict().values()
+    assert sorted(zip(*columns, strict=True)) == sorted(tuple(row) for row in indexed)
+    assert await open_current("disk1") is not None
+    assert snapshot_path("disk1").exists()
+    
+    response = await client.get("/api/index/snapshot/disk9")
+    
+    assert response.status_code == 404
@@ -0,0 +1,254 @@
+"""Tests for the task queue and disk calibration."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.calibration import PROBE_FILE_NAME, get_calibrated_throughput
+from app.services.config import settings
+from app.services.database import execute, init_database, init_index_database
+from app.services.simulator import load_throughput_model
+from app.services.tasks import TaskContext, TaskQueue, task_queue
+
+
+@pytest.fixture
+async def array(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create two empty disks and a small probe size, out of dry-run mode."""
+    root = tmp_path / "mnt"
+    for name in ("disk1", "disk2"):
+        (root / name).mkdir(parents=True)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    monkeypatch.setattr(settings, "calibration_probe_mb", 1)
+    monkeypatch.setattr(settings, "dry_run", False)
+    await init_database()
+    return root
+
+
+async def test_calibrate_task_feeds_simulation(array: Path) -> None:
+    """Test that a calibration task stores speeds the simulation then uses."""
+    task_id = await task_queue.create("calibrate")
+    
+    assert await task_queue.run_next()
+    
+    task = await task_queue.get(task_id)
+    assert task["status"] == "completed"
+    calibrated = await get_calibrated_throughput()
+    assert set(calibrated) == {"disk1", "disk2"}
+    assert calibrated["disk1"].probe_bytes == 1024 * 1024
+    assert not (array / "disk1" / PROBE_FILE_NAME).exists()
+    model = await load_throughput_model()
+    assert model.read("disk2") == calibrated["disk2"].read_bps
+    assert model.write("disk2") == calibrated["disk2"].write_bps
+
+
+async def test_calibrate_task_refused_in_dry_run(
+    array: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that calibration writes nothing in dry-run mode."""
+    monkeypatch.setattr(settings, "dry_run", True)
+    task_id = await task_queue.create("calibrate")
+    
+    await task_queue.run_next()
+    
+    task = await task_queue.get(task_id)
+    assert task["status"] == "failed"
+    assert "DRY_RUN" in task["error"]
+    assert await get_calibrated_throughput() == {}
+    assert not any(array.rglob(PROBE_FILE_NAME))
+
+
+async def test_move_dir_task(array: Path) -> None:
+    """Test that a directory moves file by file and the emptied source is removed."""
+    await init_index_database()
+    album = array / "disk1" / "Music" / "Album"
+    (album / "CD1").mkdir(parents=True)
+    (album / "CD1" / "01.flac").write_bytes(b"a" * 3000)
+    (album / "cover.jpg").write_bytes(b"b" * 500)
+    
+    task_id = await task_queue.create(
+        "move_dir",
+        {"source": str(album), "destination": str(array / "disk2" / "Music" / "Album")},
+    )
+    await task_queue.run_next()
+    
+    task = await task_queue.get(task_id)
+    assert task["status"] == "completed"
+    assert json.loads(task["details"])["result"] == {"files": 2, "moved": 2}
+    assert (array / "disk2" / "Music" / "Album" / "CD1" / "01.flac").read_bytes() == b"a" * 3000
+    assert not album.exists()
+
+
+@pytest.mark.usefixtures("array")
+async def test_queue_order_and_dependencies() -> None:
+    """Test that tasks run by priority and wait for their dependencies."""
+    first = await task_queue.create("calibrate", {"disk_ids": ["disk1"]}, priority="low")
+    waiting = await task_queue.create("calibrate", {"disk_ids": ["disk2"]}, depends_on=[first])
+    urgent = await task_queue.create("calibrate", {"disk_ids": ["disk2"]}, priority="urgent")
+    
+    assert (await task_queue.next_task())["id"] == urgent
+    assert await task_queue.cancel(urgent)
+    assert (await task_queue.next_task())["id"] == first
+    await task_queue.run_next()
+    assert (await task_queue.next_task())["id"] == waiting
+
+
+@pytest.mark.usefixtures("array")
+async def test_task_endpoints(client: AsyncClient) -> None:
+    """Test creating, reading and cancelling tasks over the API."""
+    response = await client.post("/api/tasks", json={"type": "defrag", "details": {}})
+    assert response.status_code == 400
+    
+    response = await client.post("/api/tasks", json={"type": "calibrate", "details": {}})
+    assert response.status_code == 200
+    task_id = response.json()["id"]
+    assert response.json()["status"] == "pending"
+    
+    response = await client.get("/api/tasks")
+    assert [task["id"] for task in response.json()["queued"]] == [task_id]
+    
+    assert (await client.post(f"/api/tasks/{task_id}/cancel")).status_code == 200
+    assert (await client.post(f"/api/tasks/{task_id}/cancel")).status_code == 409
+    assert (await client.get("/api/tasks/999")).status_code == 404
+
+
+async def test_moves_are_scheduled_by_disk_pair(
+    array: Path,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that queued moves run in contiguous runs per disk pair, waking few disks."""
+    monkeypatch.setattr(task_queue, "active_disks", frozenset())
+    for name in ("disk3", "disk4", "disk5"):
+        (array / name).mkdir()
+    
+    def move(source: str, dest: str) -> dict:
+        return {"source": str(array / source / "f"), "destination": str(array / dest / "f")}
+    
+    pairs = [("disk1", "disk2"), ("disk3", "disk4"), ("disk1", "disk2"), ("disk3", "disk4")]
+    ids = [
+        await task_queue.create("move_file", move(*pair), correlation_group="plan")
+        for pair in pairs
+    ]
+    ids.append(
+        await task_queue.create("move_file", move("disk1", "disk3"), correlation_group="plan")
+    )
+    
+    # After disk1 -> disk2, disk1 -> disk3 only wakes disk3
+    order = [ids[0], ids[2], ids[4], ids[1], ids[3]]
+    assert (await task_queue.next_task())["id"] == ids[0]
+    
+    data = (await client.get("/api/tasks")).json()
+    assert [task["id"] for task in data["queued"]] == order
+    runs = [run["task_ids"] for run in data["schedule"]]
+    assert runs == [[ids[0], ids[2]], [ids[4]], [ids[1], ids[3]]]
+    assert data["schedule"][1]["source_disk"] == "disk1"
+    assert data["spin_ups"] == 4
+    assert data["spin_ups_in_creation_order"] == 9
+    assert data["idle_disks"] == ["disk5"]
+
+
+async def test_moves_on_separate_disks_run_in_parallel(
+    array: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that up to MOVE_CONCURRENCY moves run at once, never two on the same disk."""
+    monkeypatch.setattr(settings, "move_concurrency", 2)
+    queue = TaskQueue()
+    running: set[int] = set()
+    overlaps: list[set[int]] = []
+    
+    async def fake_move(context: TaskContext) -> None:
+        running.add(context.task_id)
+        overlaps.append(set(running))
+        await asyncio.sleep(0.02)
+        running.discard(context.task_id)
+    
+    queue.register("move_file", fake_move)
+    queue.register("calibrate", fake_move)
+    for name in ("disk3", "disk4"):
+        (array / name).mkdir()
+    
+    def move(source: str, dest: str) -> dict:
+        return {"source": str(array / source / "f"), "destination": str(array / dest / "f")}
+    
+    a = await queue.create("move_file", move("disk1", "disk2"))
+    b = await queue.create("move_file", move("disk1", "disk2"))
+    c = await queue.create("move_file", move("disk3", "disk4"))
+    calibrate = await queue.create("calibrate", priority="low")
+    finished: list[int] = []
+    
+    async def on_finished(task_id: int) -> None:
+        finished.append(task_id)
+    
+    assert await queue.run_available(on_finished=on_finished) == 4
+    
+    assert {a, c} in overlaps
+    assert not any({a, b} <= seen for seen in overlaps)
+    assert finished[-1] == calibrate
+    assert {calibrate} in overlaps
+    assert all(len(seen) == 1 for seen in overlaps if calibrate in seen)
+
+
+@pytest.mark.usefixtures("array")
+async def test_task_claimed_elsewhere_is_skipped() -> None:
+    """Test that a task another process started after it was picked doesn't run twice."""
+    queue = TaskQueue()
+    runs: list[int] = []
+    
+    async def handler(context: TaskContext) -> None:
+        runs.append(context.task_id)
+    
+    queue.register("calibrate", handler)
+    task_id = await queue.create("calibrate")
+    row = await queue.next_task()
+    await execute("UPDATE tasks SET status = 'running' WHERE id = ?", (task_id,))
+    
+    assert not await queue._claim(row)
+    assert await queue.run_available() == 0
+    assert runs == []
+
+
+async def test_long_queue_is_ordered_once(
+    array: Path,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that draining a queue reuses its order and the API counts every queued task."""
+    monkeypatch.setattr(task_queue, "active_disks", frozenset())
+    (array / "disk3").mkdir()
+    queue = TaskQueue()
+    
+    async def fake_move(_context: TaskContext) -> None:
+        pass
+    
+    queue.register("move_file", fake_move)
+    for i in range(150):
+        dest = "disk2" if i % 2 else "disk3"
+        await queue.create(
+            "move_file",
+            {"source": str(array / "disk1" / f"{i}"), "destination": str(array / dest / f"{i}")},
+        )
+    
+    data = (await client.get("/api/tasks")).json()
+    # disk1 -> disk2, then disk1 -> disk3, versus alternating in creation order
+    assert data["spin_ups"] == 3
+    assert data["spin_ups_in_creation_order"] == 151
+    
+    orderings = 0
+    list_tasks = queue.list_tasks
+    
+    async def counting_list_tasks(*args: Any, **kwargs: Any) -> list:
+        nonlocal orderings
+        orderings += 1
+        return await list_tasks(*args, **kwargs)
+    
+    monkeypatch.setattr(queue, "list_tasks", counting_list_tasks)
+    
+    assert await queue.run_available() == 150
+    # Once to order the queue, once more to find it empty
+    assert orderings == 2
@@ -0,0 +1,194 @@
+"""Tests for pressure-aware move throttling."""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.services import throttle as throttle_module
+from app.services.config import settings
+from app.services.database import init_database, init_index_database
+from app.services.executor import MoveRequest, execute_moves, run_moves
+from app.services.throttle import (
+    MB,
+    MoveThrottle,
+    Pressure,
+    PressureSampler,
+    ThrottleLimits,
+    in_quiet_hours,
+    move_throttle,
+    next_limits,
+    parse_quiet_hours,
+)
+
+CALM = Pressure(io_percent=0.0, cpu_percent=0.0)
+BUSY = Pressure(io_percent=40.0, cpu_percent=0.0)
+
+
+def test_limits_back_off_and_ramp_up() -> None:
+    """Test that pressure halves bandwidth, then concurrency, and calm undoes both."""
+    limits = ThrottleLimits(concurrency=3)
+    peak = 80 * MB
+    
+    limits = next_limits(limits, BUSY, 3, peak)
+    assert (limits.concurrency, limits.bandwidth_bps) == (3, 40 * MB)
+    for _ in range(3):
+        limits = next_limits(limits, BUSY, 3, peak)
+    assert limits.bandwidth_bps == 5 * MB  # THROTTLE_MIN_BANDWIDTH_MBPS
+    limits = next_limits(limits, BUSY, 3, peak)
+    assert limits.concurrency == 2
+    
+    for _ in range(20):
+        limits = next_limits(limits, CALM, 3, peak)
+    assert limits == ThrottleLimits(concurrency=3)
+
+
+def test_busy_disks_and_quiet_hours() -> None:
+    """Test that foreground I/O marks disks busy and quiet hours pause moves."""
+    pressure = Pressure(foreground_bps={"disk1": 20 * MB, "disk2": 1 * MB})
+    limits = next_limits(ThrottleLimits(concurrency=2), pressure, 2, 0.0)
+    assert limits.busy_disks == {"disk1"}
+    
+    quiet = next_limits(limits, CALM, 2, 0.0, quiet=True)
+    assert quiet.concurrency == 0 and quiet.quiet
+    after = next_limits(quiet, CALM, 2, 0.0)
+    assert after.concurrency == 1 and not after.quiet
+    
+    windows = parse_quiet_hours("22:00-06:30, 12:00-13:00")
+    assert in_quiet_hours(datetime(2024, 1, 1, 23, 15), windows)
+    assert in_quiet_hours(datetime(2024, 1, 1, 6, 0), windows)
+    assert not in_quiet_hours(datetime(2024, 1, 1, 6, 30), windows)
+    assert in_quiet_hours(datetime(2024, 1, 1, 12, 30), windows)
+    with pytest.raises(ValueError):
+        parse_quiet_hours("22:00")
+
+
+def test_pacer_keeps_to_bandwidth() -> None:
+    """Test that a throttled copy is slowed to its limit and busy disks to the floor."""
+    throttle = MoveThrottle(1)
+    throttle.update(ThrottleLimits(concurrency=1, bandwidth_bps=4 * MB))
+    on_chunk = throttle.pacer(("disk1", "disk2"))
+    
+    start = time.perf_counter()
+    for _ in range(4):
+        on_chunk(256 * 1024)
+    
+    assert time.perf_counter() - start >= 0.2
+    assert throttle.bytes_by_disk == {"disk1": MB, "disk2": MB}
+
+
+def test_sampler_separates_foreground_io(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that PSI totals become percentages and our own disk I/O is subtracted."""
+    pressure = tmp_path / "pressure"
+    pressure.mkdir()
+    diskstats = tmp_path / "diskstats"
+    dev = os.stat(tmp_path).st_dev
+    monkeypatch.setattr(throttle_module, "PRESSURE_PATH", pressure)
+    monkeypatch.setattr(throttle_module, "DISKSTATS_PATH", diskstats)
+    monkeypatch.setattr(throttle_module, "_own_cgroup", lambda: None)
+    
+    def write(io_total: int, sectors: int) -> None:
+        (pressure / "io").write_text(f"some avg10=0.00 avg60=0.00 avg300=0.00 total={io_total}\n")
+        (pressure / "cpu").write_text("some avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+        diskstats.write_text(
+            f"{os.major(dev)} {os.minor(dev)} md1p1 0 0 {sectors} 0 0 0 {sectors} 0 0 0 0\n"
+        )
+    
+    sampler = PressureSampler({"disk1": tmp_path})
+    write(0, 0)
+    assert sampler.sample({}) == Pressure()
+    
+    write(10_000_000, 4 * MB // 512)  # 10 s of stalls, 8 MB of I/O
+    sample = sampler.sample({"disk1": 6 * MB})
+    
+    assert sample.io_percent == 100.0
+    assert sample.foreground_bps["disk1"] > 0
+
+
+def test_sampler_reads_other_cgroups(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a foreground stall overlapping our own still counts."""
+    root = tmp_path / "cgroup"
+    own = root / "docker" / "unbalanced"
+    plex = root / "docker" / "plex"
+    for path in (root, own, plex, root / "system.slice"):
+        path.mkdir(parents=True, exist_ok=True)
+    monkeypatch.setattr(throttle_module, "PRESSURE_PATH", tmp_path / "pressure")
+    monkeypatch.setattr(throttle_module, "DISKSTATS_PATH", tmp_path / "diskstats")
+    monkeypatch.setattr(throttle_module, "_own_cgroup", lambda: (root, own))
+    
+    def write(own_total: int, plex_total: int) -> None:
+        # Overlapping stalls, the host's "some" time would only be the longer of the two
+        for path, total in ((own, own_total), (plex, plex_total)):
+            (path / "io.pressure").write_text(
+                f"some avg10=0.00 avg60=0.00 avg300=0.00 total={total}\n"
+                "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+            )
+        (root / "system.slice" / "io.pressure").write_text(
+            "some avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+        )
+    
+    sampler = PressureSampler({})
+    write(0, 0)
+    sampler.sample({})
+    
+    write(10_000_000, 0)  # Only our own copies stalled
+    assert sampler.sample({}).io_percent == 0.0
+    
+    write(20_000_000, 10_000_000)
+    assert sampler.sample({}).io_percent == 100.0
+
+
+def test_paused_moves_can_be_cancelled(tmp_path: Path) -> None:
+    """Test that moves waiting for a slot give up when cancelled."""
+    source = tmp_path / "disk1" / "a.bin"
+    source.parent.mkdir()
+    source.write_bytes(b"a")
+    throttle = MoveThrottle(1)
+    throttle.update(ThrottleLimits(concurrency=0, quiet=True))
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    
+    [result] = execute_moves(
+        [MoveRequest(source, tmp_path / "disk2" / "a.bin", 1)], cancel, throttle=throttle
+    )
+    
+    assert result.status == "cancelled"
+    assert source.exists()
+
+
+async def test_quiet_hours_pause_run_moves(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that moves started in quiet hours without a bandwidth wait, even the first one."""
+    now = datetime.now()
+    window = f"{now - timedelta(hours=1):%H:%M}-{now + timedelta(hours=1):%H:%M}"
+    monkeypatch.setattr(settings, "quiet_hours", window)
+    monkeypatch.setattr(settings, "quiet_hours_bandwidth_mbps", 0.0)
+    monkeypatch.setattr(settings, "dry_run", False)
+    monkeypatch.setattr(move_throttle, "limits", ThrottleLimits(concurrency=1))
+    await init_database()
+    await init_index_database()
+    source = tmp_path / "disk1" / "a.bin"
+    source.parent.mkdir()
+    source.write_bytes(b"a" * 1000)
+    cancel = threading.Event()
+    
+    moving = asyncio.create_task(
+        run_moves([MoveRequest(source, tmp_path / "disk2" / "a.bin", 1000)], cancel=cancel)
+    )
+    await asyncio.sleep(0.3)
+    
+    assert not moving.done()
+    cancel.set()
+    [result] = await moving
+    await move_throttle.stop()
+    assert result.status == "cancelled"
+    assert source.exists()
@@ -0,0 +1,219 @@
+"""Tests for the move executor and undo service."""
+
+import asyncio
+import fcntl
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services import executor
+from app.services.config import settings
+from app.services.database import (
+    execute,
+    fetch_all,
+    get_database,
+    init_database,
+    init_index_database,
+)
+from app.services.executor import MoveRequest, partial_journal, run_moves
+from app.services.permissions import PermissionCheck, PermissionReport, permission_monitor
+from app.services.undo import load_undo_entries, prune_expired_undo, undo_entries
+
+
+@pytest.fixture
+async def array_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a three-disk array with a few files on disk1."""
+    root = tmp_path / "mnt"
+    for disk in ("disk1", "disk2", "disk3"):
+        (root / disk / "media").mkdir(parents=True)
+    for i in range(4):
+        (root / "disk1" / "media" / f"file{i}.bin").write_bytes(bytes([i]) * 5000)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    monkeypatch.setattr(settings, "dry_run", False)
+    await init_database()
+    await init_index_database()
+    return root
+
+
+def spread(root: Path) -> list[MoveRequest]:
+    """Move files from disk1 to disk2 and disk3."""
+    return [
+        MoveRequest(
+            source=root / "disk1" / "media" / f"file{i}.bin",
+            dest=root / f"disk{2 + i % 2}" / "media" / f"file{i}.bin",
+            size=5000,
+        )
+        for i in range(4)
+    ]
+
+
+async def test_run_moves_verifies_and_records(array_root: Path) -> None:
+    """Test that moves copy, delete the source and write history and undo rows."""
+    results = await run_moves(spread(array_root))
+    
+    assert [r.status for r in results] == ["moved"] * 4
+    assert not list((array_root / "disk1" / "media").iterdir())
+    assert (array_root / "disk3" / "media" / "file1.bin").read_bytes() == b"\x01" * 5000
+    assert len(await fetch_all("SELECT * FROM operation_history")) == 4
+    assert len(await load_undo_entries()) == 4
+    assert partial_journal.path.read_bytes() == b""
+
+
+async def test_run_moves_keeps_source_on_conflict(array_root: Path) -> None:
+    """Test that an existing destination fails the move and leaves the source."""
+    move = spread(array_root)[0]
+    move.dest.write_bytes(b"other")
+    
+    [result] = await run_moves([move])
+    
+    assert result.status == "failed"
+    assert move.source.exists()
+    assert move.dest.read_bytes() == b"other"
+    assert not list(move.dest.parent.glob(".*"))
+
+
+async def test_run_moves_checks_destination(
+    array_root: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that moves off the array or onto a full disk fail before copying."""
+    moves = spread(array_root)[:2]
+    moves[0].dest = array_root / "disk2" / ".." / ".." / "outside" / "file0.bin"
+    disk_usage = shutil.disk_usage
+    
+    def full_disk3(path: Any) -> Any:
+        usage = disk_usage(path)
+        return usage._replace(free=100) if "disk3" in str(path) else usage
+    
+    monkeypatch.setattr(shutil, "disk_usage", full_disk3)
+    
+    results = await run_moves(moves)
+    
+    assert [r.status for r in results] == ["failed", "failed"]
+    assert "Not on an array disk" in results[0].error
+    assert "Not enough space" in results[1].error
+    assert all(move.source.exists() for move in moves)
+    assert not (tmp_path / "outside").exists()
+
+
+async def test_run_moves_wait_for_mover(
+    array_root: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that moves pause while the mover's pid file names a live process."""
+    monkeypatch.setattr(executor, "MOVER_POLL_SECONDS", 0.05)
+    settings.mover_pid_path.write_text(str(os.getpid()))
+    moves = spread(array_root)[:1]
+    
+    pauses = REGISTRY.get_sample_value("array_balancer_mover_pauses_total")
+    
+    moving = asyncio.create_task(run_moves(moves))
+    await asyncio.sleep(0.3)
+    
+    assert not moving.done()
+    assert REGISTRY.get_sample_value("array_balancer_mover_pauses_total") == pauses + 1
+    assert moves[0].source.exists()
+    settings.mover_pid_path.unlink()
+    [result] = await moving
+    assert result.status == "moved"
+
+
+async def test_run_moves_stop_on_critical_permission_failures(
+    array_root: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that no file moves while the permission monitor reports critical failures."""
+    report = PermissionReport(
+        running_as_uid=0,
+        running_as_gid=0,
+        checks=[PermissionCheck("disk_read", "Read disks", "error", "Permission denied")],
+    )
+    monkeypatch.setattr(permission_monitor, "report", report)
+    
+    results = await run_moves(spread(array_root))
+    
+    assert {r.status for r in results} == {"failed"}
+    assert len(list((array_root / "disk1" / "media").iterdir())) == 4
+
+
+async def test_run_moves_record_each_file(
+    array_root: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that files moved before a crash mid-batch are in the history and undo log."""
+    moves = [move for move in spread(array_root) if "disk2" in str(move.dest)]
+    copy_verified = executor.copy_verified
+    
+    def crash_on_second(source: Path, *args: Any, **kwargs: Any) -> str:
+        if source == moves[1].source:
+            raise RuntimeError("Crashed")
+        return copy_verified(source, *args, **kwargs)
+    
+    monkeypatch.setattr(executor, "copy_verified", crash_on_second)
+    
+    with pytest.raises(RuntimeError):
+        await run_moves(moves)
+    
+    rows = await fetch_all("SELECT source_path, status FROM operation_history")
+    assert [tuple(row) for row in rows] == [(str(moves[0].source), "moved")]
+    assert len(await load_undo_entries()) == 1
+
+
+def test_partials_of_interrupted_moves_are_cleaned_up(array_root: Path) -> None:
+    """Test that journaled partial files are removed, but only while no moves run."""
+    partial = array_root / "disk2" / "media" / ".file0.bin.balancer-partial"
+    partial.write_bytes(b"half")
+    other = array_root / "disk2" / "media" / "file0.bin"
+    other.write_bytes(b"not a partial")
+    # As left by a crash
+    partial_journal.path.write_bytes(os.fsencode(partial) + b"\0" + os.fsencode(other) + b"\0")
+    
+    with open(partial_journal.path, "rb") as moving_elsewhere:
+        fcntl.flock(moving_elsewhere, fcntl.LOCK_SH)
+        assert partial_journal.clean_up() == 0
+    assert partial.exists()
+    
+    assert partial_journal.clean_up() == 1
+    assert not partial.exists()
+    assert other.exists()
+    assert partial_journal.path.read_bytes() == b""
+
+
+async def test_undo_reverses_valid_entries(array_root: Path) -> None:
+    """Test that undo restores moved files and skips ones that changed."""
+    moves = spread(array_root)
+    await run_moves(moves)
+    moves[0].dest.write_bytes(b"x" * 10)
+    moves[1].source.write_bytes(b"new file in the way")
+    
+    result = await undo_entries(await load_undo_entries())
+    
+    assert result.undone == 2
+    assert result.invalid == 2
+    assert moves[2].source.read_bytes() == b"\x02" * 5000
+    assert not moves[3].dest.exists()
+    rows = await fetch_all("SELECT invalidation_reason FROM undo_log ORDER BY source_path")
+    assert [r["invalidation_reason"] for r in rows] == [
+        "Moved file changed size",
+        "Original location is occupied",
+        "Undone",
+        "Undone",
+    ]
+    assert await load_undo_entries() == []
+
+
+async def test_prune_expired_undo(array_root: Path) -> None:
+    """Test that expired rows are deleted in batches."""
+    await run_moves(spread(array_root))
+    db = await get_database()
+    await execute("UPDATE undo_log SET expires_at = '2000-01-01 00:00:00' WHERE id <= 3", db=db)
+    
+    deleted = await prune_expired_undo(batch_size=2)
+    
+    assert deleted == 3
+    assert len(await fetch_all("SELECT * FROM undo_log")) == 1
@@ -0,0 +1,135 @@
+"""Tests for applying filesystem change events to the index."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.services.config import settings
+from app.services.database import fetch_all, fetch_one, get_index_database
+from app.services.indexer import Indexer, get_generation
+from app.services.watcher import IndexWatcher, apply_changes, open_source, refresh_paths
+
+
+@pytest.fixture
+async def disk(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Index one disk with a small TV share."""
+    root = tmp_path / "mnt"
+    season = root / "disk1" / "TV" / "Show" / "Season 1"
+    season.mkdir(parents=True)
+    (season / "e01.mkv").write_bytes(b"x" * 1000)
+    (root / "disk1" / "TV" / "Old").mkdir()
+    (root / "disk1" / "TV" / "Old" / "old.mkv").write_bytes(b"o" * 300)
+    monkeypatch.setattr(settings, "disk_mount_pattern", str(root / "disk*"))
+    await Indexer().run()
+    return root / "disk1"
+
+
+async def _totals(path: str) -> tuple[int, int]:
+    row = await fetch_one(
+        "SELECT total_files, total_bytes FROM directories WHERE disk_id = 'disk1' AND path = ?",
+        (path,),
+        db=await get_index_database(),
+    )
+    return (row["total_files"], row["total_bytes"]) if row else (0, 0)
+
+
+async def test_apply_changes_refreshes_rows_and_rollups(disk: Path) -> None:
+    """Test that changed directories are re-listed and totals updated up to the root."""
+    season = disk / "TV" / "Show" / "Season 1"
+    (season / "e02.mkv").write_bytes(b"y" * 2000)
+    (disk / "TV" / "New" / "Season 1").mkdir(parents=True)
+    (disk / "TV" / "New" / "Season 1" / "e01.mkv").write_bytes(b"n" * 500)
+    (disk / "TV" / "Old" / "old.mkv").unlink()
+    (disk / "TV" / "Old").rmdir()
+    
+    refreshed = await apply_changes(
+        "disk1", disk, ["TV/Show/Season 1", "TV", "TV/New/Season 1", "TV/Old"]
+    )
+    
+    assert refreshed == 2
+    assert await _totals("TV/Show") == (2, 3000)
+    assert await _totals("TV/New/Season 1") == (1, 500)
+    assert await _totals("TV/Old") == (0, 0)
+    assert await _totals("") == (3, 3500)
+    rows = await fetch_all(
+        "SELECT file_count, total_bytes FROM indexed_disks", db=await get_index_database()
+    )
+    assert [tuple(row) for row in rows] == [(3, 3500)]
+
+
+async def test_concurrent_writers_are_serialized(disk: Path) -> None:
+    """Test that a refresh after a move and a watcher batch don't interleave their writes."""
+    for share in ("Movies/A", "Music/B"):
+        for i in range(3):
+            (disk / share / f"Sub {i}").mkdir(parents=True)
+            (disk / share / f"Sub {i}" / "file.bin").write_bytes(b"x" * 100)
+    generation = await get_generation()
+    
+    refreshed = await asyncio.gather(
+        refresh_paths([disk / "Movies" / "A" / "Sub 0" / "file.bin"]),
+        apply_changes("disk1", disk, ["Music/B"]),
+        refresh_paths([disk / "Movies" / "A" / "Sub 1" / "file.bin"]),
+    )
+    
+    assert all(refreshed)
+    assert await _totals("Movies/A") == (3, 300)
+    assert await _totals("Music/B") == (3, 300)
+    assert await _totals("") == (8, 1900)
+    # Each refresh bumped the generation once
+    assert await get_generation() == generation + 2
+    rows = await fetch_all(
+        "SELECT COUNT(*) AS n, COUNT(DISTINCT id) AS ids FROM directories",
+        db=await get_index_database(),
+    )
+    assert rows[0]["n"] == rows[0]["ids"]
+
+
+async def test_inotify_watcher_keeps_index_current(
+    disk: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that writes seen by inotify reach the index, new directories included."""
+    monkeypatch.setattr(settings, "watcher_backend", "inotify")
+    watcher = IndexWatcher()
+    try:
+        await watcher.watch_indexed_disks()
+        assert watcher.backends == {"disk1": "inotify"}
+        generation = await get_generation()
+        
+        (disk / "TV" / "Show" / "Season 2").mkdir()
+        (disk / "TV" / "Show" / "Season 2" / "e01.mkv").write_bytes(b"z" * 700)
+        (disk / "TV" / "Show" / "Season 1" / "e01.mkv").unlink()
+        # Let the event loop deliver the events
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        
+        assert watcher.pending > 0
+        assert await watcher.flush() > 0
+        assert await _totals("TV/Show") == (1, 700)
+        assert await get_generation() == generation + 1
+        
+        # New directories are watched too
+        (disk / "TV" / "Show" / "Season 2" / "e02.mkv").write_bytes(b"z" * 100)
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        await watcher.flush()
+        assert await _totals("TV/Show/Season 2") == (2, 800)
+    finally:
+        watcher.close()
+
+
+async def test_fanotify_source_reports_directories(disk: Path) -> None:
+    """Test that fanotify resolves events to the directory they happened in."""
+    try:
+        source = open_source("disk1", disk, "fanotify")
+    except OSError as e:
+        pytest.skip(f"fanotify unavailable: {e}")
+    try:
+        (disk / "TV" / "Show" / "Season 1" / "e02.mkv").write_bytes(b"y")
+        dirty, overflow = source.read()
+    finally:
+        source.close()
+    
+    assert dirty == {"TV/Show/Season 1"}
+    assert not overflow